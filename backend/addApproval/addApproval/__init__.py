@@ -1,29 +1,73 @@
-import json
 import logging
 import re
 import os
 import requests
 import math
+import threading
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 from azure.functions import HttpRequest, HttpResponse
-from azure.data.tables import TableServiceClient, TableEntity
-from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
+from azure.data.tables import TableEntity
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceModifiedError, HttpResponseError
+from ..shared_code.storage_clients import get_table_client
+from ..shared_code import applicant_stats, applicant_summary, http_client, json_encoding, verdict_outbox, vote_ledger
 
 # Load environment variables from .env file
 load_dotenv()
 
-def get_admin_count():
+# How many times a vote is re-read and re-applied after an ETag conflict
+MAX_VOTE_ATTEMPTS = int(os.getenv('MAX_VOTE_ATTEMPTS', '5'))
+
+ADMIN_API_URL = "https://simbamanageadmins-egambyhtfxbfhabc.westus-01.azurewebsites.net/api/read-admin"
+DEFAULT_ADMIN_COUNT = 3
+INIT_STUDENT_URL = "https://simbamanageapprovedapplicants-c3a7cghkgjg5grfy.westus-01.azurewebsites.net/api/initStudent"
+
+# (connect, read) timeouts and retry budgets for the outbound calls to the other function apps
+ADMIN_API_TIMEOUT = (3.05, 10)
+ADMIN_API_RETRIES = 2
+INIT_STUDENT_TIMEOUT = (3.05, 30)
+INIT_STUDENT_RETRIES = 2  # initStudent reports an already initialized student, so repeating it is safe
+
+# Admin roster cache: fresh for ADMIN_COUNT_TTL_SECONDS, then served stale while a
+# background refresh runs, up to ADMIN_COUNT_MAX_STALE_SECONDS old
+ADMIN_COUNT_TTL_SECONDS = int(os.getenv('ADMIN_COUNT_TTL_SECONDS', '300'))
+ADMIN_COUNT_MAX_STALE_SECONDS = int(os.getenv('ADMIN_COUNT_MAX_STALE_SECONDS', '86400'))
+
+_admin_count_lock = threading.Lock()
+_admin_count_cache = {"count": None, "fetched_at": 0.0, "refreshing": False}
+
+def fetch_admin_count_from_table():
     """
-    Fetch the current number of admins from the admin management API
+    Count admins directly from the admin table when ADMIN_TABLE_NAME is configured,
+    skipping the HTTP hop to manageAdmins. Returns None if not configured.
+    """
+    admin_table_name = os.getenv('ADMIN_TABLE_NAME')
+    connection_string = os.getenv('ADMIN_TABLE_CONNECTION_STRING') or os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    if not admin_table_name or not connection_string:
+        return None
+    table_client = get_table_client(connection_string, admin_table_name)
+    entities = table_client.query_entities("PartitionKey eq 'admins'", select=['RowKey'])
+    return sum(1 for _ in entities)
+
+def fetch_admin_count():
+    """
+    Fetch the current number of admins from the admin table or the admin management API.
+    Returns None if the count could not be determined.
     """
     try:
-        admin_api_url = "https://simbamanageadmins-egambyhtfxbfhabc.westus-01.azurewebsites.net/api/read-admin"
-        
-        response = requests.get(
-            admin_api_url,
+        admin_count = fetch_admin_count_from_table()
+        if admin_count:
+            logging.info(f"Current admin count (from table): {admin_count}")
+            return admin_count
+
+        response = http_client.get(
+            'manageAdmins',
+            ADMIN_API_URL,
             headers={'Content-Type': 'application/json'},
-            timeout=10
+            timeout=ADMIN_API_TIMEOUT,
+            retries=ADMIN_API_RETRIES
         )
         
         if response.status_code == 200:
@@ -34,17 +78,63 @@ def get_admin_count():
                 return admin_count
             else:
                 logging.warning("Admin API returned success=false or no admins found")
-                return 3  # Default fallback
+                return None
         else:
             logging.warning(f"Admin API returned status {response.status_code}")
-            return 3  # Default fallback
+            return None
             
     except requests.exceptions.RequestException as e:
         logging.error(f"Failed to fetch admin count: {str(e)}")
-        return 3  # Default fallback
+        return None
     except Exception as e:
         logging.error(f"Unexpected error fetching admin count: {str(e)}")
-        return 3  # Default fallback
+        return None
+
+def store_admin_count(admin_count):
+    """Store a fetched admin count (None if the fetch failed) in the cache and return the count to use"""
+    with _admin_count_lock:
+        if admin_count is not None:
+            _admin_count_cache["count"] = admin_count
+            _admin_count_cache["fetched_at"] = time.monotonic()
+        elif _admin_count_cache["count"] is None:
+            # Cache the fallback as already expired so the next vote refreshes in the background
+            _admin_count_cache["count"] = DEFAULT_ADMIN_COUNT
+            _admin_count_cache["fetched_at"] = time.monotonic() - ADMIN_COUNT_TTL_SECONDS
+        _admin_count_cache["refreshing"] = False
+        return _admin_count_cache["count"]
+
+def refresh_admin_count():
+    """Fetch the admin count and store it in the cache"""
+    return store_admin_count(fetch_admin_count())
+
+def cached_admin_count():
+    """
+    The cached admin count if it is fresh, or stale but usable (a background
+    refresh is started then); None when the caller has to fetch it
+    """
+    with _admin_count_lock:
+        admin_count = _admin_count_cache["count"]
+        age = time.monotonic() - _admin_count_cache["fetched_at"]
+        if admin_count is not None and age < ADMIN_COUNT_TTL_SECONDS:
+            return admin_count
+        if admin_count is not None and age < ADMIN_COUNT_MAX_STALE_SECONDS:
+            if not _admin_count_cache["refreshing"]:
+                _admin_count_cache["refreshing"] = True
+                threading.Thread(target=refresh_admin_count, daemon=True).start()
+            logging.info(f"Using cached admin count {admin_count} while refreshing")
+            return admin_count
+    return None
+
+def get_admin_count():
+    """
+    Get the current number of admins, served from a TTL cache with
+    stale-while-revalidate so votes never wait on manageAdmins once warm
+    """
+    admin_count = cached_admin_count()
+    if admin_count is not None:
+        return admin_count
+    # Cold start (or cache far too old): fetch synchronously
+    return refresh_admin_count()
 
 def calculate_thresholds(admin_count):
     """
@@ -62,130 +152,202 @@ def calculate_thresholds(admin_count):
     logging.info(f"Admin count: {admin_count}, Approval threshold: {approval_threshold}, Denial threshold: {denial_threshold}")
     return approval_threshold, denial_threshold
 
-def get_approval_emails(entity):
-    """Get list of approval emails from entity"""
-    approvals = []
-    i = 1
-    while entity.get(f'approval{i}'):
-        approvals.append(entity.get(f'approval{i}'))
-        i += 1
-    return approvals
-
-def get_denial_emails(entity):
-    """Get list of denial emails from entity"""
-    denials = []
-    i = 1
-    while entity.get(f'denial{i}'):
-        denials.append(entity.get(f'denial{i}'))
-        i += 1
-    return denials
-
-def remove_email_from_approvals(entity, email):
-    """Remove email from approval fields and compact the list"""
-    approvals = get_approval_emails(entity)
-    if email in approvals:
-        # Save original timestamps before clearing
-        original_timestamps = {}
-        i = 1
-        while entity.get(f'approval{i}') is not None:
-            if entity.get(f'approval{i}') != email:  # Don't save the timestamp for the email being removed
-                original_timestamps[entity.get(f'approval{i}')] = entity.get(f'timeOfApproval{i}')
-            entity[f'approval{i}'] = None
-            entity[f'timeOfApproval{i}'] = None
-            i += 1
+def apply_vote(entity, email, action, approval_threshold, denial_threshold, current_timestamp):
+    """
+    Apply an approve/deny vote to the entity in place.
+    Returns (response_message, status_code, verdict, error) where verdict is
+    'Approved'/'Denied' when a threshold was reached and error is set if the
+    vote was rejected.
+    """
+    response_message = ""
+    status_code = 200
+    verdict = None
+    ledger = vote_ledger.load(entity)
+    approvals = ledger['approvals']
+    denials = ledger['denials']
+    
+    if action == 'approve':
+        # Handle approval workflow
+        # Remove an existing denial by this email, if any
+        denial_changed = denials.pop(email, None) is not None
+        if denial_changed:
+            logging.info(f"Removing {email} from denials to change to approval")
+        
+        # Check if email already used for approval
+        if email in approvals:
+            if denial_changed:
+                response_message = 'Successfully changed from denial to approval.'
+            else:
+                return None, 400, None, "Cannot approve the same entity more than once with the same email address"
+        else:
+            # Add approval
+            approvals[email] = current_timestamp
+            current_approval_count = len(approvals)
+            
+            if current_approval_count >= approval_threshold:
+                # Approval threshold reached
+                if denial_changed:
+                    response_message = f'Changed from denial to approval. Approval threshold reached ({current_approval_count}/{approval_threshold})!'
+                else:
+                    response_message = f'Approval #{current_approval_count} added successfully. Approval threshold reached ({current_approval_count}/{approval_threshold})!'
+                status_code = 201  # Created - approval complete
+                logging.info(f"Approval threshold reached: {current_approval_count}/{approval_threshold}")
+
+                # Directly update RedpStatus instead of calling initStudent
+                current_status = entity.get('RedpStatus', '').lower()
+                if current_status != 'email sent':
+                    entity['RedpStatus'] = 'pending'
+                    response_message += " Student status set to Pending."
+                else:
+                    response_message += " Student status remains 'email sent'."
+
+                verdict = "Approved"
+            else:
+                # Still need more approvals
+                if denial_changed:
+                    response_message = f'Changed from denial to approval. Need {approval_threshold - current_approval_count} more approval(s).'
+                else:
+                    response_message = f'Approval #{current_approval_count} added successfully. Need {approval_threshold - current_approval_count} more approval(s).'
+                logging.info(f"Approval {current_approval_count}/{approval_threshold} - need {approval_threshold - current_approval_count} more")
+    
+    elif action == 'deny':
+        # Handle denial workflow
+        # Remove an existing approval by this email, if any
+        approval_changed = approvals.pop(email, None) is not None
+        if approval_changed:
+            logging.info(f"Removing {email} from approvals to change to denial")
         
-        # Re-add remaining approvals with their original timestamps
-        approvals.remove(email)
-        for idx, approval_email in enumerate(approvals, 1):
-            entity[f'approval{idx}'] = approval_email
-            entity[f'timeOfApproval{idx}'] = original_timestamps.get(approval_email, '')
-        return True
-    return False
-
-def remove_email_from_denials(entity, email):
-    """Remove email from denial fields and compact the list"""
-    denials = get_denial_emails(entity)
-    if email in denials:
-        # Save original timestamps before clearing
-        original_timestamps = {}
-        i = 1
-        while entity.get(f'denial{i}') is not None:
-            if entity.get(f'denial{i}') != email:  # Don't save the timestamp for the email being removed
-                original_timestamps[entity.get(f'denial{i}')] = entity.get(f'timeOfDenial{i}')
-            entity[f'denial{i}'] = None
-            entity[f'timeOfDenial{i}'] = None
-            i += 1
+        # Check if email already used for denial
+        if email in denials:
+            if approval_changed:
+                response_message = 'Successfully changed from approval to denial.'
+            else:
+                return None, 400, None, "Cannot deny the same entity more than once with the same email address"
+        else:
+            # Add denial
+            denials[email] = current_timestamp
+            current_denial_count = len(denials)
+            
+            if current_denial_count >= denial_threshold:
+                # Denial threshold reached
+                if approval_changed:
+                    response_message = f'Changed from approval to denial. Denial threshold reached ({current_denial_count}/{denial_threshold})!'
+                else:
+                    response_message = f'Denial #{current_denial_count} added successfully. Denial threshold reached ({current_denial_count}/{denial_threshold})!'
+                status_code = 201  # Created - denial complete
+                logging.info(f"Denial threshold reached: {current_denial_count}/{denial_threshold}")
+                
+                verdict = "Denied"
+            else:
+                # Still need more denials
+                if approval_changed:
+                    response_message = f'Changed from approval to denial. Need {denial_threshold - current_denial_count} more denial(s).'
+                else:
+                    response_message = f'Denial #{current_denial_count} added successfully. Need {denial_threshold - current_denial_count} more denial(s).'
+                logging.info(f"Denial {current_denial_count}/{denial_threshold} - need {denial_threshold - current_denial_count} more")
+    
+    vote_ledger.store(entity, ledger)
+    if verdict:
+        # Persisted with the vote itself, so the notification cannot be lost after the write
+        verdict_outbox.mark_pending(entity, verdict)
+    return response_message, status_code, verdict, None
+
+def save_vote(table_client, entity, email, action, approval_threshold, denial_threshold):
+    """
+    Apply a vote and write it with an ETag match so concurrent voters cannot
+    overwrite each other; on a conflict, re-read the entity and re-apply the vote.
+    Returns (entity, before, response_message, status_code, verdict, error) where
+    before is the applicant_stats snapshot of the version the vote replaced.
+    """
+    partition_key = entity['PartitionKey']
+    row_key = entity['RowKey']
+    for attempt in range(1, MAX_VOTE_ATTEMPTS + 1):
+        # Get current timestamp in ISO format
+        current_timestamp = datetime.utcnow().isoformat() + 'Z'
+        before = applicant_stats.snapshot(entity, approval_threshold, denial_threshold)
+        response_message, status_code, verdict, error = apply_vote(
+            entity, email, action, approval_threshold, denial_threshold, current_timestamp
+        )
+        if error:
+            return entity, before, None, 400, None, error
         
-        # Re-add remaining denials with their original timestamps
-        denials.remove(email)
-        for idx, denial_email in enumerate(denials, 1):
-            entity[f'denial{idx}'] = denial_email
-            entity[f'timeOfDenial{idx}'] = original_timestamps.get(denial_email, '')
-        return True
-    return False
-    return False
-
-def add_approval(entity, email, timestamp):
-    """Add approval to the next available slot"""
-    i = 1
-    while entity.get(f'approval{i}'):
-        i += 1
-    entity[f'approval{i}'] = email
-    entity[f'timeOfApproval{i}'] = timestamp
-    return i
-
-def add_denial(entity, email, timestamp):
-    """Add denial to the next available slot"""
-    i = 1
-    while entity.get(f'denial{i}'):
-        i += 1
-    entity[f'denial{i}'] = email
-    entity[f'timeOfDenial{i}'] = timestamp
-    return i
-
-def trigger_power_automate_flow(recipient, address, verdict, row_key=None):
+        try:
+            table_client.update_entity(
+                entity=entity,
+                mode='replace',
+                etag=entity.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            logging.info('Entity updated successfully')
+            return entity, before, response_message, status_code, verdict, None
+        except ResourceModifiedError:
+            logging.warning(f"Concurrent update on {partition_key}/{row_key}, retrying vote (attempt {attempt}/{MAX_VOTE_ATTEMPTS})")
+            entity = table_client.get_entity(partition_key=partition_key, row_key=row_key)
+    
+    return entity, None, None, 409, None, "Could not record vote due to concurrent updates, please retry"
+
+def record_stats(connection_string, changes, approval_threshold, denial_threshold):
+    """Apply dashboard counter changes for a list of persisted (before, entity, verdict) votes"""
+    deltas = {}
+    for before, entity, verdict in changes:
+        after = applicant_stats.snapshot(entity, approval_threshold, denial_threshold)
+        applicant_stats.diff(before, after, deltas)
+        # Votes cast after the threshold still carry the verdict; only the vote that reached it counts
+        if verdict and not before['isComplete'] and after['isComplete']:
+            key = applicant_stats.verdict_key(verdict)
+            deltas[key] = deltas.get(key, 0) + 1
+    applicant_stats.try_apply(connection_string, deltas)
+
+def notify_verdict(entity):
     """
-    Trigger Power Automate flow when a verdict is reached
-    Now includes rowKey in the payload.
+    Queue the Power Automate notification for a persisted verdict with one
+    outbox insert; dispatchVerdicts clears the flag once it is delivered. The
+    flag was written with the vote, so if queuing fails here the dispatchVerdicts
+    sweep still picks it up.
     """
     try:
-        power_automate_url = "https://prod-37.westus.logic.azure.com:443/workflows/c2a9b1269e53415197930e5fffcb788a/triggers/manual/paths/invoke?api-version=2016-06-01&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=9KZ72xAJyzhzneU7_ntAIL8P-x-InfvHh613oiHyA2w"
-        payload = {
-            "recipient": recipient,
-            "address": address,
-            "verdict": verdict,
-            "rowKey": row_key
-        }
-        logging.info(f"Triggering Power Automate flow for {recipient} with verdict: {verdict} and rowKey: {row_key}")
-        # Fire-and-forget: do not wait for or check the response
-        requests.post(
-            power_automate_url,
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=5
-        )
+        connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+        verdict_outbox.enqueue_pending(connection_string, entity)
     except Exception as e:
-        logging.error(f"Error triggering Power Automate flow: {str(e)}")
-    # No return value, fire-and-forget
+        logging.error(f"Failed to queue verdict notification, leaving it for the dispatcher sweep: {str(e)}")
+
+def vote_summary(entity, approval_threshold, denial_threshold):
+    """Current vote counts, votes and completion flags for API responses"""
+    ledger = vote_ledger.load(entity)
+    current_approval_count = len(ledger['approvals'])
+    current_denial_count = len(ledger['denials'])
+    
+    # Build approval and denial objects for response
+    approvals, denials = vote_ledger.to_legacy_fields(ledger)
+    
+    return {
+        "currentApprovalCount": current_approval_count,
+        "currentDenialCount": current_denial_count,
+        "approvals": approvals,
+        "denials": denials,
+        "isComplete": current_approval_count >= approval_threshold or current_denial_count >= denial_threshold,
+        "isApprovalComplete": current_approval_count >= approval_threshold,
+        "isDenialComplete": current_denial_count >= denial_threshold
+    }
 
 def initialize_approved_student(row_key):
     """
     Initialize an approved student by calling the initStudent endpoint
     """
     try:
-        init_student_url = "https://simbamanageapprovedapplicants-c3a7cghkgjg5grfy.westus-01.azurewebsites.net/api/initStudent"
-        
         payload = {
             "rowKey": row_key
         }
         
         logging.info(f"Initializing approved student with rowKey: {row_key}")
         
-        response = requests.post(
-            init_student_url,
+        response = http_client.post(
+            'initStudent',
+            INIT_STUDENT_URL,
             json=payload,
             headers={'Content-Type': 'application/json'},
-            timeout=30
+            timeout=INIT_STUDENT_TIMEOUT,
+            retries=INIT_STUDENT_RETRIES
         )
         
         if response.status_code == 200:
@@ -209,6 +371,90 @@ def initialize_approved_student(row_key):
         logging.error(f"Unexpected error initializing student {row_key}: {str(e)}")
         return False, f"Unexpected error: {str(e)}"
 
+def vote_response(entity, action, response_message, status_code, admin_count, approval_threshold, denial_threshold):
+    """Success response for a recorded vote"""
+    response = {
+        "message": response_message,
+        "action": action,
+        "partitionKey": entity['PartitionKey'],
+        "rowKey": entity['RowKey'],
+        "adminCount": admin_count,
+        "approvalThreshold": approval_threshold,
+        "denialThreshold": denial_threshold,
+        **vote_summary(entity, approval_threshold, denial_threshold)
+    }
+    
+    return HttpResponse(
+        json_encoding.dumps(response),
+        status_code=status_code,
+        mimetype="application/json"
+    )
+
+def parse_vote_request(req):
+    """
+    Validate the vote request body.
+    Returns ((email, partitionKey, rowKey, action), None), or (None, error response).
+    """
+    # Parse request body
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Invalid JSON in request body"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    if not req_body:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Request body is required"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    # Extract required fields
+    email = req_body.get('email')
+    partition_key = req_body.get('partitionKey')
+    row_key = req_body.get('rowKey')
+    action = req_body.get('action', 'approve')  # Default to approve for backward compatibility
+
+    # Validate input
+    if not email or not partition_key or not row_key:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Missing required fields: email, partitionKey, rowKey"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    # Validate action
+    if action not in ['approve', 'deny']:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Invalid action. Must be 'approve' or 'deny'"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    # Validate email format
+    email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+    if not re.match(email_regex, email):
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Invalid email format"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    return (email, partition_key, row_key, action), None
+
 def main(req: HttpRequest) -> HttpResponse:
     logging.info('AddApproval function processed a request.')
     try:
@@ -217,75 +463,21 @@ def main(req: HttpRequest) -> HttpResponse:
         if not connection_string:
             logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
             return HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "error": "Azure Storage connection string not configured"
                 }),
                 status_code=500,
                 mimetype="application/json"
             )
         
-        # Parse request body
-        try:
-            req_body = req.get_json()
-        except ValueError:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Invalid JSON in request body"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        if not req_body:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Request body is required"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        # Extract required fields
-        email = req_body.get('email')
-        partition_key = req_body.get('partitionKey')
-        row_key = req_body.get('rowKey')
-        action = req_body.get('action', 'approve')  # Default to approve for backward compatibility
-        
-        # Validate input
-        if not email or not partition_key or not row_key:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Missing required fields: email, partitionKey, rowKey"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        # Validate action
-        if action not in ['approve', 'deny']:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Invalid action. Must be 'approve' or 'deny'"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        # Validate email format
-        email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-        if not re.match(email_regex, email):
-            return HttpResponse(
-                json.dumps({
-                    "error": "Invalid email format"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
+        fields, error_response = parse_vote_request(req)
+        if error_response:
+            return error_response
+        email, partition_key, row_key, action = fields
         
         # Initialize Table Service Client
         table_name = 'DynamoInfo'
-        table_service_client = TableServiceClient.from_connection_string(connection_string)
-        table_client = table_service_client.get_table_client(table_name=table_name)
+        table_client = get_table_client(connection_string, table_name)
         
         # Do NOT create table or entity, only update existing
         entity = None
@@ -297,7 +489,7 @@ def main(req: HttpRequest) -> HttpResponse:
             logging.info(f"Found existing entity: {entity}")
         except ResourceNotFoundError:
             return HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "error": "Entity not found in DynamoInfo table",
                     "partitionKey": partition_key,
                     "rowKey": row_key
@@ -308,7 +500,7 @@ def main(req: HttpRequest) -> HttpResponse:
         except Exception as e:
             logging.error(f"Unexpected error fetching entity: {str(e)}")
             return HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "error": "Unexpected error fetching entity",
                     "details": str(e)
                 }),
@@ -316,166 +508,39 @@ def main(req: HttpRequest) -> HttpResponse:
                 mimetype="application/json"
             )
         
-        response_message = ""
-        status_code = 200
-        
         # Get current admin count and calculate thresholds
         admin_count = get_admin_count()
         approval_threshold, denial_threshold = calculate_thresholds(admin_count)
         
-        # Get current timestamp in ISO format
-        current_timestamp = datetime.utcnow().isoformat() + 'Z'
-        
-        if action == 'approve':
-            # Handle approval workflow
-            # Check if email is in denial fields and remove it if found
-            denial_changed = remove_email_from_denials(entity, email)
-            if denial_changed:
-                logging.info(f"Removing {email} from denials to change to approval")
-            
-            # Check if email already used for approval
-            approval_emails = get_approval_emails(entity)
-            if email in approval_emails:
-                if denial_changed:
-                    response_message = 'Successfully changed from denial to approval.'
-                else:
-                    return HttpResponse(
-                        json.dumps({
-                            "error": "Cannot approve the same entity more than once with the same email address"
-                        }),
-                        status_code=400,
-                        mimetype="application/json"
-                    )
-            else:
-                # Add approval
-                approval_number = add_approval(entity, email, current_timestamp)
-                current_approval_count = len(get_approval_emails(entity))
-                
-                if current_approval_count >= approval_threshold:
-                    # Approval threshold reached
-                    if denial_changed:
-                        response_message = f'Changed from denial to approval. Approval threshold reached ({current_approval_count}/{approval_threshold})!'
-                    else:
-                        response_message = f'Approval #{current_approval_count} added successfully. Approval threshold reached ({current_approval_count}/{approval_threshold})!'
-                    status_code = 201  # Created - approval complete
-                    logging.info(f"Approval threshold reached: {current_approval_count}/{approval_threshold}")
-
-                    # Directly update RedpStatus instead of calling initStudent
-                    current_status = entity.get('RedpStatus', '').lower()
-                    if current_status != 'email sent':
-                        entity['RedpStatus'] = 'pending'
-                        response_message += " Student status set to Pending."
-                    else:
-                        response_message += " Student status remains 'email sent'."
-
-                    # Trigger Power Automate flow for approval verdict
-                    recipient_name = f"{entity.get('firstName', 'Applicant')} {entity.get('lastName', '')}"
-                    recipient_email = entity.get('email', 'Unknown')
-                    trigger_power_automate_flow(recipient_name, recipient_email, "Approved", row_key=row_key)
-                else:
-                    # Still need more approvals
-                    if denial_changed:
-                        response_message = f'Changed from denial to approval. Need {approval_threshold - current_approval_count} more approval(s).'
-                    else:
-                        response_message = f'Approval #{current_approval_count} added successfully. Need {approval_threshold - current_approval_count} more approval(s).'
-                    logging.info(f"Approval {current_approval_count}/{approval_threshold} - need {approval_threshold - current_approval_count} more")
-        
-        elif action == 'deny':
-            # Handle denial workflow
-            # Check if email is in approval fields and remove it if found
-            approval_changed = remove_email_from_approvals(entity, email)
-            if approval_changed:
-                logging.info(f"Removing {email} from approvals to change to denial")
-            
-            # Check if email already used for denial
-            denial_emails = get_denial_emails(entity)
-            if email in denial_emails:
-                if approval_changed:
-                    response_message = 'Successfully changed from approval to denial.'
-                else:
-                    return HttpResponse(
-                        json.dumps({
-                            "error": "Cannot deny the same entity more than once with the same email address"
-                        }),
-                        status_code=400,
-                        mimetype="application/json"
-                    )
-            else:
-                # Add denial
-                denial_number = add_denial(entity, email, current_timestamp)
-                current_denial_count = len(get_denial_emails(entity))
-                
-                if current_denial_count >= denial_threshold:
-                    # Denial threshold reached
-                    if approval_changed:
-                        response_message = f'Changed from approval to denial. Denial threshold reached ({current_denial_count}/{denial_threshold})!'
-                    else:
-                        response_message = f'Denial #{current_denial_count} added successfully. Denial threshold reached ({current_denial_count}/{denial_threshold})!'
-                    status_code = 201  # Created - denial complete
-                    logging.info(f"Denial threshold reached: {current_denial_count}/{denial_threshold}")
-                    
-                    # Trigger Power Automate flow for denial verdict
-                    recipient_name = f"{entity.get('firstName', 'Applicant')} {entity.get('lastName', '')}"
-                    recipient_email = entity.get('email', 'Unknown')
-                    trigger_power_automate_flow(recipient_name, recipient_email, "Denied", row_key=row_key)
-                else:
-                    # Still need more denials
-                    if approval_changed:
-                        response_message = f'Changed from approval to denial. Need {denial_threshold - current_denial_count} more denial(s).'
-                    else:
-                        response_message = f'Denial #{current_denial_count} added successfully. Need {denial_threshold - current_denial_count} more denial(s).'
-                    logging.info(f"Denial {current_denial_count}/{denial_threshold} - need {denial_threshold - current_denial_count} more")
-        
-        # Save or update entity
-        table_client.update_entity(entity=entity, mode='replace')
-        logging.info('Entity updated successfully')
-
-        # Get current counts for response
-        current_approval_emails = get_approval_emails(entity)
-        current_denial_emails = get_denial_emails(entity)
-        current_approval_count = len(current_approval_emails)
-        current_denial_count = len(current_denial_emails)
-        
-        # Build approval and denial objects for response
-        approvals = {}
-        denials = {}
-        
-        for i, email in enumerate(current_approval_emails, 1):
-            approvals[f'approval{i}'] = email
-            approvals[f'timeOfApproval{i}'] = entity.get(f'timeOfApproval{i}', '')
-        
-        for i, email in enumerate(current_denial_emails, 1):
-            denials[f'denial{i}'] = email
-            denials[f'timeOfDenial{i}'] = entity.get(f'timeOfDenial{i}', '')
-        
-        # Return success response
-        response = {
-            "message": response_message,
-            "action": action,
-            "partitionKey": partition_key,
-            "rowKey": row_key,
-            "adminCount": admin_count,
-            "approvalThreshold": approval_threshold,
-            "denialThreshold": denial_threshold,
-            "currentApprovalCount": current_approval_count,
-            "currentDenialCount": current_denial_count,
-            "approvals": approvals,
-            "denials": denials,
-            "isComplete": current_approval_count >= approval_threshold or current_denial_count >= denial_threshold,
-            "isApprovalComplete": current_approval_count >= approval_threshold,
-            "isDenialComplete": current_denial_count >= denial_threshold
-        }
-        
-        return HttpResponse(
-            json.dumps(response),
-            status_code=status_code,
-            mimetype="application/json"
+        entity, before, response_message, status_code, verdict, error = save_vote(
+            table_client, entity, email, action, approval_threshold, denial_threshold
         )
+        if error:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": error,
+                    "partitionKey": partition_key,
+                    "rowKey": row_key
+                }),
+                status_code=status_code,
+                mimetype="application/json"
+            )
+
+        # Keep the dashboard summary row in step with the vote
+        applicant_summary.try_upsert(connection_string, [entity], approval_threshold, denial_threshold)
+        record_stats(connection_string, [(before, entity, verdict)], approval_threshold, denial_threshold)
+
+        # Notify only once the verdict has actually been persisted
+        if verdict:
+            notify_verdict(entity)
+
+        # Return success response
+        return vote_response(entity, action, response_message, status_code, admin_count, approval_threshold, denial_threshold)
         
     except Exception as e:
         logging.error(f"Error processing request: {str(e)}")
         return HttpResponse(
-            json.dumps({
+            json_encoding.dumps({
                 "error": "Internal server error",
                 "details": str(e)
             }),
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from azure.functions import HttpRequest, HttpResponse
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceModifiedError
+from ..shared_code import aio_clients, applicant_stats, applicant_summary, http_client, json_encoding
+from ..addApproval import (
+    ADMIN_API_URL, ADMIN_API_TIMEOUT, MAX_VOTE_ATTEMPTS, apply_vote, cached_admin_count,
+    calculate_thresholds, notify_verdict, parse_vote_request, record_stats, store_admin_count, vote_response
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+async def fetch_admin_count_async():
+    """
+    Async counterpart of fetch_admin_count: the admin table through the aio client,
+    else manageAdmins through the shared aiohttp session. Returns None on failure.
+    """
+    import aiohttp
+
+    try:
+        admin_table_name = os.getenv('ADMIN_TABLE_NAME')
+        connection_string = os.getenv('ADMIN_TABLE_CONNECTION_STRING') or os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+        if admin_table_name and connection_string:
+            table_client = aio_clients.get_table_client(connection_string, admin_table_name)
+            admin_count = 0
+            async for _ in table_client.query_entities("PartitionKey eq 'admins'", select=['RowKey']):
+                admin_count += 1
+            if admin_count:
+                logging.info(f"Current admin count (from table): {admin_count}")
+                return admin_count
+
+        http_client.before_call('manageAdmins')
+        connect_timeout, read_timeout = ADMIN_API_TIMEOUT
+        try:
+            async with aio_clients.get_http_session().get(
+                ADMIN_API_URL,
+                headers={'Content-Type': 'application/json'},
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+            ) as response:
+                http_client.record_result('manageAdmins', success=response.status < 500)
+                if response.status != 200:
+                    logging.warning(f"Admin API returned status {response.status}")
+                    return None
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            http_client.record_result('manageAdmins', success=False)
+            raise
+
+        if data.get('success') and data.get('admins'):
+            admin_count = len(data['admins'])
+            logging.info(f"Current admin count: {admin_count}")
+            return admin_count
+        logging.warning("Admin API returned success=false or no admins found")
+        return None
+    except Exception as e:
+        logging.error(f"Failed to fetch admin count: {str(e)}")
+        return None
+
+async def get_admin_count_async():
+    """Same cache as get_admin_count; only a cold cache waits, on the async fetch"""
+    admin_count = cached_admin_count()
+    if admin_count is not None:
+        return admin_count
+    return store_admin_count(await fetch_admin_count_async())
+
+async def save_vote_async(table_client, entity, email, action, approval_threshold, denial_threshold):
+    """Async counterpart of save_vote: ETag-matched write, re-reading and re-applying the vote on a conflict"""
+    partition_key = entity['PartitionKey']
+    row_key = entity['RowKey']
+    for attempt in range(1, MAX_VOTE_ATTEMPTS + 1):
+        current_timestamp = datetime.utcnow().isoformat() + 'Z'
+        before = applicant_stats.snapshot(entity, approval_threshold, denial_threshold)
+        response_message, status_code, verdict, error = apply_vote(
+            entity, email, action, approval_threshold, denial_threshold, current_timestamp
+        )
+        if error:
+            return entity, before, None, 400, None, error
+        
+        try:
+            await table_client.update_entity(
+                entity=entity,
+                mode='replace',
+                etag=entity.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            logging.info('Entity updated successfully')
+            return entity, before, response_message, status_code, verdict, None
+        except ResourceModifiedError:
+            logging.warning(f"Concurrent update on {partition_key}/{row_key}, retrying vote (attempt {attempt}/{MAX_VOTE_ATTEMPTS})")
+            entity = await table_client.get_entity(partition_key=partition_key, row_key=row_key)
+    
+    return entity, None, None, 409, None, "Could not record vote due to concurrent updates, please retry"
+
+async def main(req: HttpRequest) -> HttpResponse:
+    """
+    Async variant of addApproval. The applicant read and the admin count lookup
+    run concurrently, the vote is written through the aio table client, and the
+    summary row, dashboard counters and verdict notification (best-effort writes
+    through the shared synchronous helpers) run side by side on worker threads.
+    """
+    logging.info('AddApprovalAsync function processed a request.')
+    try:
+        connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+        if not connection_string:
+            logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Azure Storage connection string not configured"
+                }),
+                status_code=500,
+                mimetype="application/json"
+            )
+        
+        fields, error_response = parse_vote_request(req)
+        if error_response:
+            return error_response
+        email, partition_key, row_key, action = fields
+        
+        table_client = aio_clients.get_table_client(connection_string, 'DynamoInfo')
+        try:
+            entity, admin_count = await asyncio.gather(
+                table_client.get_entity(partition_key=partition_key, row_key=row_key),
+                get_admin_count_async()
+            )
+        except ResourceNotFoundError:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Entity not found in DynamoInfo table",
+                    "partitionKey": partition_key,
+                    "rowKey": row_key
+                }),
+                status_code=404,
+                mimetype="application/json"
+            )
+        approval_threshold, denial_threshold = calculate_thresholds(admin_count)
+        
+        entity, before, response_message, status_code, verdict, error = await save_vote_async(
+            table_client, entity, email, action, approval_threshold, denial_threshold
+        )
+        if error:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": error,
+                    "partitionKey": partition_key,
+                    "rowKey": row_key
+                }),
+                status_code=status_code,
+                mimetype="application/json"
+            )
+        
+        side_effects = [
+            asyncio.to_thread(applicant_summary.try_upsert, connection_string, [entity], approval_threshold, denial_threshold),
+            asyncio.to_thread(record_stats, connection_string, [(before, entity, verdict)], approval_threshold, denial_threshold),
+        ]
+        # Notify only once the verdict has actually been persisted
+        if verdict:
+            side_effects.append(asyncio.to_thread(notify_verdict, entity))
+        for result in await asyncio.gather(*side_effects, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.error(f"Post-vote update failed: {str(result)}")
+        
+        return vote_response(entity, action, response_message, status_code, admin_count, approval_threshold, denial_threshold)
+        
+    except Exception as e:
+        logging.error(f"Error processing request: {str(e)}")
+        return HttpResponse(
+            json_encoding.dumps({
+                "error": "Internal server error",
+                "details": str(e)
+            }),
+            status_code=500,
+            mimetype="application/json"
+        )
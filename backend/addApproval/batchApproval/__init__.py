@@ -0,0 +1,282 @@
+import logging
+import os
+import re
+from datetime import datetime
+from collections import OrderedDict
+from dotenv import load_dotenv
+from azure.functions import HttpRequest, HttpResponse
+from azure.data.tables import TableTransactionError, UpdateMode
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+from ..shared_code.storage_clients import get_table_client
+from ..shared_code import applicant_stats, applicant_summary, json_encoding
+from ..addApproval import (
+    apply_vote,
+    calculate_thresholds,
+    get_admin_count,
+    notify_verdict,
+    record_stats,
+    save_vote,
+    vote_summary
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+MAX_BATCH_ITEMS = 1000
+# Table Storage transactions are limited to 100 operations in one partition
+TRANSACTION_SIZE = 100
+# Filters are limited to 15 comparisons: one for PartitionKey plus 14 RowKeys
+ROW_KEYS_PER_QUERY = 14
+
+def fetch_entities(table_client, partition_key, row_keys):
+    """Fetch many entities from one partition with a few filtered queries instead of point reads"""
+    entities = {}
+    for start in range(0, len(row_keys), ROW_KEYS_PER_QUERY):
+        chunk = row_keys[start:start + ROW_KEYS_PER_QUERY]
+        parameters = {'pk': partition_key}
+        clauses = []
+        for i, row_key in enumerate(chunk):
+            parameters[f'rk{i}'] = row_key
+            clauses.append(f"RowKey eq @rk{i}")
+        query_filter = f"PartitionKey eq @pk and ({' or '.join(clauses)})"
+        for entity in table_client.query_entities(query_filter, parameters=parameters):
+            entities[entity['RowKey']] = entity
+    return entities
+
+def item_result(item, status_code, message=None, error=None, summary=None):
+    result = {
+        "partitionKey": item.get('partitionKey'),
+        "rowKey": item.get('rowKey'),
+        "action": item.get('action'),
+        "statusCode": status_code,
+        "success": error is None
+    }
+    if error is not None:
+        result["error"] = error
+    else:
+        result["message"] = message
+        result.update(summary or {})
+    return result
+
+def main(req: HttpRequest) -> HttpResponse:
+    """
+    Record many approve/deny votes from one admin in a single request
+
+    Expected JSON body:
+    {
+        "email": "admin@red-p.org",
+        "items": [
+            {"partitionKey": "signup", "rowKey": "...", "action": "approve"},
+            ...
+        ]
+    }
+    """
+    logging.info('BatchApproval function processed a request.')
+    try:
+        connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+        if not connection_string:
+            logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Azure Storage connection string not configured"
+                }),
+                status_code=500,
+                mimetype="application/json"
+            )
+        
+        try:
+            req_body = req.get_json()
+        except ValueError:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Invalid JSON in request body"
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        email = (req_body or {}).get('email')
+        items = (req_body or {}).get('items')
+        if not email or not isinstance(items, list) or not items:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Missing required fields: email, items"
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        if len(items) > MAX_BATCH_ITEMS:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": f"Too many items, at most {MAX_BATCH_ITEMS} votes per request"
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+        if not re.match(email_regex, email):
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Invalid email format"
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        # Validate items and group them by partition
+        results = [None] * len(items)
+        by_partition = OrderedDict()
+        seen = set()
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = item_result({}, 400, error="Each item must be an object")
+                continue
+            partition_key = item.get('partitionKey')
+            row_key = item.get('rowKey')
+            if not partition_key or not row_key:
+                results[index] = item_result(item, 400, error="Missing required fields: partitionKey, rowKey")
+                continue
+            if not isinstance(partition_key, str) or not isinstance(row_key, str):
+                # Lists or objects here would also break the duplicate check below
+                results[index] = item_result(item, 400, error="partitionKey and rowKey must be strings")
+                continue
+            if item.get('action', 'approve') not in ['approve', 'deny']:
+                results[index] = item_result(item, 400, error="Invalid action. Must be 'approve' or 'deny'")
+                continue
+            if (partition_key, row_key) in seen:
+                results[index] = item_result(item, 400, error="Duplicate item in batch")
+                continue
+            seen.add((partition_key, row_key))
+            by_partition.setdefault(partition_key, []).append(index)
+        
+        table_client = get_table_client(connection_string, 'DynamoInfo')
+        
+        # Thresholds are computed once for the whole batch
+        admin_count = get_admin_count()
+        approval_threshold, denial_threshold = calculate_thresholds(admin_count)
+        current_timestamp = datetime.utcnow().isoformat() + 'Z'
+        
+        verdicts = []
+        updated = []
+        changes = []
+        for partition_key, indexes in by_partition.items():
+            # Failures are contained to this partition so votes already committed still get their follow-up writes
+            try:
+                entities = fetch_entities(table_client, partition_key, [items[i]['rowKey'] for i in indexes])
+            except Exception as e:
+                logging.error(f"Failed to read partition {partition_key}: {str(e)}")
+                for index in indexes:
+                    results[index] = item_result(items[index], 500, error=f"Failed to read entity: {str(e)}")
+                continue
+            
+            # Apply votes in memory
+            pending = []
+            for index in indexes:
+                item = items[index]
+                action = item.get('action', 'approve')
+                entity = entities.get(item['rowKey'])
+                if entity is None:
+                    results[index] = item_result(item, 404, error="Entity not found in DynamoInfo table")
+                    continue
+                before = applicant_stats.snapshot(entity, approval_threshold, denial_threshold)
+                message, status_code, verdict, error = apply_vote(
+                    entity, email, action, approval_threshold, denial_threshold, current_timestamp
+                )
+                if error:
+                    results[index] = item_result(item, 400, error=error)
+                    continue
+                pending.append((index, entity, before, message, status_code, verdict))
+            
+            # Commit in transactional batches; ETags guard against concurrent voters
+            for start in range(0, len(pending), TRANSACTION_SIZE):
+                chunk = pending[start:start + TRANSACTION_SIZE]
+                operations = [
+                    ('update', entity, {
+                        'mode': UpdateMode.REPLACE,
+                        'etag': entity.metadata['etag'],
+                        'match_condition': MatchConditions.IfNotModified
+                    })
+                    for _, entity, _, _, _, _ in chunk
+                ]
+                try:
+                    table_client.submit_transaction(operations)
+                    committed = chunk
+                except TableTransactionError as e:
+                    # Some entity changed underneath us; fall back to per-item conditional writes
+                    logging.warning(f"Batch transaction failed for partition {partition_key}, retrying items individually: {str(e)}")
+                    committed = []
+                    for index, entity, _, _, _, _ in chunk:
+                        item = items[index]
+                        try:
+                            fresh = table_client.get_entity(partition_key=partition_key, row_key=item['rowKey'])
+                            fresh, before, message, status_code, verdict, error = save_vote(
+                                table_client, fresh, email, item.get('action', 'approve'),
+                                approval_threshold, denial_threshold
+                            )
+                        except ResourceNotFoundError:
+                            results[index] = item_result(item, 404, error="Entity not found in DynamoInfo table")
+                            continue
+                        except Exception as e:
+                            logging.error(f"Failed to record vote on {partition_key}/{item['rowKey']}: {str(e)}")
+                            results[index] = item_result(item, 500, error=f"Failed to record vote: {str(e)}")
+                            continue
+                        if error:
+                            results[index] = item_result(item, status_code, error=error)
+                        else:
+                            committed.append((index, fresh, before, message, status_code, verdict))
+                except Exception as e:
+                    # e.g. throttling or a timeout: the transaction is atomic, so none of this chunk is known to be written
+                    logging.error(f"Batch transaction failed for partition {partition_key}: {str(e)}")
+                    committed = []
+                    for index, _, _, _, _, _ in chunk:
+                        results[index] = item_result(items[index], 500, error=f"Failed to record vote: {str(e)}")
+                
+                for index, entity, before, message, status_code, verdict in committed:
+                    results[index] = item_result(
+                        items[index], status_code, message=message,
+                        summary=vote_summary(entity, approval_threshold, denial_threshold)
+                    )
+                    updated.append(entity)
+                    changes.append((before, entity, verdict))
+                    if verdict:
+                        verdicts.append(entity)
+        
+        # Refresh the dashboard summary rows in a few transactions, for every vote that was committed
+        if updated:
+            applicant_summary.try_upsert(connection_string, updated, approval_threshold, denial_threshold)
+            record_stats(connection_string, changes, approval_threshold, denial_threshold)
+        
+        # Notify only once the verdicts have been persisted
+        for entity in verdicts:
+            notify_verdict(entity)
+        
+        succeeded = sum(1 for r in results if r["success"])
+        response = {
+            "adminCount": admin_count,
+            "approvalThreshold": approval_threshold,
+            "denialThreshold": denial_threshold,
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        }
+        
+        return HttpResponse(
+            json_encoding.dumps(response),
+            status_code=200,
+            mimetype="application/json"
+        )
+        
+    except Exception as e:
+        logging.error(f"Error processing batch request: {str(e)}")
+        return HttpResponse(
+            json_encoding.dumps({
+                "error": "Internal server error",
+                "details": str(e)
+            }),
+            status_code=500,
+            mimetype="application/json"
+        )
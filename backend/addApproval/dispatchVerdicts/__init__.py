@@ -0,0 +1,43 @@
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from azure.functions import TimerRequest
+from ..shared_code.storage_clients import get_table_client
+from ..shared_code import verdict_outbox
+
+# Load environment variables from .env file
+load_dotenv()
+
+_last_sweep = None
+
+def sweep_stranded_verdicts(connection_string):
+    """Every MARKER_SWEEP_INTERVAL_SECONDS, queue verdict flags that their vote request did not get to queue"""
+    global _last_sweep
+    if _last_sweep is not None and time.monotonic() - _last_sweep < verdict_outbox.MARKER_SWEEP_INTERVAL_SECONDS:
+        return
+    _last_sweep = time.monotonic()
+    try:
+        verdict_outbox.sweep_markers(connection_string, get_table_client(connection_string, 'DynamoInfo'))
+    except Exception as e:
+        logging.error(f"Verdict flag sweep failed: {str(e)}")
+
+def main(timer: TimerRequest) -> None:
+    """
+    Drain the verdict outbox, delivering pending Power Automate notifications,
+    after queuing any verdict flags left behind on applicants
+    """
+    connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    if not connection_string:
+        logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
+        return
+
+    if timer.past_due:
+        logging.warning('Verdict dispatcher is running late')
+
+    sweep_stranded_verdicts(connection_string)
+
+    delivered, failed = verdict_outbox.dispatch_pending(connection_string)
+    # Keep draining while full batches are being delivered
+    while delivered == verdict_outbox.DISPATCH_BATCH_SIZE and failed == 0:
+        delivered, failed = verdict_outbox.dispatch_pending(connection_string)
@@ -0,0 +1,54 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from azure.functions import TimerRequest
+from ..shared_code.storage_clients import get_table_client
+from ..shared_code import applicant_stats, applicant_summary
+from ..addApproval import calculate_thresholds, get_admin_count
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Each pass re-reads the end of the previous window so rows committed while it ran are not missed
+CURSOR_OVERLAP_SECONDS = 60
+
+def main(timer: TimerRequest) -> None:
+    """
+    Keep ApplicantSummary and the ApplicantStats counters in step with
+    DynamoInfo for writes that do not go through this app, such as new signups.
+    The cursor is stored in ApplicantStats, so only the first pass ever rebuilds
+    the summary table and recomputes the counters from a full scan. Later passes
+    refresh the summary rows of applicants written since the previous one,
+    whichever worker ran it, and apply the counter changes for the rows that
+    were new or out of date.
+    """
+    connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    if not connection_string:
+        logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
+        return
+
+    if timer.past_due:
+        logging.warning('Applicant reconciler is running late')
+
+    approval_threshold, denial_threshold = calculate_thresholds(get_admin_count())
+    table_client = get_table_client(connection_string, 'DynamoInfo')
+    next_since = datetime.now(timezone.utc) - timedelta(seconds=CURSOR_OVERLAP_SECONDS)
+    try:
+        state_client = applicant_stats.get_stats_client(connection_string)
+        summary_client = applicant_summary.get_summary_client(connection_string)
+        since = applicant_summary.read_cursor(state_client)
+        if since is None:
+            applicant_summary.rebuild(table_client, summary_client, approval_threshold, denial_threshold)
+            applicant_stats.rebuild(table_client, state_client, approval_threshold, denial_threshold)
+        else:
+            changes = applicant_summary.sync_changed(
+                table_client, summary_client, since, approval_threshold, denial_threshold
+            )
+            applicant_stats.try_apply(
+                connection_string, applicant_stats.sync_deltas(changes, approval_threshold, denial_threshold)
+            )
+        applicant_summary.save_cursor(state_client, next_since)
+    except Exception as e:
+        # The cursor stays put, so the next pass covers this window again
+        logging.error(f"Failed to reconcile {applicant_summary.SUMMARY_TABLE_NAME} and {applicant_stats.STATS_TABLE_NAME}: {str(e)}")
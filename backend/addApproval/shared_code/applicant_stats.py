@@ -0,0 +1,245 @@
+"""
+Incrementally maintained dashboard counters.
+
+Counters live in one partition of the ApplicantStats table, one row per counter
+with an integer Count:
+
+    status:<status>                 applicants per status
+    redpStatus:<RedpStatus>         applicants per RedpStatus ('' when unset)
+    votesPending                    applicants without a verdict yet
+    verdicts:<YYYY-MM-DD>:<verdict> verdicts reached per day
+
+Write paths take a snapshot of the applicant before and after a change and apply
+the difference with ETag-conditional updates, so concurrent writers never lose
+increments. Reading every counter is a single partition query.
+
+Applicants created outside those write paths (the signup form) never pass
+through them. addApproval's reconcileApplicants timer picks them up from its
+incremental ApplicantSummary sync: an applicant without a summary row yet is
+added to the counters, and one whose summary row was out of date has the
+difference applied, so new applicants are counted within one timer interval
+without scanning DynamoInfo.
+
+The counters are recomputed from a full (projected) scan of DynamoInfo only on
+the reconciler's very first pass, or by hand to correct drift with:
+
+    python -m shared_code.applicant_stats [admin_count]
+
+The recompute writes each counter with an ETag condition taken before the scan,
+so a counter incremented while it runs is left as it is (and reported) rather
+than overwritten; run it again to settle those. Run the vote ledger migration
+first so approvalCount/denialCount are populated.
+"""
+import logging
+import math
+import os
+from datetime import datetime
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import UpdateMode
+
+from .applicant_summary import vote_counts
+from .storage_clients import ensure_table
+
+STATS_TABLE_NAME = os.environ.get('APPLICANT_STATS_TABLE_NAME', 'ApplicantStats')
+COUNTER_PARTITION = 'counters'
+VOTES_PENDING_KEY = 'votesPending'
+MAX_INCREMENT_ATTEMPTS = 10
+
+
+def get_stats_client(connection_string):
+    return ensure_table(connection_string, STATS_TABLE_NAME)
+
+
+def status_key(status):
+    return f"status:{status}"
+
+
+def redp_status_key(redp_status):
+    return f"redpStatus:{redp_status or ''}"
+
+
+def verdict_key(verdict, day=None):
+    day = day or datetime.utcnow().date().isoformat()
+    return f"verdicts:{day}:{verdict}"
+
+
+def snapshot(entity, approval_threshold=None, denial_threshold=None):
+    """Capture the counter-relevant state of an applicant; isComplete is None when thresholds are unknown"""
+    is_complete = None
+    if approval_threshold is not None and denial_threshold is not None:
+        approvals, denials = vote_counts(entity)
+        is_complete = approvals >= approval_threshold or denials >= denial_threshold
+    return {
+        'status': entity.get('status'),
+        'RedpStatus': entity.get('RedpStatus') or '',
+        'isComplete': is_complete
+    }
+
+
+def diff(before, after, deltas=None):
+    """Accumulate the counter changes between two snapshots into deltas"""
+    deltas = {} if deltas is None else deltas
+
+    def add(key, amount):
+        deltas[key] = deltas.get(key, 0) + amount
+
+    if before['status'] != after['status']:
+        add(status_key(before['status']), -1)
+        add(status_key(after['status']), 1)
+    if before['RedpStatus'] != after['RedpStatus']:
+        add(redp_status_key(before['RedpStatus']), -1)
+        add(redp_status_key(after['RedpStatus']), 1)
+    if before['isComplete'] is not None and after['isComplete'] is not None:
+        add(VOTES_PENDING_KEY, int(not after['isComplete']) - int(not before['isComplete']))
+    return deltas
+
+
+def added(state, deltas=None):
+    """Accumulate the counters for an applicant that was not counted before into deltas"""
+    deltas = {} if deltas is None else deltas
+    for key in (status_key(state['status']), redp_status_key(state['RedpStatus'])):
+        deltas[key] = deltas.get(key, 0) + 1
+    if state['isComplete'] is not None:
+        deltas[VOTES_PENDING_KEY] = deltas.get(VOTES_PENDING_KEY, 0) + int(not state['isComplete'])
+    return deltas
+
+
+def sync_deltas(changes, approval_threshold=None, denial_threshold=None):
+    """Counter changes for the (previous row or None, new row) pairs returned by applicant_summary.sync_changed"""
+    deltas = {}
+    for previous, current in changes:
+        after = snapshot(current, approval_threshold, denial_threshold)
+        if previous is None:
+            added(after, deltas)
+        else:
+            diff(snapshot(previous, approval_threshold, denial_threshold), after, deltas)
+    return deltas
+
+
+def increment(stats_client, row_key, amount):
+    """Add amount to a counter with an ETag-guarded read-modify-write"""
+    for _ in range(MAX_INCREMENT_ATTEMPTS):
+        try:
+            entity = stats_client.get_entity(partition_key=COUNTER_PARTITION, row_key=row_key)
+        except ResourceNotFoundError:
+            try:
+                stats_client.create_entity({'PartitionKey': COUNTER_PARTITION, 'RowKey': row_key, 'Count': amount})
+                return
+            except ResourceExistsError:
+                continue
+        entity['Count'] = int(entity.get('Count') or 0) + amount
+        try:
+            stats_client.update_entity(
+                entity,
+                mode=UpdateMode.REPLACE,
+                etag=entity.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return
+        except ResourceModifiedError:
+            continue
+    raise RuntimeError(f"Could not update counter {row_key} after {MAX_INCREMENT_ATTEMPTS} attempts")
+
+
+def try_apply(connection_string, deltas):
+    """Best-effort counter maintenance for write paths; failures are logged, not raised"""
+    try:
+        stats_client = get_stats_client(connection_string)
+        for row_key, amount in deltas.items():
+            if amount:
+                increment(stats_client, row_key, amount)
+    except Exception as e:
+        logging.error(f"Failed to update {STATS_TABLE_NAME}: {str(e)}")
+
+
+def read_stats(stats_client):
+    """Read every counter in one partition query and shape it for the dashboard"""
+    stats = {'total': 0, 'status': {}, 'redpStatus': {}, 'votesPending': 0, 'verdictsPerDay': {}}
+    counters = stats_client.query_entities(
+        "PartitionKey eq @pk", parameters={'pk': COUNTER_PARTITION}, select=['RowKey', 'Count']
+    )
+    for counter in counters:
+        row_key = counter['RowKey']
+        count = int(counter.get('Count') or 0)
+        if row_key.startswith('status:'):
+            stats['status'][row_key[len('status:'):]] = count
+            stats['total'] += count
+        elif row_key.startswith('redpStatus:'):
+            stats['redpStatus'][row_key[len('redpStatus:'):]] = count
+        elif row_key == VOTES_PENDING_KEY:
+            stats['votesPending'] = count
+        elif row_key.startswith('verdicts:'):
+            _, day, verdict = row_key.split(':', 2)
+            stats['verdictsPerDay'].setdefault(day, {})[verdict] = count
+    return stats
+
+
+def rebuild(table_client, stats_client, approval_threshold=None, denial_threshold=None):
+    """
+    Recompute the status, RedpStatus and (with thresholds) votesPending counters
+    from the applicant table. Returns the counts of the counters that were written.
+    """
+    # ETags are read first so any increment made during the scan wins over the recompute
+    existing = {
+        e['RowKey']: e for e in stats_client.query_entities(
+            "PartitionKey eq @pk", parameters={'pk': COUNTER_PARTITION}, select=['RowKey', 'Count']
+        )
+    }
+    counts = {}
+    select = ['status', 'RedpStatus', 'approvalCount', 'denialCount']
+    for entity in table_client.list_entities(select=select):
+        added(snapshot(entity, approval_threshold, denial_threshold), counts)
+
+    # Drop stale status counters; verdict history cannot be recomputed and is kept
+    stale = [
+        row_key for row_key in existing
+        if row_key not in counts and (row_key.startswith('status:') or row_key.startswith('redpStatus:'))
+    ]
+    written, skipped = {}, []
+    for row_key in stale + list(counts):
+        current = existing.get(row_key)
+        try:
+            if row_key in stale:
+                stats_client.delete_entity(
+                    partition_key=COUNTER_PARTITION, row_key=row_key,
+                    etag=current.metadata['etag'], match_condition=MatchConditions.IfNotModified
+                )
+            elif current is None:
+                stats_client.create_entity({'PartitionKey': COUNTER_PARTITION, 'RowKey': row_key, 'Count': counts[row_key]})
+            elif int(current.get('Count') or 0) != counts[row_key]:
+                stats_client.update_entity(
+                    {'PartitionKey': COUNTER_PARTITION, 'RowKey': row_key, 'Count': counts[row_key]},
+                    mode=UpdateMode.REPLACE,
+                    etag=current.metadata['etag'],
+                    match_condition=MatchConditions.IfNotModified
+                )
+            if row_key in counts:
+                written[row_key] = counts[row_key]
+        except (ResourceExistsError, ResourceModifiedError, ResourceNotFoundError):
+            skipped.append(row_key)
+    if skipped:
+        logging.warning(f"Counters changed during the rebuild and were left as they are: {', '.join(skipped)}")
+    logging.info(f"Rebuilt {len(written)} counters in {STATS_TABLE_NAME}")
+    return written
+
+
+if __name__ == '__main__':
+    import sys
+    from dotenv import load_dotenv
+    from .storage_clients import get_table_client
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING') or os.environ['AZURE_TABLE_CONNECTION_STRING']
+    thresholds = (None, None)
+    if len(sys.argv) > 1:
+        # Same formula as addApproval.calculate_thresholds
+        admin_count = int(sys.argv[1])
+        thresholds = (max(math.ceil(admin_count * 2 / 3), 1), max(math.ceil(admin_count / 3), 1))
+    rebuild(
+        get_table_client(connection_string, os.environ.get('TABLE_NAME', 'DynamoInfo')),
+        get_stats_client(connection_string),
+        *thresholds
+    )
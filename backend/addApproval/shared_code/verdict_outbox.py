@@ -0,0 +1,243 @@
+"""
+Outbox for Power Automate verdict notifications.
+
+Instead of posting to the flow on the vote request thread, addApproval flags
+the verdict on the applicant entity itself (PendingVerdict, PendingVerdictId,
+PendingVerdictAt) in the same ETag-matched replace that records the vote, so a
+persisted verdict always carries its pending notification. Right after the
+write the vote request queues the flag in the VerdictOutbox table, a single
+insert. If that step is interrupted, the timer-triggered dispatchVerdicts
+function finds the flag with a periodic sweep of DynamoInfo and queues it then;
+the outbox RowKey is derived from the flag, so queuing it twice is harmless.
+
+dispatchVerdicts drains the outbox, retrying failed deliveries with
+exponential backoff and parking rows that keep failing in the 'dead' partition
+for inspection. Once a row is delivered or parked, the dispatcher clears the
+flag from the applicant (unless a newer verdict replaced it), keeping that
+write off the vote request and stopping the sweep from queuing it again.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import requests
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import UpdateMode
+
+from . import http_client
+from .storage_clients import ensure_table, get_table_client
+
+OUTBOX_TABLE_NAME = os.environ.get('VERDICT_OUTBOX_TABLE_NAME', 'VerdictOutbox')
+APPLICANT_TABLE_NAME = 'DynamoInfo'
+POWER_AUTOMATE_FLOW_URL = os.environ.get(
+    'POWER_AUTOMATE_FLOW_URL',
+    "https://prod-37.westus.logic.azure.com:443/workflows/c2a9b1269e53415197930e5fffcb788a/triggers/manual/paths/invoke?api-version=2016-06-01&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=9KZ72xAJyzhzneU7_ntAIL8P-x-InfvHh613oiHyA2w"
+)
+DELIVERY_TIMEOUT = (3.05, 5)
+DISPATCH_BATCH_SIZE = int(os.environ.get('VERDICT_DISPATCH_BATCH_SIZE', '50'))
+MAX_ATTEMPTS = int(os.environ.get('VERDICT_MAX_ATTEMPTS', '8'))
+BASE_BACKOFF_SECONDS = 30
+# Flags younger than this are still being queued by the vote request that set them
+MARKER_GRACE_SECONDS = int(os.environ.get('VERDICT_MARKER_GRACE_SECONDS', '60'))
+MARKER_SWEEP_INTERVAL_SECONDS = int(os.environ.get('VERDICT_MARKER_SWEEP_INTERVAL_SECONDS', '300'))
+MAX_CLEAR_ATTEMPTS = 3
+
+MARKER_FIELDS = ('PendingVerdict', 'PendingVerdictId', 'PendingVerdictAt')
+# Everything outbox_entity reads from an applicant, so the sweep does not pull whole rows
+SWEEP_FIELDS = ['PartitionKey', 'RowKey', 'firstName', 'lastName', 'email', *MARKER_FIELDS]
+
+PENDING_PARTITION = 'pending'
+DEAD_PARTITION = 'dead'
+
+
+def get_outbox_client(connection_string):
+    return ensure_table(connection_string, OUTBOX_TABLE_NAME)
+
+
+def build_payload(recipient, address, verdict, row_key=None):
+    return {
+        "recipient": recipient,
+        "address": address,
+        "verdict": verdict,
+        "rowKey": row_key
+    }
+
+
+def post_verdict(payload):
+    """Deliver one notification to the flow, returning (success, error message)"""
+    try:
+        # No inline retries: a failed delivery stays in the outbox and is retried with backoff
+        response = http_client.post(
+            'powerAutomate',
+            POWER_AUTOMATE_FLOW_URL,
+            json=payload,
+            headers={'Content-Type': 'application/json'},
+            timeout=DELIVERY_TIMEOUT
+        )
+        if response.status_code in (200, 202):
+            return True, None
+        return False, f"Flow returned status {response.status_code}"
+    except requests.exceptions.RequestException as e:
+        return False, str(e)
+
+
+def mark_pending(entity, verdict, at=None):
+    """Flag a verdict notification on the applicant entity so it is persisted by the same write as the verdict"""
+    entity['PendingVerdict'] = verdict
+    entity['PendingVerdictId'] = uuid.uuid4().hex
+    entity['PendingVerdictAt'] = at or datetime.now(timezone.utc)
+
+
+def outbox_entity(applicant, now=None):
+    """Outbox row for an applicant's pending verdict flag"""
+    now = now or datetime.now(timezone.utc)
+    flagged_at = applicant['PendingVerdictAt']
+    return {
+        'PartitionKey': PENDING_PARTITION,
+        # Millisecond prefix keeps the partition in FIFO order; the flag id makes the key idempotent
+        'RowKey': f"{int(flagged_at.timestamp() * 1000):013d}_{applicant['PendingVerdictId']}",
+        'Recipient': f"{applicant.get('firstName', 'Applicant')} {applicant.get('lastName', '')}",
+        'Address': applicant.get('email', 'Unknown'),
+        'Verdict': applicant['PendingVerdict'],
+        'ApplicantPartitionKey': applicant['PartitionKey'],
+        'ApplicantRowKey': applicant['RowKey'],
+        'Attempts': 0,
+        'NextAttemptAt': now,
+        'CreatedAt': now.isoformat()
+    }
+
+
+def marker_id(outbox_row):
+    """The applicant flag id an outbox row was queued from (the RowKey suffix)"""
+    return outbox_row['RowKey'].split('_', 1)[1]
+
+
+def clear_marker(table_client, partition_key, row_key, pending_id):
+    """Remove a queued verdict flag from the applicant unless a newer verdict has replaced it"""
+    for _ in range(MAX_CLEAR_ATTEMPTS):
+        try:
+            current = table_client.get_entity(partition_key=partition_key, row_key=row_key)
+        except ResourceNotFoundError:
+            return
+        if current.get('PendingVerdictId') != pending_id:
+            return
+        cleared = {k: v for k, v in current.items() if k not in MARKER_FIELDS}
+        try:
+            table_client.update_entity(
+                entity=cleared,
+                mode=UpdateMode.REPLACE,
+                etag=current.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return
+        except ResourceModifiedError:
+            continue
+    # Left in place: the sweep re-queues it under the same outbox key
+    logging.warning(f"Could not clear verdict flag on {partition_key}/{row_key}")
+
+
+def try_clear_marker(table_client, outbox_row):
+    """clear_marker for a delivered or parked outbox row; failures are logged, not raised"""
+    try:
+        clear_marker(
+            table_client, outbox_row['ApplicantPartitionKey'], outbox_row['ApplicantRowKey'], marker_id(outbox_row)
+        )
+    except Exception as e:
+        logging.warning(f"Could not clear verdict flag for notification {outbox_row['RowKey']}: {str(e)}")
+
+
+def enqueue_pending(connection_string, applicant):
+    """Queue an applicant's flagged verdict in the outbox; returns the outbox RowKey"""
+    if not applicant.get('PendingVerdictId'):
+        return None
+    entity = outbox_entity(applicant)
+    try:
+        get_outbox_client(connection_string).create_entity(entity=entity)
+        logging.info(f"Queued {entity['Verdict']} notification for {entity['Recipient']} (rowKey: {applicant['RowKey']})")
+    except ResourceExistsError:
+        logging.info(f"Verdict notification {entity['RowKey']} was already queued")
+    return entity['RowKey']
+
+
+def sweep_markers(connection_string, table_client):
+    """
+    Queue verdict flags left on applicants by requests that stopped before
+    queuing them. Flag fields only exist on flagged rows, so the filter skips
+    every other applicant server-side, and only the columns the outbox row
+    needs are returned. Returns the number queued.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=MARKER_GRACE_SECONDS)
+    stranded = table_client.query_entities(
+        "PendingVerdictAt lt @cutoff", parameters={'cutoff': cutoff}, select=SWEEP_FIELDS
+    )
+    queued = 0
+    for applicant in stranded:
+        try:
+            enqueue_pending(connection_string, applicant)
+            queued += 1
+        except Exception as e:
+            logging.error(f"Failed to queue stranded verdict for {applicant['PartitionKey']}/{applicant['RowKey']}: {str(e)}")
+    if queued:
+        logging.warning(f"Queued {queued} stranded verdict notification(s)")
+    return queued
+
+
+def dispatch_pending(connection_string, batch_size=DISPATCH_BATCH_SIZE):
+    """
+    Deliver up to batch_size due notifications. Delivered rows are removed in one
+    transaction; failures are rescheduled with backoff or moved to the dead partition.
+    Delivered and parked rows have their applicant flag cleared. Returns (delivered, failed).
+    """
+    outbox = get_outbox_client(connection_string)
+    applicants = get_table_client(connection_string, APPLICANT_TABLE_NAME)
+    now = datetime.now(timezone.utc)
+    due = outbox.query_entities(
+        "PartitionKey eq @pk and NextAttemptAt le @now",
+        parameters={'pk': PENDING_PARTITION, 'now': now},
+        results_per_page=batch_size
+    )
+
+    delivered = []
+    failed = 0
+    for entity in due:
+        if len(delivered) + failed >= batch_size:
+            break
+        payload = build_payload(
+            entity.get('Recipient'), entity.get('Address'),
+            entity.get('Verdict'), entity.get('ApplicantRowKey')
+        )
+        if http_client.is_open('powerAutomate'):
+            # The flow is known to be down; leave the rest due without spending their attempts
+            logging.warning("Stopping dispatch: circuit for powerAutomate is open")
+            break
+        success, error = post_verdict(payload)
+        if success:
+            # Cleared before the row is deleted, so a failure here cannot let the sweep queue it again unseen
+            try_clear_marker(applicants, entity)
+            delivered.append(('delete', entity))
+            continue
+
+        failed += 1
+        attempts = int(entity.get('Attempts') or 0) + 1
+        entity['Attempts'] = attempts
+        entity['LastError'] = error
+        logging.warning(f"Verdict notification {entity['RowKey']} failed (attempt {attempts}): {error}")
+        if attempts >= MAX_ATTEMPTS:
+            dead = dict(entity)
+            dead['PartitionKey'] = DEAD_PARTITION
+            outbox.upsert_entity(dead)
+            outbox.delete_entity(partition_key=PENDING_PARTITION, row_key=entity['RowKey'])
+            try_clear_marker(applicants, entity)
+            logging.error(f"Verdict notification {entity['RowKey']} moved to dead partition after {attempts} attempts")
+        else:
+            entity['NextAttemptAt'] = now + timedelta(seconds=BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+            outbox.update_entity(entity, mode=UpdateMode.MERGE)
+
+    # All delivered rows share the pending partition, so they can be removed in one transaction
+    for start in range(0, len(delivered), 100):
+        outbox.submit_transaction(delivered[start:start + 100])
+
+    logging.info(f"Dispatched {len(delivered)} verdict notification(s), {failed} failed")
+    return len(delivered), failed
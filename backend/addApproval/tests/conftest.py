@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import shared_code the way the function host does, with the app folder on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,157 @@
+"""
+dispatch_pending against a local HTTP receiver standing in for the Power
+Automate flow, with in-memory tables in place of Azure Table storage.
+"""
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import TableEntity, UpdateMode
+
+from shared_code import http_client, verdict_outbox
+
+
+class FakeTable:
+    """The TableClient calls the outbox uses, over a dict keyed by (PartitionKey, RowKey)"""
+
+    def __init__(self):
+        self.rows = {}
+        self.transactions = []
+
+    def _store(self, entity):
+        row = TableEntity(entity)
+        row._metadata = {'etag': uuid.uuid4().hex}
+        self.rows[(entity['PartitionKey'], entity['RowKey'])] = row
+
+    def get_entity(self, partition_key, row_key):
+        try:
+            return self.rows[(partition_key, row_key)]
+        except KeyError:
+            raise ResourceNotFoundError("Not found")
+
+    def create_entity(self, entity):
+        if (entity['PartitionKey'], entity['RowKey']) in self.rows:
+            raise ResourceExistsError("Exists")
+        self._store(entity)
+
+    def upsert_entity(self, entity):
+        self._store(entity)
+
+    def update_entity(self, entity, mode=UpdateMode.MERGE, etag=None, match_condition=None):
+        current = self.get_entity(entity['PartitionKey'], entity['RowKey'])
+        if etag is not None and current.metadata['etag'] != etag:
+            raise ResourceModifiedError("ETag mismatch")
+        self._store({**current, **entity} if mode == UpdateMode.MERGE else entity)
+
+    def delete_entity(self, partition_key, row_key):
+        self.rows.pop((partition_key, row_key), None)
+
+    def query_entities(self, query_filter, parameters=None, **kwargs):
+        # Only the dispatcher's due-rows query is needed here
+        assert query_filter == "PartitionKey eq @pk and NextAttemptAt le @now"
+        return [
+            row for (pk, _), row in sorted(self.rows.items())
+            if pk == parameters['pk'] and row['NextAttemptAt'] <= parameters['now']
+        ]
+
+    def submit_transaction(self, operations):
+        assert len(operations) <= 100
+        assert len({entity['PartitionKey'] for _, entity in operations}) == 1
+        self.transactions.append(operations)
+        for action, entity in operations:
+            assert action == 'delete'
+            self.delete_entity(entity['PartitionKey'], entity['RowKey'])
+
+
+class FlowHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append(json.loads(body))
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flow(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), FlowHandler)
+    server.received = []
+    server.status = 202
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(verdict_outbox, 'POWER_AUTOMATE_FLOW_URL', f"http://127.0.0.1:{server.server_port}/flow")
+    monkeypatch.setattr(http_client, '_circuits', {})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    outbox, applicants = FakeTable(), FakeTable()
+    monkeypatch.setattr(verdict_outbox, 'get_outbox_client', lambda connection_string: outbox)
+    monkeypatch.setattr(verdict_outbox, 'get_table_client', lambda connection_string, table_name: applicants)
+    return outbox, applicants
+
+
+def flag_applicant(outbox, applicants, row_key, verdict='Approved'):
+    """Flag a verdict on a new applicant and queue it the way notify_verdict does"""
+    applicant = {'PartitionKey': 'applicant', 'RowKey': row_key, 'firstName': 'Jane', 'lastName': row_key,
+                 'email': f"{row_key}@example.com"}
+    verdict_outbox.mark_pending(applicant, verdict)
+    applicants.upsert_entity(applicant)
+    return outbox.get_entity(verdict_outbox.PENDING_PARTITION, verdict_outbox.enqueue_pending('cs', applicant))
+
+
+def test_delivered_rows_are_posted_cleared_and_deleted_in_one_transaction(flow, tables):
+    outbox, applicants = tables
+    for row_key in ('a', 'b', 'c'):
+        flag_applicant(outbox, applicants, row_key)
+
+    assert verdict_outbox.dispatch_pending('cs') == (3, 0)
+
+    assert sorted(payload['rowKey'] for payload in flow.received) == ['a', 'b', 'c']
+    assert flow.received[0]['verdict'] == 'Approved'
+    assert outbox.rows == {}
+    assert len(outbox.transactions) == 1 and len(outbox.transactions[0]) == 3
+    for row_key in ('a', 'b', 'c'):
+        assert 'PendingVerdictId' not in applicants.get_entity('applicant', row_key)
+
+
+def test_failed_delivery_is_rescheduled_with_backoff(flow, tables):
+    outbox, applicants = tables
+    queued = flag_applicant(outbox, applicants, 'a')
+    flow.status = 400
+
+    before = datetime.now(timezone.utc)
+    assert verdict_outbox.dispatch_pending('cs') == (0, 1)
+
+    row = outbox.get_entity(verdict_outbox.PENDING_PARTITION, queued['RowKey'])
+    assert row['Attempts'] == 1
+    assert row['LastError'] == "Flow returned status 400"
+    assert row['NextAttemptAt'] >= before + timedelta(seconds=verdict_outbox.BASE_BACKOFF_SECONDS)
+    # Not due again yet, and the flag stays until it is delivered
+    assert verdict_outbox.dispatch_pending('cs') == (0, 0)
+    assert len(flow.received) == 1
+    assert applicants.get_entity('applicant', 'a')['PendingVerdictId'] == queued['RowKey'].split('_', 1)[1]
+
+
+def test_last_failed_attempt_parks_row_in_dead_partition(flow, tables):
+    outbox, applicants = tables
+    queued = flag_applicant(outbox, applicants, 'a', verdict='Denied')
+    outbox.update_entity({**queued, 'Attempts': verdict_outbox.MAX_ATTEMPTS - 1})
+    flow.status = 400
+
+    assert verdict_outbox.dispatch_pending('cs') == (0, 1)
+
+    assert (verdict_outbox.PENDING_PARTITION, queued['RowKey']) not in outbox.rows
+    dead = outbox.get_entity(verdict_outbox.DEAD_PARTITION, queued['RowKey'])
+    assert dead['Attempts'] == verdict_outbox.MAX_ATTEMPTS
+    assert dead['Verdict'] == 'Denied'
+    assert 'PendingVerdictId' not in applicants.get_entity('applicant', 'a')
@@ -1,13 +1,13 @@
+import asyncio
 import azure.functions as func
-import json
 import logging
 import random
 import string
 from datetime import datetime, timedelta
-from azure.data.tables import TableServiceClient, TableEntity
 import os
+from azure.core.exceptions import ResourceNotFoundError
 from dotenv import load_dotenv
-import requests
+from shared_code import aio_clients, auth_codes, email_delivery, http_client, json_encoding, rate_limit, storage_clients
 
 # Load environment variables from .env file (for local development)
 try:
@@ -23,8 +23,22 @@ AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRIN
 TABLE_NAME = os.environ.get('TABLE_NAME', 'AuthCodes')  # Updated default to match .env
 VERIFICATION_CODE_EXPIRY_MINUTES = int(os.environ.get('VERIFICATION_CODE_EXPIRY_MINUTES', '10'))
 
+# Throttling: token buckets per email and per client IP, and reuse of a recently issued code
+RATE_LIMIT_EMAIL_CAPACITY = int(os.environ.get('RATE_LIMIT_EMAIL_CAPACITY', '3'))
+RATE_LIMIT_EMAIL_PER_MINUTE = float(os.environ.get('RATE_LIMIT_EMAIL_PER_MINUTE', '1'))
+RATE_LIMIT_IP_CAPACITY = int(os.environ.get('RATE_LIMIT_IP_CAPACITY', '20'))
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '10'))
+RATE_LIMIT_TABLE_NAME = os.environ.get('RATE_LIMIT_TABLE_NAME')  # unset: per-instance buckets
+CODE_REUSE_WINDOW_MINUTES = int(os.environ.get('CODE_REUSE_WINDOW_MINUTES', '2'))
+
 # Power Automate Flow configuration
 POWER_AUTOMATE_URL = os.environ.get('POWER_AUTOMATE_URL')
+POWER_AUTOMATE_TIMEOUT = (3.05, 30)  # (connect, read); not retried inline so a slow flow cannot email a code twice
+
+# Email delivery: 'queue' hands the email to a storage queue and returns immediately, 'sync' posts to the flow inline
+EMAIL_DELIVERY_MODE = os.environ.get('EMAIL_DELIVERY_MODE', 'queue')
+EMAIL_DELIVERY_QUEUE_NAME = os.environ.get('EMAIL_DELIVERY_QUEUE_NAME', 'verification-emails')
+EMAIL_DELIVERY_MAX_ATTEMPTS = int(os.environ.get('EMAIL_DELIVERY_MAX_ATTEMPTS', '5'))  # the host's default maxDequeueCount
 
 # Enhanced logging for debugging
 logging.info("=== Azure Function Starting ===")
@@ -38,7 +52,9 @@ if AZURE_STORAGE_CONNECTION_STRING:
         logging.info(f"Storage Account: {account}")
 logging.info(f"Table Name: {TABLE_NAME}")
 logging.info(f"Expiry Minutes: {VERIFICATION_CODE_EXPIRY_MINUTES}")
+logging.info(f"AuthCodes layout: {auth_codes.LAYOUT}")
 logging.info(f"Power Automate URL configured: {bool(POWER_AUTOMATE_URL)}")
+logging.info(f"Email delivery mode: {EMAIL_DELIVERY_MODE}")
 
 # Validate required environment variables
 if not AZURE_STORAGE_CONNECTION_STRING:
@@ -53,37 +69,67 @@ logging.info(f"Azure Function initialized with table: {TABLE_NAME}")
 logging.info(f"Verification code expiry: {VERIFICATION_CODE_EXPIRY_MINUTES} minutes")
 
 def get_table_client():
-    """Get Azure Table Storage client"""
+    """Get Azure Table Storage client, provisioning the table once per worker"""
     try:
-        logging.info(f"Attempting to connect to Azure Table Storage")
-        logging.info(f"Connection string exists: {bool(AZURE_STORAGE_CONNECTION_STRING)}")
-        logging.info(f"Table name: {TABLE_NAME}")
-        
-        table_service_client = TableServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        table_client = table_service_client.get_table_client(table_name=TABLE_NAME)
-        
-        # Test the connection by trying to get table properties
-        try:
-            properties = table_client.get_table_properties()
-            logging.info(f"Table '{TABLE_NAME}' exists and is accessible")
-        except Exception as props_error:
-            logging.info(f"Table might not exist, attempting to create: {str(props_error)}")
-            try:
-                table_client.create_table()
-                logging.info(f"Successfully created table: {TABLE_NAME}")
-            except Exception as create_error:
-                if "TableAlreadyExists" in str(create_error) or "already exists" in str(create_error).lower():
-                    logging.info(f"Table '{TABLE_NAME}' already exists")
-                else:
-                    logging.error(f"Failed to create table: {str(create_error)}")
-                    raise
-        
-        return table_client
+        return storage_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, TABLE_NAME)
     except Exception as e:
         logging.error(f"Failed to connect to Azure Table Storage: {str(e)}")
         logging.error(f"Connection string preview: {AZURE_STORAGE_CONNECTION_STRING[:50]}..." if AZURE_STORAGE_CONNECTION_STRING else "None")
         raise
 
+def reset_table_if_missing(error):
+    """Re-provision the codes table on the next request if it has disappeared"""
+    if storage_clients.is_table_not_found(error):
+        logging.warning(f"Table '{TABLE_NAME}' not found, it will be re-created on next use")
+        storage_clients.invalidate_table(AZURE_STORAGE_CONNECTION_STRING, TABLE_NAME)
+        aio_clients.invalidate_table(AZURE_STORAGE_CONNECTION_STRING, TABLE_NAME)
+
+# Verify the table once at startup instead of probing it before every operation
+try:
+    get_table_client()
+except Exception as startup_error:
+    logging.warning(f"Table provisioning deferred: {str(startup_error)}")
+
+def get_rate_limit_table_client():
+    """Table client for shared rate limit buckets, or None to keep buckets in process"""
+    if not RATE_LIMIT_TABLE_NAME:
+        return None
+    try:
+        return storage_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, RATE_LIMIT_TABLE_NAME)
+    except Exception as e:
+        logging.warning(f"Rate limit table unavailable, using in-process buckets: {str(e)}")
+        return None
+
+def check_rate_limits(req, email):
+    """
+    Take a token from the client IP and email buckets; returns a 429 response when
+    either is empty. Tokens already taken are given back when a later bucket rejects
+    the request, so a throttled address does not use up its sender's IP allowance.
+    """
+    limit_table = get_rate_limit_table_client()
+    checks = [
+        (f"ip:{rate_limit.client_ip(req)}", RATE_LIMIT_IP_CAPACITY, RATE_LIMIT_IP_PER_MINUTE),
+        (f"email:{email}", RATE_LIMIT_EMAIL_CAPACITY, RATE_LIMIT_EMAIL_PER_MINUTE),
+    ]
+    taken = []
+    for key, capacity, per_minute in checks:
+        allowed, retry_after = rate_limit.acquire(key, capacity, per_minute, limit_table)
+        if not allowed:
+            logging.warning(f"Rate limit exceeded for {key}, retry after {retry_after}s")
+            for taken_key, taken_capacity in taken:
+                rate_limit.release(taken_key, taken_capacity, limit_table)
+            return func.HttpResponse(
+                json_encoding.dumps({
+                    "error": "Too many verification code requests",
+                    "message": f"Too many verification code requests. Please try again in {retry_after} seconds.",
+                    "retry_after": retry_after
+                }),
+                status_code=429,
+                headers={"Content-Type": "application/json", "Retry-After": str(retry_after)}
+            )
+        taken.append((key, capacity))
+    return None
+
 def generate_verification_code():
     """Generate a 6-character random code using lowercase letters and numbers"""
     characters = string.ascii_lowercase + string.digits
@@ -108,7 +154,7 @@ def send_verification_email(email, verification_code):
         }
         
         logging.info(f"Triggering Power Automate flow for email: {email}")
-        response = requests.post(POWER_AUTOMATE_URL, headers=headers, json=payload, timeout=30)
+        response = http_client.post('powerAutomate', POWER_AUTOMATE_URL, headers=headers, json=payload, timeout=POWER_AUTOMATE_TIMEOUT)
         
         if response.status_code in [200, 202]:
             logging.info(f"Power Automate flow triggered successfully for {email}. Status code: {response.status_code}")
@@ -121,42 +167,166 @@ def send_verification_email(email, verification_code):
         logging.error(f"Failed to trigger Power Automate flow for {email}: {str(e)}")
         return False
 
+def get_delivery_table_client():
+    """Table client for email delivery status rows"""
+    return storage_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, email_delivery.DELIVERY_TABLE_NAME)
+
+def queued_delivery_enabled():
+    return EMAIL_DELIVERY_MODE == 'queue' and bool(POWER_AUTOMATE_URL)
+
+def new_delivery_id():
+    """Delivery id to store on a new code before its email is dispatched, or None when emails are sent inline"""
+    return email_delivery.new_delivery_id() if queued_delivery_enabled() else None
+
+def dispatch_verification_email(email, verification_code, email_queue, delivery_id=None):
+    """
+    Queue the verification email and return without waiting on the flow, falling back to an inline send
+    delivery_id is the id already stored on the code's entity, if any
+    Returns (email_sent, delivery_id, delivery_status)
+    """
+    if queued_delivery_enabled():
+        try:
+            delivery_id = email_delivery.create(get_delivery_table_client(), email, delivery_id=delivery_id)
+            email_queue.set(email_delivery.queue_message(delivery_id, email, verification_code))
+            logging.info(f"Queued verification email for {email} as delivery {delivery_id}")
+            return True, delivery_id, email_delivery.QUEUED
+        except Exception as e:
+            logging.warning(f"Failed to queue verification email, sending inline: {str(e)}")
+    
+    email_sent = send_verification_email(email, verification_code)
+    return email_sent, None, email_delivery.SENT if email_sent else email_delivery.FAILED
+
 def cleanup_expired_entities(table_client):
-    """Remove entities older than the configured expiry time"""
+    """Remove entities older than the configured expiry time using per-partition transactional deletes"""
     try:
         cutoff_time = datetime.utcnow() - timedelta(minutes=VERIFICATION_CODE_EXPIRY_MINUTES)
         
-        # Query for expired entities using our CreatedAt field
-        # Format: YYYY-MM-DDTHH:MM:SS.fffffZ
-        filter_query = f"CreatedAt lt '{cutoff_time.isoformat()}Z'"
-        logging.info(f"Cleanup filter: {filter_query}")
-        
-        expired_entities = table_client.query_entities(query_filter=filter_query)
-        
-        # Delete expired entities
-        deleted_count = 0
-        for entity in expired_entities:
-            try:
-                table_client.delete_entity(
-                    partition_key=entity['PartitionKey'],
-                    row_key=entity['RowKey']
-                )
-                deleted_count += 1
-                logging.info(f"Deleted expired entity: {entity['PartitionKey']}/{entity['RowKey']}")
-            except Exception as e:
-                logging.warning(f"Failed to delete entity {entity['PartitionKey']}/{entity['RowKey']}: {str(e)}")
+        # Whole expired buckets in the bucketed layout, a CreatedAt scan in the email layout
+        expired_entities = auth_codes.query_expired(table_client, cutoff_time)
+        deleted_count = auth_codes.delete_entities(table_client, expired_entities)
         
         logging.info(f"Cleaned up {deleted_count} expired entities")
         return deleted_count
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error during cleanup: {str(e)}")
         return 0
 
+@app.timer_trigger(schedule="0 */5 * * * *", arg_name="timer", run_on_startup=False)
+def sweep_expired_codes(timer: func.TimerRequest) -> None:
+    """
+    Periodically delete expired verification codes so the login path never scans the table
+    """
+    logging.info('Expired code sweeper triggered')
+    if timer.past_due:
+        logging.warning('Expired code sweeper is running late')
+    cleanup_expired_entities(get_table_client())
+    try:
+        deleted = email_delivery.delete_old(get_delivery_table_client())
+        logging.info(f"Cleaned up {deleted} old email delivery records")
+    except Exception as e:
+        logging.error(f"Error cleaning up email delivery records: {str(e)}")
+
+def postpone_delivery(payload, prior_attempts):
+    """
+    Re-queue a delivery to run once the flow's circuit may have closed, without
+    spending one of its attempts; returns False if the message could not be queued
+    """
+    try:
+        queue = storage_clients.get_queue_client(os.environ['AzureWebJobsStorage'], EMAIL_DELIVERY_QUEUE_NAME)
+        queue.send_message(
+            json_encoding.dumps({**payload, 'prior_attempts': prior_attempts}),
+            visibility_timeout=http_client.CIRCUIT_RESET_SECONDS
+        )
+        logging.info(f"Postponed delivery {payload['delivery_id']} by {http_client.CIRCUIT_RESET_SECONDS}s: circuit for powerAutomate is open")
+        return True
+    except Exception as e:
+        logging.warning(f"Failed to postpone delivery {payload['delivery_id']}, retrying it as a failed attempt: {str(e)}")
+        return False
+
+@app.queue_trigger(arg_name="msg", queue_name=EMAIL_DELIVERY_QUEUE_NAME, connection="AzureWebJobsStorage")
+def deliver_verification_email(msg: func.QueueMessage) -> None:
+    """
+    Send a queued verification email via the Power Automate flow
+    Raising leaves the message on the queue so the runtime retries it
+    """
+    payload = msg.get_json()
+    delivery_id = payload['delivery_id']
+    # Messages postponed while the flow's circuit was open carry the attempts made before them
+    attempts = payload.get('prior_attempts', 0) + (msg.dequeue_count or 1)
+    delivery_table = get_delivery_table_client()
+    
+    # No point emailing a code the user can no longer use
+    created_at = auth_codes.parse_created_at(payload['created_at'])
+    if datetime.utcnow() - created_at > timedelta(minutes=VERIFICATION_CODE_EXPIRY_MINUTES):
+        logging.warning(f"Dropping delivery {delivery_id}: code expired before it could be sent")
+        email_delivery.mark(delivery_table, delivery_id, email_delivery.EXPIRED, attempts)
+        return
+    
+    if http_client.is_open('powerAutomate') and postpone_delivery(payload, attempts - 1):
+        email_delivery.mark(delivery_table, delivery_id, email_delivery.RETRYING, attempts - 1, "Power Automate flow is unavailable")
+        return
+    
+    if send_verification_email(payload['email'], payload['code']):
+        email_delivery.mark(delivery_table, delivery_id, email_delivery.SENT, attempts)
+        return
+    
+    if attempts >= EMAIL_DELIVERY_MAX_ATTEMPTS:
+        logging.error(f"Giving up on delivery {delivery_id} after {attempts} attempts")
+        email_delivery.mark(delivery_table, delivery_id, email_delivery.FAILED, attempts, "Power Automate flow did not accept the request")
+        return
+    
+    email_delivery.mark(delivery_table, delivery_id, email_delivery.RETRYING, attempts, "Power Automate flow did not accept the request")
+    raise RuntimeError(f"Delivery {delivery_id} failed on attempt {attempts}, will be retried")
+
+def reused_code_response(email, recent, email_queue):
+    """
+    Response handing back a code issued within CODE_REUSE_WINDOW_MINUTES instead of a new one.
+    Reports the status of the delivery that carried the code, and sends the code again when that
+    delivery failed or was never recorded.
+    """
+    logging.info(f"Reusing verification code issued at {recent['CreatedAt']} for email: {email}")
+    code = auth_codes.code_of(recent)
+    # Codes sent inline (or before deliveries were tracked) have no delivery to check
+    email_sent, delivery_id, delivery_status = True, recent.get('DeliveryId'), None
+    if delivery_id:
+        try:
+            status = email_delivery.get_status(get_delivery_table_client(), delivery_id)
+        except Exception as e:
+            logging.warning(f"Failed to read delivery {delivery_id}: {str(e)}")
+            status = {'status': None}
+        if status is None or status['status'] in (email_delivery.FAILED, email_delivery.EXPIRED):
+            logging.info(f"Delivery {delivery_id} of the reused code did not go out, sending it again")
+            email_sent, delivery_id, delivery_status = dispatch_verification_email(email, code, email_queue, new_delivery_id())
+            if delivery_id:
+                try:
+                    auth_codes.set_delivery(get_table_client(), recent, delivery_id)
+                except Exception as e:
+                    logging.warning(f"Failed to record delivery {delivery_id} on the reused code: {str(e)}")
+        else:
+            delivery_status = status['status']
+    return func.HttpResponse(
+        json_encoding.dumps({
+            "message": "Verification code generated successfully",
+            "email": email,
+            "code": code,  # Remove this in production for security
+            "email_sent": email_sent,
+            "delivery_id": delivery_id,
+            "delivery_status": delivery_status,
+            "reused": True
+        }),
+        status_code=200,
+        headers={"Content-Type": "application/json"}
+    )
+
 @app.route(route="generate-code", methods=["POST"])
-def generate_code(req: func.HttpRequest) -> func.HttpResponse:
+@app.queue_output(arg_name="email_queue", queue_name=EMAIL_DELIVERY_QUEUE_NAME, connection="AzureWebJobsStorage")
+def generate_code(req: func.HttpRequest, email_queue: func.Out[str]) -> func.HttpResponse:
     """
     Endpoint to generate a verification code for an email
     Expects JSON body with 'email' field
+    The email is queued for delivery; poll email-status/{delivery_id} for the outcome
+    Throttled per email and client IP; a code issued within CODE_REUSE_WINDOW_MINUTES is returned again
     """
     logging.info('Generate code endpoint called')
     
@@ -165,7 +335,7 @@ def generate_code(req: func.HttpRequest) -> func.HttpResponse:
         req_body = req.get_json()
         if not req_body or 'email' not in req_body:
             return func.HttpResponse(
-                json.dumps({"error": "Email is required in request body"}),
+                json_encoding.dumps({"error": "Email is required in request body"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -175,14 +345,14 @@ def generate_code(req: func.HttpRequest) -> func.HttpResponse:
         # Validate email format (basic validation)
         if '@' not in email or '.' not in email:
             return func.HttpResponse(
-                json.dumps({"error": "Invalid email format"}),
+                json_encoding.dumps({"error": "Invalid email format"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
         
-        # Generate verification code
-        verification_code = generate_verification_code()
-        logging.info(f"Generated verification code: {verification_code} for email: {email}")
+        throttled = check_rate_limits(req, email)
+        if throttled:
+            return throttled
         
         # Get table client
         try:
@@ -191,36 +361,49 @@ def generate_code(req: func.HttpRequest) -> func.HttpResponse:
         except Exception as table_error:
             logging.error(f"Failed to get table client: {str(table_error)}")
             return func.HttpResponse(
-                json.dumps({"error": f"Database connection failed: {str(table_error)}"}),
+                json_encoding.dumps({"error": f"Database connection failed: {str(table_error)}"}),
                 status_code=500,
                 headers={"Content-Type": "application/json"}
             )
         
+        # A code issued moments ago is still valid and already emailed; hand it back instead of writing and sending another
+        if CODE_REUSE_WINDOW_MINUTES > 0:
+            try:
+                recent = auth_codes.find_recent_code(table_client, email, CODE_REUSE_WINDOW_MINUTES)
+            except Exception as lookup_error:
+                reset_table_if_missing(lookup_error)
+                logging.warning(f"Failed to look up recent codes: {str(lookup_error)}")
+                recent = None
+            if recent:
+                return reused_code_response(email, recent, email_queue)
+        
+        # Generate verification code
+        verification_code = generate_verification_code()
+        logging.info(f"Generated verification code: {verification_code} for email: {email}")
+        
         # Create entity
         try:
-            entity = TableEntity()
-            entity['PartitionKey'] = email
-            entity['RowKey'] = verification_code
-            # Add our own timestamp since Azure's Timestamp might not be immediately available
-            entity['CreatedAt'] = datetime.utcnow().isoformat() + 'Z'
+            delivery_id = new_delivery_id()
+            entity = auth_codes.new_entity(email, verification_code, delivery_id=delivery_id)
             
-            logging.info(f"Creating entity: PartitionKey={email}, RowKey={verification_code}")
+            logging.info(f"Creating entity: PartitionKey={entity['PartitionKey']}, RowKey={entity['RowKey']}")
             
             # Insert entity into table
             result = table_client.create_entity(entity=entity)
             logging.info(f"Successfully inserted entity into table.")
             
         except Exception as entity_error:
+            reset_table_if_missing(entity_error)
             logging.error(f"Failed to create/insert entity: {str(entity_error)}")
             logging.error(f"Entity data: PartitionKey={email}, RowKey={verification_code}")
             return func.HttpResponse(
-                json.dumps({"error": f"Failed to save verification code: {str(entity_error)}"}),
+                json_encoding.dumps({"error": f"Failed to save verification code: {str(entity_error)}"}),
                 status_code=500,
                 headers={"Content-Type": "application/json"}
             )
         
         # Send verification email
-        email_sent = send_verification_email(email, verification_code)
+        email_sent, delivery_id, delivery_status = dispatch_verification_email(email, verification_code, email_queue, delivery_id)
         
         logging.info(f"Generated verification code for email: {email}")
         
@@ -228,11 +411,13 @@ def generate_code(req: func.HttpRequest) -> func.HttpResponse:
             "message": "Verification code generated successfully",
             "email": email,
             "code": verification_code,  # Remove this in production for security
-            "email_sent": email_sent
+            "email_sent": email_sent,  # True once the email is accepted for delivery
+            "delivery_id": delivery_id,
+            "delivery_status": delivery_status
         }
         
         return func.HttpResponse(
-            json.dumps(response_data),
+            json_encoding.dumps(response_data),
             status_code=200,
             headers={"Content-Type": "application/json"}
         )
@@ -240,17 +425,53 @@ def generate_code(req: func.HttpRequest) -> func.HttpResponse:
     except Exception as e:
         logging.error(f"Error generating verification code: {str(e)}")
         return func.HttpResponse(
-            json.dumps({"error": "Internal server error"}),
+            json_encoding.dumps({"error": "Internal server error"}),
+            status_code=500,
+            headers={"Content-Type": "application/json"}
+        )
+
+@app.route(route="email-status/{delivery_id}", methods=["GET"])
+def email_status(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Endpoint to check the delivery status of a queued verification email
+    """
+    delivery_id = req.route_params.get('delivery_id')
+    if not email_delivery.is_valid_id(delivery_id):
+        return func.HttpResponse(
+            json_encoding.dumps({"error": "Invalid delivery id"}),
+            status_code=400,
+            headers={"Content-Type": "application/json"}
+        )
+    
+    try:
+        status = email_delivery.get_status(get_delivery_table_client(), delivery_id)
+    except Exception as e:
+        logging.error(f"Error reading delivery status: {str(e)}")
+        return func.HttpResponse(
+            json_encoding.dumps({"error": "Internal server error"}),
             status_code=500,
             headers={"Content-Type": "application/json"}
         )
+    
+    if status is None:
+        return func.HttpResponse(
+            json_encoding.dumps({"error": "Delivery not found"}),
+            status_code=404,
+            headers={"Content-Type": "application/json"}
+        )
+    
+    return func.HttpResponse(
+        json_encoding.dumps(status),
+        status_code=200,
+        headers={"Content-Type": "application/json"}
+    )
 
 @app.route(route="verify-code", methods=["POST"])
 def verify_code(req: func.HttpRequest) -> func.HttpResponse:
     """
     Endpoint to verify an email and code combination
     Expects JSON body with 'email' and 'code' fields
-    Also cleans up expired entities
+    Expired codes are removed by the sweep_expired_codes timer
     """
     logging.info('Verify code endpoint called')
     
@@ -259,7 +480,7 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
         req_body = req.get_json()
         if not req_body or 'email' not in req_body or 'code' not in req_body:
             return func.HttpResponse(
-                json.dumps({"error": "Email and code are required in request body"}),
+                json_encoding.dumps({"error": "Email and code are required in request body"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -272,13 +493,10 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
         # Get table client
         table_client = get_table_client()
         
-        # Clean up expired entities first
-        cleanup_expired_entities(table_client)
-        
         try:
             # Try to get the entity
-            logging.info(f"Looking for entity: PartitionKey='{email}', RowKey='{code}'")
-            entity = table_client.get_entity(partition_key=email, row_key=code)
+            logging.info(f"Looking for code '{code}' for email '{email}' ({auth_codes.LAYOUT} layout)")
+            entity = auth_codes.get_code(table_client, email, code, VERIFICATION_CODE_EXPIRY_MINUTES)
             logging.info(f"SUCCESS: Found entity: {entity}")
             
             # Check if the entity exists and is within the expiry window
@@ -316,13 +534,13 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
                         
                         # Delete the used code
                         try:
-                            table_client.delete_entity(partition_key=email, row_key=code)
+                            table_client.delete_entity(partition_key=entity['PartitionKey'], row_key=entity['RowKey'])
                             logging.info(f"Deleted used verification code for email: {email}")
                         except Exception as delete_error:
                             logging.warning(f"Failed to delete used code: {str(delete_error)}")
                         
                         return func.HttpResponse(
-                            json.dumps({
+                            json_encoding.dumps({
                                 "message": "Verification successful",
                                 "email": email,
                                 "verified": True
@@ -334,13 +552,13 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
                         # Code expired
                         logging.info(f"Code expired for email: {email}. Time diff: {time_diff}")
                         try:
-                            table_client.delete_entity(partition_key=email, row_key=code)
+                            table_client.delete_entity(partition_key=entity['PartitionKey'], row_key=entity['RowKey'])
                             logging.info(f"Deleted expired code for email: {email}")
                         except Exception as delete_error:
                             logging.warning(f"Failed to delete expired code: {str(delete_error)}")
                         
                         return func.HttpResponse(
-                            json.dumps({
+                            json_encoding.dumps({
                                 "message": "Verification code has expired",
                                 "verified": False
                             }),
@@ -351,7 +569,7 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
                 except Exception as time_parse_error:
                     logging.error(f"Failed to parse timestamp: {time_parse_error}")
                     return func.HttpResponse(
-                        json.dumps({
+                        json_encoding.dumps({
                             "message": "Invalid verification code",
                             "verified": False
                         }),
@@ -361,7 +579,7 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
             else:
                 logging.warning(f"No timestamp found in entity for email: {email}")
                 return func.HttpResponse(
-                    json.dumps({
+                    json_encoding.dumps({
                         "message": "Invalid verification code",
                         "verified": False
                     }),
@@ -371,14 +589,14 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
                 
         except Exception as get_error:
             # Entity not found or other error
+            reset_table_if_missing(get_error)
             logging.error(f"FAILED to find entity for email '{email}' with code '{code}': {str(get_error)}")
             logging.error(f"Error type: {type(get_error).__name__}")
             
-            # Let's also try to list all entities for this email to debug
+            # List the email's unexpired codes (parameterized, in either key layout) to debug
             try:
-                logging.info(f"DEBUG: Listing all entities for email '{email}':")
-                filter_query = f"PartitionKey eq '{email}'"
-                entities = table_client.query_entities(query_filter=filter_query)
+                logging.info(f"DEBUG: Listing unexpired codes for email '{email}':")
+                entities = auth_codes.recent_codes(table_client, email, VERIFICATION_CODE_EXPIRY_MINUTES)
                 entity_count = 0
                 for entity in entities:
                     entity_count += 1
@@ -393,7 +611,7 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
                 logging.error(f"Failed to list entities for debugging: {str(list_error)}")
             
             return func.HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "message": "Invalid verification code",
                     "verified": False
                 }),
@@ -402,9 +620,208 @@ def verify_code(req: func.HttpRequest) -> func.HttpResponse:
             )
         
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error verifying code: {str(e)}")
         return func.HttpResponse(
-            json.dumps({"error": "Internal server error"}),
+            json_encoding.dumps({"error": "Internal server error"}),
             status_code=500,
             headers={"Content-Type": "application/json"}
         )
+
+# Async variants of the HTTP routes above, served under /api/aio/... They use the
+# aio table client and the shared aiohttp session, so one worker can keep many
+# logins in flight, and read every candidate key of a code concurrently.
+
+def json_response(data, status_code):
+    return func.HttpResponse(
+        json_encoding.dumps(data),
+        status_code=status_code,
+        headers={"Content-Type": "application/json"}
+    )
+
+async def get_async_table_client():
+    """Get the aio codes table client, provisioning the table once per worker"""
+    return await aio_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, TABLE_NAME)
+
+async def send_verification_email_async(email, verification_code):
+    """send_verification_email through the shared aiohttp session, sharing the powerAutomate circuit"""
+    import aiohttp
+
+    if not POWER_AUTOMATE_URL:
+        logging.warning("Power Automate URL not configured - skipping email")
+        return False
+    try:
+        http_client.before_call('powerAutomate')
+    except http_client.CircuitOpenError as e:
+        logging.error(f"Failed to trigger Power Automate flow for {email}: {str(e)}")
+        return False
+    
+    connect_timeout, read_timeout = POWER_AUTOMATE_TIMEOUT
+    try:
+        async with aio_clients.get_http_session().post(
+            POWER_AUTOMATE_URL,
+            json={"email": email, "code": verification_code},
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        ) as response:
+            status = response.status
+            response_text = await response.text() if status not in (200, 202) else ''
+    except Exception as e:
+        http_client.record_result('powerAutomate', success=False)
+        logging.error(f"Failed to trigger Power Automate flow for {email}: {str(e)}")
+        return False
+    
+    http_client.record_result('powerAutomate', success=status < 500)
+    if status in (200, 202):
+        logging.info(f"Power Automate flow triggered successfully for {email}. Status code: {status}")
+        return True
+    logging.error(f"Failed to trigger Power Automate flow. Status: {status}, Response: {response_text}")
+    return False
+
+async def dispatch_verification_email_async(email, verification_code, email_queue, delivery_id=None):
+    """dispatch_verification_email with the delivery row written through the aio client"""
+    if queued_delivery_enabled():
+        try:
+            delivery_table = await aio_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, email_delivery.DELIVERY_TABLE_NAME)
+            record = email_delivery.new_record(email, delivery_id=delivery_id)
+            await delivery_table.create_entity(record)
+            delivery_id = record['RowKey']
+            email_queue.set(email_delivery.queue_message(delivery_id, email, verification_code))
+            logging.info(f"Queued verification email for {email} as delivery {delivery_id}")
+            return True, delivery_id, email_delivery.QUEUED
+        except Exception as e:
+            logging.warning(f"Failed to queue verification email, sending inline: {str(e)}")
+    
+    email_sent = await send_verification_email_async(email, verification_code)
+    return email_sent, None, email_delivery.SENT if email_sent else email_delivery.FAILED
+
+@app.route(route="aio/generate-code", methods=["POST"])
+@app.queue_output(arg_name="email_queue", queue_name=EMAIL_DELIVERY_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def generate_code_async(req: func.HttpRequest, email_queue: func.Out[str]) -> func.HttpResponse:
+    """
+    Async variant of generate-code
+    """
+    logging.info('Generate code (async) endpoint called')
+    
+    try:
+        req_body = req.get_json()
+        if not req_body or 'email' not in req_body:
+            return json_response({"error": "Email is required in request body"}, 400)
+        email = req_body['email'].lower().strip()
+        if '@' not in email or '.' not in email:
+            return json_response({"error": "Invalid email format"}, 400)
+        
+        # A shared bucket table is only touched when RATE_LIMIT_TABLE_NAME is set; keep that I/O off the event loop
+        throttled = await asyncio.to_thread(check_rate_limits, req, email)
+        if throttled:
+            return throttled
+        
+        table_client = await get_async_table_client()
+        
+        if CODE_REUSE_WINDOW_MINUTES > 0:
+            try:
+                recent = await auth_codes.find_recent_code_async(table_client, email, CODE_REUSE_WINDOW_MINUTES)
+            except Exception as lookup_error:
+                reset_table_if_missing(lookup_error)
+                logging.warning(f"Failed to look up recent codes: {str(lookup_error)}")
+                recent = None
+            if recent:
+                # Reads (and possibly re-sends) the original delivery through the sync helpers
+                return await asyncio.to_thread(reused_code_response, email, recent, email_queue)
+        
+        verification_code = generate_verification_code()
+        delivery_id = new_delivery_id()
+        try:
+            await table_client.create_entity(entity=auth_codes.new_entity(email, verification_code, delivery_id=delivery_id))
+        except Exception as entity_error:
+            reset_table_if_missing(entity_error)
+            logging.error(f"Failed to create/insert entity: {str(entity_error)}")
+            return json_response({"error": f"Failed to save verification code: {str(entity_error)}"}, 500)
+        
+        email_sent, delivery_id, delivery_status = await dispatch_verification_email_async(email, verification_code, email_queue, delivery_id)
+        logging.info(f"Generated verification code for email: {email}")
+        
+        return json_response({
+            "message": "Verification code generated successfully",
+            "email": email,
+            "code": verification_code,  # Remove this in production for security
+            "email_sent": email_sent,
+            "delivery_id": delivery_id,
+            "delivery_status": delivery_status
+        }, 200)
+        
+    except Exception as e:
+        logging.error(f"Error generating verification code: {str(e)}")
+        return json_response({"error": "Internal server error"}, 500)
+
+@app.route(route="aio/email-status/{delivery_id}", methods=["GET"])
+async def email_status_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of email-status
+    """
+    delivery_id = req.route_params.get('delivery_id')
+    keys = email_delivery.keys_for(delivery_id)
+    if keys is None:
+        return json_response({"error": "Invalid delivery id"}, 400)
+    
+    try:
+        delivery_table = await aio_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, email_delivery.DELIVERY_TABLE_NAME)
+        entity = await delivery_table.get_entity(partition_key=keys[0], row_key=keys[1])
+    except ResourceNotFoundError:
+        return json_response({"error": "Delivery not found"}, 404)
+    except Exception as e:
+        logging.error(f"Error reading delivery status: {str(e)}")
+        return json_response({"error": "Internal server error"}, 500)
+    
+    return json_response(email_delivery.to_status(entity), 200)
+
+@app.route(route="aio/verify-code", methods=["POST"])
+async def verify_code_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of verify-code; in the bucketed layout every candidate bucket is read concurrently
+    """
+    logging.info('Verify code (async) endpoint called')
+    invalid = {"message": "Invalid verification code", "verified": False}
+    
+    try:
+        req_body = req.get_json()
+        if not req_body or 'email' not in req_body or 'code' not in req_body:
+            return json_response({"error": "Email and code are required in request body"}, 400)
+        email = req_body['email'].lower().strip()
+        code = req_body['code'].lower().strip()
+        
+        table_client = await get_async_table_client()
+        try:
+            entity = await auth_codes.get_code_async(table_client, email, code, VERIFICATION_CODE_EXPIRY_MINUTES)
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
+            logging.info(f"No verification code '{code}' found for email '{email}'")
+            return json_response(invalid, 400)
+        
+        entity_timestamp = entity.get('CreatedAt') or entity.get('Timestamp')
+        if not entity_timestamp:
+            logging.warning(f"No timestamp found in entity for email: {email}")
+            return json_response(invalid, 400)
+        try:
+            entity_time = auth_codes.parse_created_at(entity_timestamp)
+        except Exception as time_parse_error:
+            logging.error(f"Failed to parse timestamp: {time_parse_error}")
+            return json_response(invalid, 400)
+        expired = datetime.utcnow() - entity_time > timedelta(minutes=VERIFICATION_CODE_EXPIRY_MINUTES)
+        
+        # The code is single-use whether it was valid or expired
+        try:
+            await table_client.delete_entity(partition_key=entity['PartitionKey'], row_key=entity['RowKey'])
+        except Exception as delete_error:
+            logging.warning(f"Failed to delete verification code: {str(delete_error)}")
+        
+        if expired:
+            logging.info(f"Code expired for email: {email}")
+            return json_response({"message": "Verification code has expired", "verified": False}, 400)
+        
+        logging.info(f"Successful verification for email: {email}")
+        return json_response({"message": "Verification successful", "email": email, "verified": True}, 200)
+        
+    except Exception as e:
+        reset_table_if_missing(e)
+        logging.error(f"Error verifying code: {str(e)}")
+        return json_response({"error": "Internal server error"}, 500)
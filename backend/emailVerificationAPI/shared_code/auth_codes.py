@@ -0,0 +1,254 @@
+"""
+Key layouts for the AuthCodes table.
+
+The original layout keys codes as PartitionKey=email, RowKey=code, so finding
+expired codes means filtering on CreatedAt, which Table Storage cannot index.
+The bucketed layout stores each code in the partition of the time bucket it was
+created in:
+
+    PartitionKey = 'bucket:<YYYYMMDDHHMM>'   (UTC start of the bucket)
+    RowKey       = '<email>|<code>'
+
+Verification stays a handful of point reads (one per bucket still inside the
+expiry window) and expiry becomes a PartitionKey range query over whole buckets
+followed by per-partition transactional deletes. ':' cannot appear in an
+unquoted email address, so bucket partitions never collide with legacy rows.
+
+Enable it with AUTH_CODES_LAYOUT=bucketed, then move existing codes over with:
+
+    python -m shared_code.auth_codes
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.data.tables import UpdateMode
+
+LAYOUT = os.getenv('AUTH_CODES_LAYOUT', 'email')  # 'email' (original) or 'bucketed'
+BUCKET_MINUTES = int(os.getenv('AUTH_CODE_BUCKET_MINUTES', '5'))
+BUCKET_PREFIX = 'bucket:'
+MAX_BATCH = 100
+
+
+def is_bucketed():
+    return LAYOUT == 'bucketed'
+
+
+def bucket_start(at):
+    """Start of the time bucket containing a naive UTC datetime"""
+    at = at.replace(second=0, microsecond=0)
+    return at - timedelta(minutes=(at.hour * 60 + at.minute) % BUCKET_MINUTES)
+
+
+def bucket_key(at):
+    return BUCKET_PREFIX + bucket_start(at).strftime('%Y%m%d%H%M')
+
+
+def code_keys(email, code, at):
+    """PartitionKey/RowKey for a code created at the given time in the configured layout"""
+    if is_bucketed():
+        return bucket_key(at), f'{email}|{code}'
+    return email, code
+
+
+def new_entity(email, code, at=None, delivery_id=None):
+    """Build the AuthCodes entity for a freshly generated code, with the id of the email delivery carrying it"""
+    at = at or datetime.utcnow()
+    partition_key, row_key = code_keys(email, code, at)
+    entity = {
+        'PartitionKey': partition_key,
+        'RowKey': row_key,
+        'Email': email,
+        # Our own timestamp since Azure's Timestamp might not be immediately available
+        'CreatedAt': at.isoformat() + 'Z',
+    }
+    if delivery_id:
+        entity['DeliveryId'] = delivery_id
+    return entity
+
+
+def set_delivery(table_client, entity, delivery_id):
+    """Point a code at the delivery of a resent email"""
+    table_client.update_entity(
+        {'PartitionKey': entity['PartitionKey'], 'RowKey': entity['RowKey'], 'DeliveryId': delivery_id},
+        mode=UpdateMode.MERGE
+    )
+
+
+def parse_created_at(value):
+    """CreatedAt/Timestamp as a naive UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def candidate_buckets(expiry_minutes, now=None):
+    """Bucket partitions that may still hold unexpired codes, newest first"""
+    now = now or datetime.utcnow()
+    oldest = bucket_start(now - timedelta(minutes=expiry_minutes))
+    current = bucket_start(now)
+    buckets = []
+    while current >= oldest:
+        buckets.append(BUCKET_PREFIX + current.strftime('%Y%m%d%H%M'))
+        current -= timedelta(minutes=BUCKET_MINUTES)
+    return buckets
+
+
+def get_code(table_client, email, code, expiry_minutes):
+    """Point-read a code in the configured layout; raises ResourceNotFoundError if it does not exist"""
+    if is_bucketed():
+        for partition_key in candidate_buckets(expiry_minutes):
+            try:
+                return table_client.get_entity(partition_key=partition_key, row_key=f'{email}|{code}')
+            except ResourceNotFoundError:
+                continue
+    # Codes written before the switch (or before migration) are still in the email layout
+    return table_client.get_entity(partition_key=email, row_key=code)
+
+
+def code_of(entity):
+    """The verification code stored in an entity of either layout"""
+    return entity['RowKey'].rsplit('|', 1)[-1]
+
+
+def _recent_queries(email, within_minutes):
+    """(filter, parameters) for each query that may return codes issued to an email in the window"""
+    if is_bucketed():
+        # RowKeys for an email all start with '<email>|', and '}' sorts right after '|'
+        return [
+            ("PartitionKey eq @pk and RowKey gt @lo and RowKey lt @hi",
+             {'pk': partition_key, 'lo': email + '|', 'hi': email + '}'})
+            for partition_key in candidate_buckets(within_minutes)
+        ]
+    cutoff = datetime.utcnow() - timedelta(minutes=within_minutes)
+    return [("PartitionKey eq @email and CreatedAt gt @cutoff", {'email': email, 'cutoff': cutoff.isoformat() + 'Z'})]
+
+
+def _newest(candidates, within_minutes):
+    cutoff = datetime.utcnow() - timedelta(minutes=within_minutes)
+    recent = [e for e in candidates if e.get('CreatedAt') and parse_created_at(e['CreatedAt']) > cutoff]
+    return max(recent, key=lambda e: parse_created_at(e['CreatedAt']), default=None)
+
+
+def recent_codes(table_client, email, within_minutes):
+    """Every code entity issued to an email within roughly the last within_minutes, in either layout"""
+    codes = []
+    for query_filter, parameters in _recent_queries(email, within_minutes):
+        codes.extend(table_client.query_entities(query_filter, parameters=parameters))
+    return codes
+
+
+def find_recent_code(table_client, email, within_minutes):
+    """Newest code issued to an email within the last within_minutes, or None"""
+    return _newest(recent_codes(table_client, email, within_minutes), within_minutes)
+
+
+async def _get_or_none(table_client, partition_key, row_key):
+    try:
+        return await table_client.get_entity(partition_key=partition_key, row_key=row_key)
+    except ResourceNotFoundError:
+        return None
+
+
+async def _collect(entities):
+    return [e async for e in entities]
+
+
+async def get_code_async(table_client, email, code, expiry_minutes):
+    """get_code for an aio table client; every candidate key is read concurrently"""
+    keys = [(partition_key, f'{email}|{code}') for partition_key in candidate_buckets(expiry_minutes)] if is_bucketed() else []
+    keys.append((email, code))
+    for entity in await asyncio.gather(*(_get_or_none(table_client, pk, rk) for pk, rk in keys)):
+        if entity is not None:
+            return entity
+    raise ResourceNotFoundError(f"No verification code '{code}' for {email}")
+
+
+async def find_recent_code_async(table_client, email, within_minutes):
+    """find_recent_code for an aio table client; the bucket queries run concurrently"""
+    batches = await asyncio.gather(*(
+        _collect(table_client.query_entities(query_filter, parameters=parameters))
+        for query_filter, parameters in _recent_queries(email, within_minutes)
+    ))
+    return _newest([e for batch in batches for e in batch], within_minutes)
+
+
+def query_expired(table_client, cutoff):
+    """Keys of expired codes: a range over whole expired buckets, or a CreatedAt scan in the email layout"""
+    if is_bucketed():
+        # Buckets starting before the cutoff's bucket ended before the cutoff
+        return table_client.query_entities(
+            "PartitionKey gt @prefix and PartitionKey lt @before",
+            parameters={'prefix': BUCKET_PREFIX, 'before': bucket_key(cutoff)},
+            select=['PartitionKey', 'RowKey']
+        )
+    # Format: YYYY-MM-DDTHH:MM:SS.fffffZ
+    return table_client.query_entities(
+        "CreatedAt lt @cutoff",
+        parameters={'cutoff': cutoff.isoformat() + 'Z'},
+        select=['PartitionKey', 'RowKey']
+    )
+
+
+def delete_entities(table_client, entities):
+    """Delete entities in per-partition transactions of up to 100; returns the number deleted"""
+    by_partition = {}
+    for entity in entities:
+        by_partition.setdefault(entity['PartitionKey'], []).append(('delete', entity))
+
+    deleted = 0
+    for partition_key, operations in by_partition.items():
+        for start in range(0, len(operations), MAX_BATCH):
+            batch = operations[start:start + MAX_BATCH]
+            try:
+                table_client.submit_transaction(batch)
+                deleted += len(batch)
+            except Exception as e:
+                # Typically a code deleted by verify-code in the meantime; the next sweep retries the rest
+                logging.warning(f"Failed to delete expired entities in partition {partition_key}: {str(e)}")
+    return deleted
+
+
+def migrate_table(table_client, expiry_minutes):
+    """Move codes from the email layout into time buckets, dropping ones that have already expired"""
+    cutoff = datetime.utcnow() - timedelta(minutes=expiry_minutes)
+    migrated = 0
+    expired = []
+    for entity in table_client.list_entities():
+        if entity['PartitionKey'].startswith(BUCKET_PREFIX):
+            continue
+        created_value = entity.get('CreatedAt') or entity.get('Timestamp')
+        created_at = parse_created_at(created_value) if created_value else None
+        if created_at is None or created_at < cutoff:
+            expired.append(entity)
+            continue
+        email, code = entity['PartitionKey'], entity['RowKey']
+        # Write the bucketed copy before deleting the original so a code is never lost mid-migration
+        migrated_entity = {
+            'PartitionKey': bucket_key(created_at),
+            'RowKey': f'{email}|{code}',
+            'Email': email,
+            'CreatedAt': entity.get('CreatedAt') or created_at.isoformat() + 'Z',
+        }
+        if entity.get('DeliveryId'):
+            migrated_entity['DeliveryId'] = entity['DeliveryId']
+        table_client.upsert_entity(migrated_entity)
+        table_client.delete_entity(partition_key=email, row_key=code)
+        migrated += 1
+    removed = delete_entities(table_client, expired)
+    logging.info(f"Migrated {migrated} codes to the bucketed layout, removed {removed} expired codes")
+    return migrated, removed
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from .storage_clients import get_table_client
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    migrate_table(
+        get_table_client(os.environ['AZURE_STORAGE_CONNECTION_STRING'], os.environ.get('TABLE_NAME', 'AuthCodes')),
+        int(os.environ.get('VERIFICATION_CODE_EXPIRY_MINUTES', '10'))
+    )
@@ -0,0 +1,137 @@
+"""
+Queued delivery of verification emails.
+
+generate_code no longer waits on the Power Automate flow. It records a delivery
+in the EmailDeliveries table, puts a message on the verification-emails storage
+queue and returns straight away with the delivery id. The queue-triggered sender
+posts to the flow, and failed posts are retried by the Functions runtime.
+While the flow's circuit breaker is open the sender re-queues the message with
+a delay instead, carrying its attempt count so the wait does not use one up.
+Clients can poll the delivery status with GET /api/email-status/{delivery_id}.
+The delivery id is also stored on the code's AuthCodes entity, so a reused code
+can report (or retry) the delivery of the email that carried it.
+
+Delivery rows are partitioned by UTC day and the day is part of the delivery id
+('<YYYYMMDD>-<hex>'), so a status lookup is a point read and old deliveries are
+removed a whole partition at a time by the expired code sweeper.
+"""
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from . import json_encoding
+from .auth_codes import delete_entities
+
+DELIVERY_TABLE_NAME = os.environ.get('EMAIL_DELIVERY_TABLE_NAME', 'EmailDeliveries')
+DELIVERY_RETENTION_DAYS = int(os.environ.get('EMAIL_DELIVERY_RETENTION_DAYS', '1'))
+
+QUEUED = 'queued'
+SENT = 'sent'
+RETRYING = 'retrying'
+FAILED = 'failed'
+EXPIRED = 'expired'
+
+_DELIVERY_ID = re.compile(r'^(\d{8})-[0-9a-f]{32}$')
+
+
+def new_delivery_id(at=None):
+    at = at or datetime.utcnow()
+    return f"{at.strftime('%Y%m%d')}-{uuid.uuid4().hex}"
+
+
+def keys_for(delivery_id):
+    """(PartitionKey, RowKey) for a delivery id, or None if the id is malformed"""
+    match = _DELIVERY_ID.match(delivery_id or '')
+    return (match.group(1), delivery_id) if match else None
+
+
+def is_valid_id(delivery_id):
+    return keys_for(delivery_id) is not None
+
+
+def new_record(email, at=None, delivery_id=None):
+    """Delivery row for a newly queued email; its RowKey is the delivery id (pre-assigned or new)"""
+    at = at or datetime.utcnow()
+    partition_key, row_key = keys_for(delivery_id or new_delivery_id(at))
+    return {
+        'PartitionKey': partition_key,
+        'RowKey': row_key,
+        'Email': email,
+        'Status': QUEUED,
+        'Attempts': 0,
+        'CreatedAt': at.isoformat() + 'Z',
+        'UpdatedAt': at.isoformat() + 'Z',
+    }
+
+
+def create(table_client, email, at=None, delivery_id=None):
+    """Record a queued delivery; returns its id"""
+    record = new_record(email, at, delivery_id)
+    table_client.create_entity(record)
+    return record['RowKey']
+
+
+def queue_message(delivery_id, email, code):
+    """Body of the queue message the sender picks up"""
+    return json_encoding.dumps({
+        'delivery_id': delivery_id,
+        'email': email,
+        'code': code,
+        'created_at': datetime.utcnow().isoformat() + 'Z'
+    })
+
+
+def mark(table_client, delivery_id, status, attempts, error=None):
+    """Update a delivery's status; failures are logged, never raised, since the email itself already went out or will be retried"""
+    partition_key, row_key = keys_for(delivery_id)
+    try:
+        table_client.upsert_entity({
+            'PartitionKey': partition_key,
+            'RowKey': row_key,
+            'Status': status,
+            'Attempts': attempts,
+            'LastError': error or '',
+            'UpdatedAt': datetime.utcnow().isoformat() + 'Z',
+        })
+    except Exception as e:
+        logging.warning(f"Failed to record status '{status}' for delivery {delivery_id}: {str(e)}")
+
+
+def get_status(table_client, delivery_id):
+    """Status of a delivery as a response dict, or None if it is unknown"""
+    keys = keys_for(delivery_id)
+    if keys is None:
+        return None
+    try:
+        entity = table_client.get_entity(partition_key=keys[0], row_key=keys[1])
+    except ResourceNotFoundError:
+        return None
+    return to_status(entity)
+
+
+def to_status(entity):
+    """Response dict for a delivery row"""
+    return {
+        'delivery_id': entity['RowKey'],
+        'status': entity.get('Status'),
+        'attempts': entity.get('Attempts', 0),
+        'created_at': entity.get('CreatedAt'),
+        'updated_at': entity.get('UpdatedAt'),
+        'error': entity.get('LastError') or None,
+    }
+
+
+def delete_old(table_client, now=None):
+    """Delete deliveries from days before the retention window; returns the number deleted"""
+    now = now or datetime.utcnow()
+    oldest_kept = (now - timedelta(days=DELIVERY_RETENTION_DAYS)).strftime('%Y%m%d')
+    old = table_client.query_entities(
+        "PartitionKey lt @oldest",
+        parameters={'oldest': oldest_kept},
+        select=['PartitionKey', 'RowKey']
+    )
+    return delete_entities(table_client, old)
@@ -0,0 +1,136 @@
+"""
+Pooled outbound HTTP client for calls to other function apps and Power Automate flows.
+
+Every call goes through one process-lifetime requests session with a sized
+keep-alive pool, so warm invocations skip DNS and TLS setup. Calls are named by
+target (e.g. 'manageAdmins', 'powerAutomate') and for each target:
+
+- the caller passes a (connect, read) timeout suited to that dependency,
+- connection errors, timeouts and 429/5xx responses are retried up to `retries`
+  times with full-jitter exponential backoff (keep retries=0 for calls that are
+  not safe to repeat, such as flow triggers that send email),
+- a circuit breaker opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures
+  and fails fast with CircuitOpenError for CIRCUIT_RESET_SECONDS, then lets a
+  single trial call through to decide whether to close again.
+
+CircuitOpenError is a requests RequestException, so existing
+`except requests.exceptions.RequestException` handlers cover it. Async handlers
+making their own aiohttp calls share the same circuits through before_call and
+record_result.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+
+POOL_SIZE = int(os.environ.get('OUTBOUND_HTTP_POOL_SIZE', '10'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = int(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+DEFAULT_TIMEOUT = (3.05, 10)
+BASE_BACKOFF_SECONDS = 0.2
+MAX_BACKOFF_SECONDS = 2.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_session = None
+_circuits = {}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a target whose circuit is open"""
+
+
+def get_session():
+    """Return the shared keep-alive session used for outbound calls"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def is_open(target):
+    """True while calls to the target are being failed fast"""
+    with _lock:
+        circuit = _circuits.get(target)
+        return bool(circuit and circuit['opened_at'] is not None
+                    and time.monotonic() - circuit['opened_at'] < CIRCUIT_RESET_SECONDS)
+
+
+def before_call(target):
+    """Fail fast while the target's circuit is open; let one trial call through once it may have recovered"""
+    with _lock:
+        circuit = _circuits.setdefault(target, {'failures': 0, 'opened_at': None, 'trial': False})
+        if circuit['opened_at'] is None:
+            return
+        if time.monotonic() - circuit['opened_at'] < CIRCUIT_RESET_SECONDS or circuit['trial']:
+            raise CircuitOpenError(f"Circuit for {target} is open, skipping call")
+        circuit['trial'] = True
+
+
+def record_result(target, success):
+    """Feed a call's outcome into the target's circuit; async callers pair this with before_call"""
+    with _lock:
+        circuit = _circuits[target]
+        circuit['trial'] = False
+        if success:
+            if circuit['opened_at'] is not None:
+                logging.info(f"Circuit for {target} closed")
+            circuit['failures'] = 0
+            circuit['opened_at'] = None
+            return
+        circuit['failures'] += 1
+        if circuit['opened_at'] is not None or circuit['failures'] >= CIRCUIT_FAILURE_THRESHOLD:
+            if circuit['opened_at'] is None:
+                logging.warning(f"Circuit for {target} opened after {circuit['failures']} consecutive failures")
+            circuit['opened_at'] = time.monotonic()
+
+
+def request(target, method, url, timeout=DEFAULT_TIMEOUT, retries=0, **kwargs):
+    """
+    Make an outbound call to a named target through the shared session.
+    Returns the final response (which may still be a 429/5xx once retries are
+    exhausted) or raises a RequestException, including CircuitOpenError.
+    """
+    before_call(target)
+    attempt = 0
+    while True:
+        response, error = None, None
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        except Exception:
+            record_result(target, success=False)
+            raise
+
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            record_result(target, success=response.status_code < 500)
+            return response
+        if attempt >= retries:
+            record_result(target, success=False)
+            if response is not None:
+                return response
+            raise error
+
+        attempt += 1
+        delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+        reason = f"status {response.status_code}" if response is not None else str(error)
+        logging.info(f"Retrying {target} in {delay:.2f}s (attempt {attempt + 1}, {reason})")
+        time.sleep(delay)
+
+
+def get(target, url, **kwargs):
+    return request(target, 'GET', url, **kwargs)
+
+
+def post(target, url, **kwargs):
+    return request(target, 'POST', url, **kwargs)
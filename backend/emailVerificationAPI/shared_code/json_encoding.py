@@ -0,0 +1,56 @@
+"""
+Response encoding shared by the HTTP handlers.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both paths understand Table Storage values: datetimes (including the
+SDK's TablesEntityDatetime) become ISO 8601 strings, EntityProperty wrappers
+(returned for Int64 and other typed values) are unwrapped to their value,
+bytes are base64 encoded and UUIDs become strings.
+"""
+import base64
+import json
+import uuid
+from datetime import date, datetime
+
+from azure.data.tables import EntityProperty
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, EntityProperty):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode('ascii')
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _unwrap(obj):
+    # The stdlib encoder writes NamedTuples such as EntityProperty as arrays without
+    # consulting default, so unwrap them before encoding
+    if isinstance(obj, EntityProperty):
+        return _unwrap(obj.value)
+    if isinstance(obj, dict):
+        return {k: _unwrap(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_unwrap(v) for v in obj]
+    return obj
+
+
+def dumpb(obj):
+    """Serialize obj to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_unwrap(obj), default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj):
+    """Serialize obj to a JSON string"""
+    return dumpb(obj).decode('utf-8')
@@ -0,0 +1,154 @@
+"""
+Token-bucket rate limiting for the verification endpoints.
+
+Every key (e.g. 'email:<address>' or 'ip:<address>') has a bucket holding up to
+`capacity` tokens that refills at `per_minute` tokens a minute; each request
+takes one token and is rejected while the bucket is empty. A request checked
+against several buckets gives back the tokens it took with release() when a
+later bucket rejects it, so one limit being hit does not drain the others.
+
+Buckets live in process memory by default, so each instance enforces its own
+limit. When a table client is passed (RATE_LIMIT_TABLE_NAME), buckets are kept
+in Table Storage instead and shared by every instance, using ETag concurrency
+for the read-modify-write. If the table cannot be reached the in-process bucket
+is used, so the login path never fails because of the limiter.
+"""
+import logging
+import os
+import threading
+import time
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+RATE_LIMIT_CACHE_SIZE = int(os.environ.get('RATE_LIMIT_CACHE_SIZE', '10000'))
+# Proxies of our own in front of the Functions front end, each appending one X-Forwarded-For hop
+TRUSTED_PROXY_COUNT = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXY_COUNT', '0'))
+MAX_TABLE_ATTEMPTS = 3
+BUCKET_ROW_KEY = 'bucket'
+
+_lock = threading.Lock()
+_buckets = {}
+
+
+def client_ip(req):
+    """
+    Client address from the X-Forwarded-For header. Clients can send the header
+    themselves with any leading entries, so only hops appended by our own
+    infrastructure are trusted: the last entry, added by the Functions front end,
+    or the one before TRUSTED_PROXY_COUNT further proxies (e.g. Front Door).
+    """
+    hops = [hop.strip() for hop in req.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    address = hops[max(len(hops) - 1 - TRUSTED_PROXY_COUNT, 0)] if hops else ''
+    # App Service appends the port to IPv4 addresses ("1.2.3.4:5678")
+    if address.count(':') == 1:
+        address = address.split(':')[0]
+    return address or 'unknown'
+
+
+def _refill(tokens, updated, capacity, per_minute, now):
+    return min(capacity, tokens + (now - updated) * per_minute / 60.0)
+
+
+def _take(tokens, per_minute):
+    """Return (allowed, tokens_left, retry_after_seconds) for taking one token"""
+    if tokens >= 1:
+        return True, tokens - 1, 0
+    return False, tokens, int((1 - tokens) * 60.0 / per_minute) + 1
+
+
+def _acquire_local(key, capacity, per_minute, now):
+    with _lock:
+        tokens, updated = _buckets.get(key, (capacity, now))
+        tokens = _refill(tokens, updated, capacity, per_minute, now)
+        allowed, tokens, retry_after = _take(tokens, per_minute)
+        _buckets[key] = (tokens, now)
+        if len(_buckets) > RATE_LIMIT_CACHE_SIZE:
+            # Drop the least recently touched buckets; they have had the longest to refill
+            for stale in sorted(_buckets, key=lambda k: _buckets[k][1])[:len(_buckets) // 10]:
+                del _buckets[stale]
+    return allowed, retry_after
+
+
+def _acquire_table(table_client, key, capacity, per_minute, now):
+    for _ in range(MAX_TABLE_ATTEMPTS):
+        try:
+            entity = table_client.get_entity(partition_key=key, row_key=BUCKET_ROW_KEY)
+        except ResourceNotFoundError:
+            entity = None
+
+        if entity is None:
+            allowed, tokens, retry_after = _take(capacity, per_minute)
+            try:
+                table_client.create_entity({
+                    'PartitionKey': key, 'RowKey': BUCKET_ROW_KEY, 'tokens': tokens, 'updatedAt': now
+                })
+                return allowed, retry_after
+            except ResourceExistsError:
+                continue
+
+        tokens = _refill(float(entity.get('tokens', capacity)), float(entity.get('updatedAt', now)), capacity, per_minute, now)
+        allowed, tokens, retry_after = _take(tokens, per_minute)
+        entity['tokens'] = tokens
+        entity['updatedAt'] = now
+        try:
+            table_client.update_entity(
+                entity=entity,
+                mode='replace',
+                etag=entity.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return allowed, retry_after
+        except ResourceModifiedError:
+            # Another instance took a token in the meantime; re-read and try again
+            continue
+    logging.warning(f"Rate limit bucket {key} is contended, using the in-process bucket")
+    return _acquire_local(key, capacity, per_minute, now)
+
+
+def _release_local(key, capacity):
+    with _lock:
+        if key in _buckets:
+            tokens, updated = _buckets[key]
+            _buckets[key] = (min(capacity, tokens + 1), updated)
+
+
+def _release_table(table_client, key, capacity):
+    for _ in range(MAX_TABLE_ATTEMPTS):
+        try:
+            entity = table_client.get_entity(partition_key=key, row_key=BUCKET_ROW_KEY)
+        except ResourceNotFoundError:
+            return
+        entity['tokens'] = min(capacity, float(entity.get('tokens', capacity)) + 1)
+        try:
+            table_client.update_entity(
+                entity=entity,
+                mode='replace',
+                etag=entity.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return
+        except ResourceModifiedError:
+            continue
+    logging.warning(f"Rate limit bucket {key} is contended, token not returned")
+
+
+def acquire(key, capacity, per_minute, table_client=None):
+    """Take one token from the bucket for key; returns (allowed, retry_after_seconds)"""
+    now = time.time()
+    if table_client is not None:
+        try:
+            return _acquire_table(table_client, key, capacity, per_minute, now)
+        except Exception as e:
+            logging.warning(f"Shared rate limit unavailable, using the in-process bucket: {str(e)}")
+    return _acquire_local(key, capacity, per_minute, now)
+
+
+def release(key, capacity, table_client=None):
+    """Give back a token taken by acquire for a request that was then rejected by another bucket"""
+    if table_client is not None:
+        try:
+            return _release_table(table_client, key, capacity)
+        except Exception as e:
+            logging.warning(f"Shared rate limit unavailable, returning the token to the in-process bucket: {str(e)}")
+    _release_local(key, capacity)
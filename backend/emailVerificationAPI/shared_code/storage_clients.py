@@ -0,0 +1,148 @@
+"""
+Process-lifetime registry of Azure Storage clients.
+
+The Functions host keeps the Python worker alive between invocations, so the
+clients built here are reused by every warm request instead of re-parsing the
+connection string and opening a fresh HTTP pool (and TLS handshake) each time.
+All clients share a single keep-alive requests session.
+"""
+import logging
+import os
+import threading
+
+import requests
+from azure.core.exceptions import ResourceExistsError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.data.tables import TableServiceClient
+
+POOL_SIZE = int(os.environ.get('STORAGE_HTTP_POOL_SIZE', '20'))
+CONNECTION_TIMEOUT = int(os.environ.get('STORAGE_CONNECTION_TIMEOUT', '10'))
+READ_TIMEOUT = int(os.environ.get('STORAGE_READ_TIMEOUT', '30'))
+
+_lock = threading.Lock()
+_transport = None
+_table_services = {}
+_table_clients = {}
+_blob_containers = {}
+_queues = {}
+_verified_tables = set()
+
+
+def get_transport():
+    """Return the shared keep-alive transport used by every storage client"""
+    global _transport
+    if _transport is None:
+        with _lock:
+            if _transport is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _transport = RequestsTransport(
+                    session=session,
+                    session_owner=False,
+                    connection_timeout=CONNECTION_TIMEOUT,
+                    read_timeout=READ_TIMEOUT
+                )
+    return _transport
+
+
+def get_table_service_client(connection_string):
+    """Get the cached TableServiceClient for a connection string"""
+    client = _table_services.get(connection_string)
+    if client is None:
+        with _lock:
+            client = _table_services.get(connection_string)
+            if client is None:
+                logging.info("Creating shared TableServiceClient")
+                client = TableServiceClient.from_connection_string(
+                    conn_str=connection_string, transport=get_transport()
+                )
+                _table_services[connection_string] = client
+    return client
+
+
+def get_table_client(connection_string, table_name):
+    """Get the cached TableClient for a (connection string, table) pair"""
+    key = (connection_string, table_name)
+    client = _table_clients.get(key)
+    if client is None:
+        service = get_table_service_client(connection_string)
+        with _lock:
+            client = _table_clients.get(key)
+            if client is None:
+                client = service.get_table_client(table_name=table_name)
+                _table_clients[key] = client
+    return client
+
+
+def ensure_table(connection_string, table_name):
+    """
+    Get the cached TableClient, creating the table the first time it is seen.
+    The result is memoized so later calls cost no storage round trip.
+    """
+    key = (connection_string, table_name)
+    client = get_table_client(connection_string, table_name)
+    if key in _verified_tables:
+        return client
+    try:
+        client.create_table()
+        logging.info(f"Created table {table_name}")
+    except ResourceExistsError:
+        logging.info(f"Table {table_name} already exists")
+    _verified_tables.add(key)
+    return client
+
+
+def is_table_not_found(error):
+    """True if a storage error means the table itself is missing"""
+    return getattr(error, 'error_code', None) == 'TableNotFound'
+
+
+def invalidate_table(connection_string, table_name):
+    """Forget that a table was verified so the next ensure_table re-provisions it"""
+    _verified_tables.discard((connection_string, table_name))
+
+
+def get_blob_container_client(connection_string, container_name):
+    """Get the cached ContainerClient for a (connection string, container) pair"""
+    # Imported lazily so apps without azure-storage-blob can still use this module
+    from azure.storage.blob import BlobServiceClient
+
+    key = (connection_string, container_name)
+    client = _blob_containers.get(key)
+    if client is None:
+        with _lock:
+            client = _blob_containers.get(key)
+            if client is None:
+                logging.info(f"Creating shared ContainerClient for {container_name}")
+                service = BlobServiceClient.from_connection_string(
+                    connection_string, transport=get_transport()
+                )
+                client = service.get_container_client(container_name)
+                _blob_containers[key] = client
+    return client
+
+
+def get_queue_client(connection_string, queue_name):
+    """
+    Get the cached QueueClient for a (connection string, queue) pair. Messages are
+    base64-encoded, the format queue triggers expect by default.
+    """
+    # Imported lazily so apps without azure-storage-queue can still use this module
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+    key = (connection_string, queue_name)
+    client = _queues.get(key)
+    if client is None:
+        with _lock:
+            client = _queues.get(key)
+            if client is None:
+                logging.info(f"Creating shared QueueClient for {queue_name}")
+                client = QueueClient.from_connection_string(
+                    connection_string, queue_name,
+                    message_encode_policy=TextBase64EncodePolicy(),
+                    transport=get_transport()
+                )
+                _queues[key] = client
+    return client
@@ -0,0 +1,27 @@
+import azure.functions as func
+import logging
+import os
+import dotenv
+from ..shared_code import blob_index
+
+dotenv.load_dotenv(dotenv.find_dotenv())
+
+def main(event: func.EventGridEvent) -> None:
+    # Subscribed to Microsoft.Storage.BlobDeleted on the documents container; uploads
+    # arrive at BlobIndexFunction through the same Event Grid subscription
+    if event.event_type != 'Microsoft.Storage.BlobDeleted':
+        logging.info(f"Ignoring event {event.event_type}")
+        return
+    # Subject is "/blobServices/default/containers/{container}/blobs/{blob name}"
+    container, _, blob_name = event.subject.split('/containers/', 1)[-1].partition('/blobs/')
+    if container != os.environ.get('BLOB_CONTAINER_NAME'):
+        logging.info(f"Ignoring deletion in container {container}")
+        return
+    index_client = blob_index.get_index_client()
+    if index_client is None:
+        logging.warning("AZURE_TABLE_CONNECTION_STRING not set, skipping document index update")
+        return
+    if blob_index.forget(index_client, blob_name):
+        logging.info(f"Removed deleted document {blob_name} from the index")
+    else:
+        logging.info(f"Deleted blob {blob_name} was not the indexed document")
@@ -0,0 +1,27 @@
+import azure.functions as func
+import logging
+import os
+import dotenv
+from ..shared_code import blob_index
+
+dotenv.load_dotenv(dotenv.find_dotenv())
+
+def main(event: func.EventGridEvent) -> None:
+    # Subscribed to Microsoft.Storage.BlobCreated on the documents container. Unlike a
+    # blob trigger this does not download the blob, and the event time orders uploads
+    if event.event_type != 'Microsoft.Storage.BlobCreated':
+        logging.info(f"Ignoring event {event.event_type}")
+        return
+    # Subject is "/blobServices/default/containers/{container}/blobs/{blob name}"
+    container, _, blob_name = event.subject.split('/containers/', 1)[-1].partition('/blobs/')
+    if container != os.environ.get('BLOB_CONTAINER_NAME'):
+        logging.info(f"Ignoring upload to container {container}")
+        return
+    index_client = blob_index.get_index_client()
+    if index_client is None:
+        logging.warning("AZURE_TABLE_CONNECTION_STRING not set, skipping document index update")
+        return
+    if blob_index.record(index_client, blob_name, event.event_time):
+        logging.info(f"Indexed applicant document {blob_name}")
+    else:
+        logging.info(f"Ignoring blob {blob_name}: not an applicant document")
@@ -1,13 +1,129 @@
 import azure.functions as func
+import base64
 import json
-from azure.data.tables import TableServiceClient
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
+import logging
 import os
 import dotenv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from ..shared_code.storage_clients import get_table_client, get_blob_container_client
+from ..shared_code import applicant_stats, applicant_summary, blob_index, http_cache, json_encoding, json_stream, sas_cache, vote_ledger
+from ..shared_code.blob_index import DOC_TYPES
 
 dotenv.load_dotenv(dotenv.find_dotenv())
 
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = 1000
+
+# Serve the list from the narrow ApplicantSummary table, which addApproval's
+# reconcileApplicants timer keeps current for applicants written elsewhere.
+# Off by default because the table starts empty. To roll out: deploy addApproval,
+# wait for reconcileApplicants to log "Rebuilt N rows in ApplicantSummary" (its
+# first pass), then set LIST_FROM_SUMMARY=true on this app.
+LIST_FROM_SUMMARY = os.environ.get('LIST_FROM_SUMMARY', 'false').lower() == 'true'
+
+# Delta cursors overlap the previous window by this much so rows committed
+# while a query was running are not missed; clients merge rows by key
+DELTA_CURSOR_OVERLAP_SECONDS = int(os.environ.get('DELTA_CURSOR_OVERLAP_SECONDS', '30'))
+
+# Columns the list view actually renders; everything else stays in Table Storage
+LIST_SELECT = ['firstName', 'lastName', 'status', 'PartitionKey', 'RowKey']
+
+# Query parameter -> entity property pushed down as an OData equality filter
+LIST_FILTERS = {
+    'partitionKey': 'PartitionKey',
+    'status': 'status',
+    'redpStatus': 'RedpStatus'
+}
+
+
+def build_list_filter(params):
+    """Build a parameterized OData filter from the list query parameters"""
+    clauses = []
+    parameters = {}
+    for param, column in LIST_FILTERS.items():
+        value = params.get(param)
+        if value is None or value == '':
+            continue
+        # status is stored as an Int32, so compare numerically when we can
+        if param == 'status' and value.lstrip('-').isdigit():
+            value = int(value)
+        clauses.append(f"{column} eq @{param}")
+        parameters[param] = value
+    since = parse_since(params.get('since'))
+    if since:
+        # Only rows changed after the client's cursor
+        clauses.append("Timestamp gt @since")
+        parameters['since'] = since
+    return ' and '.join(clauses), parameters
+
+
+def parse_since(value):
+    """Parse the since query parameter (ISO 8601, UTC if no offset), raising ValueError if malformed"""
+    if not value:
+        return None
+    try:
+        since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('Invalid since timestamp, expected ISO 8601')
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since
+
+
+def next_delta_cursor():
+    """Cursor a client should send as since on its next delta request"""
+    cursor = datetime.now(timezone.utc) - timedelta(seconds=DELTA_CURSOR_OVERLAP_SECONDS)
+    return cursor.isoformat().replace('+00:00', 'Z')
+
+
+def query_list_entities(table_client, query_filter, parameters, **kwargs):
+    """Query the table with the list projection, filtering server-side when requested"""
+    if query_filter:
+        return table_client.query_entities(
+            query_filter, parameters=parameters, select=LIST_SELECT, **kwargs
+        )
+    return table_client.list_entities(select=LIST_SELECT, **kwargs)
+
+
+def encode_continuation_token(token):
+    """Wrap the Table Storage NextPartitionKey/NextRowKey pair in an opaque string"""
+    if not token:
+        return None
+    raw = json_encoding.dumps({'pk': token.get('PartitionKey'), 'rk': token.get('RowKey')})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_continuation_token(value):
+    """Unwrap a token produced by encode_continuation_token, raising ValueError if malformed"""
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return {'PartitionKey': data['pk'], 'RowKey': data['rk']}
+    except Exception:
+        raise ValueError('Invalid continuation token')
+
+
+def parse_page_size(value):
+    """Parse the pageSize query parameter, clamped to MAX_PAGE_SIZE"""
+    page_size = int(value)
+    if page_size < 1:
+        raise ValueError('pageSize must be a positive integer')
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def to_list_item(e):
+    """Project an entity down to the fields shown in the applicant list"""
+    return {
+        'firstName': e.get('firstName'),
+        'lastName': e.get('lastName'),
+        'status': e.get('status'),
+        'partitionKey': e.get('PartitionKey'),
+        'rowKey': e.get('RowKey')
+    }
+
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     connection_string = os.environ.get('AZURE_TABLE_CONNECTION_STRING')
     table_name = os.environ.get('TABLE_NAME', 'DynamoInfo')
@@ -15,62 +131,137 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     blob_container_name = os.environ.get('BLOB_CONTAINER_NAME')
     blob_account_name = os.environ.get('BLOB_ACCOUNT_NAME', 'redpfiles')
     blob_account_key = os.environ.get('BLOB_ACCOUNT_KEY')
-    service = TableServiceClient.from_connection_string(conn_str=connection_string)
-    table_client = service.get_table_client(table_name=table_name)
-    blob_service = None
+    table_client = get_table_client(connection_string, table_name)
     blob_container = None
     if blob_connection_string and blob_container_name:
-        blob_service = BlobServiceClient.from_connection_string(blob_connection_string)
-        blob_container = blob_service.get_container_client(blob_container_name)
+        blob_container = get_blob_container_client(blob_connection_string, blob_container_name)
 
     partition_key = req.params.get('partitionKey')
     row_key = req.params.get('rowKey')
 
-    def get_blob_name(email, doc_type):
-        prefix = f"{email}_{doc_type}_"
-        blobs = blob_container.list_blobs(name_starts_with=prefix)
-        for blob in blobs:
-            return blob.name
-        return None
+    def get_blob_names(email):
+        names = {doc_type: None for doc_type in DOC_TYPES}
+        if not email or not blob_container:
+            return names
+        # Consult the document index first; only list the container for unresolved types
+        index_client = None
+        rows = {}
+        try:
+            index_client = blob_index.get_index_client()
+            if index_client:
+                rows = blob_index.lookup(index_client, email)
+                indexed = blob_index.resolved(rows)
+                if len(indexed) == len(DOC_TYPES):
+                    return indexed
+        except Exception as e:
+            logging.warning(f"Document index lookup failed for {email}: {str(e)}")
+        # One prefix listing for all of the applicant's documents, newest upload per doc type
+        blobs = blob_container.list_blobs(name_starts_with=f"{email}_")
+        names, writes = blob_index.repairs(email, rows, blobs)
+        # Repair the index with what the listing found, including known-missing types
+        if index_client:
+            blob_index.apply_repairs(index_client, writes)
+        return names
 
     def get_blob_sas_url(blob_name):
-        if not blob_account_key:
-            return None
-        sas_token = generate_blob_sas(
-            account_name=blob_account_name,
-            container_name=blob_container_name,
-            blob_name=blob_name,
-            account_key=blob_account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=1)
-        )
-        blob_url = f"https://{blob_account_name}.blob.core.windows.net/{blob_container_name}/{blob_name}?{sas_token}"
-        return blob_url
+        return sas_cache.get_sas_url(blob_account_name, blob_container_name, blob_name, blob_account_key)
 
     if partition_key and row_key:
         # Fetch specific entry
         try:
             entity = table_client.get_entity(partition_key=partition_key, row_key=row_key)
+            # Clients still read votes as approvalN/denialN fields, so expand the ledger
+            if entity.get(vote_ledger.LEDGER_FIELD):
+                approvals, denials = vote_ledger.to_legacy_fields(vote_ledger.load(entity))
+                entity.update(approvals)
+                entity.update(denials)
             email = entity.get('email') or entity.get('Email')
-            for doc_type in ['essay', 'studentID', 'schoolDoc']:
-                blob_name = get_blob_name(email, doc_type) if email else None
+            blob_names = get_blob_names(email)
+            for doc_type in DOC_TYPES:
+                blob_name = blob_names[doc_type]
                 if blob_name:
                     entity[doc_type + '_sas_url'] = get_blob_sas_url(blob_name)
                 else:
                     entity[doc_type + '_sas_url'] = None
-            return func.HttpResponse(json.dumps(entity), mimetype="application/json")
+            return http_cache.conditional_response(req, json_encoding.dumps(entity))
         except Exception as e:
             return func.HttpResponse(f"Error: {str(e)}", status_code=404)
     else:
-        entities = table_client.list_entities()
-        entities_list = list(entities)
-        result = [
-            {
-                'firstName': e.get('firstName'),
-                'lastName': e.get('lastName'),
-                'status': e.get('status'),
-                'partitionKey': e.get('PartitionKey'),
-                'rowKey': e.get('RowKey')
-            } for e in entities_list
-        ]
-        return func.HttpResponse(json.dumps(result), mimetype="application/json")
+        list_client = table_client
+        if LIST_FROM_SUMMARY:
+            list_client = applicant_summary.get_summary_client(connection_string)
+
+        if req.params.get('counts', '').lower() == 'true':
+            # Totals per status and RedpStatus, read from the incrementally maintained counters
+            try:
+                stats = applicant_stats.read_stats(applicant_stats.get_stats_client(connection_string))
+            except Exception as e:
+                return func.HttpResponse(
+                    json_encoding.dumps({"error": f"Error reading statistics: {str(e)}"}),
+                    status_code=500,
+                    mimetype="application/json"
+                )
+            counts = {key: stats[key] for key in ('total', 'status', 'redpStatus')}
+            return http_cache.conditional_response(req, json_encoding.dumps(counts))
+
+        try:
+            query_filter, parameters = build_list_filter(req.params)
+        except ValueError as e:
+            return func.HttpResponse(
+                json_encoding.dumps({"error": str(e)}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        # Taken before querying so nothing written during the query falls behind the cursor
+        delta_cursor = next_delta_cursor() if 'since' in parameters else None
+        page_size_param = req.params.get('pageSize')
+        token_param = req.params.get('continuationToken')
+        if page_size_param or token_param:
+            # Paged mode: fetch a single page and hand back an opaque cursor for the next one
+            try:
+                page_size = parse_page_size(page_size_param) if page_size_param else DEFAULT_PAGE_SIZE
+                continuation_token = decode_continuation_token(token_param)
+            except ValueError as e:
+                return func.HttpResponse(
+                    json_encoding.dumps({"error": str(e)}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            pages = query_list_entities(
+                list_client, query_filter, parameters, results_per_page=page_size
+            ).by_page(continuation_token=continuation_token)
+            items = [to_list_item(e) for e in next(pages, [])]
+            result = {
+                'items': items,
+                'count': len(items),
+                'continuationToken': encode_continuation_token(pages.continuation_token)
+            }
+            etag = None
+            if delta_cursor:
+                # The cursor changes on every call, so it is left out of the ETag
+                etag = http_cache.compute_etag(json_encoding.dumps(result))
+                result['cursor'] = delta_cursor
+            return http_cache.conditional_response(req, json_encoding.dumps(result), etag=etag)
+
+        # Serialize and compress rows as they are paged in instead of building the whole list first;
+        # the compressed body is still returned in one piece
+        entities = query_list_entities(list_client, query_filter, parameters)
+        items = (to_list_item(e) for e in entities)
+        writer = json_stream.Writer(json_stream.negotiate_encoding(req.headers.get('Accept-Encoding')))
+        etag = None
+        if json_stream.wants_ndjson(req):
+            writer.write_ndjson(items)
+            headers = writer.headers(json_stream.NDJSON_MIMETYPE)
+        elif delta_cursor:
+            # Delta mode: changed/added rows plus the cursor for the next refresh
+            writer.write('{"items":')
+            count = writer.write_array(items)
+            # Validate everything but the cursor, which changes on every call; a client
+            # answered with 304 keeps its previous cursor, which only widens its next window
+            etag = writer.etag()
+            writer.write(f',"count":{count},"cursor":{json_encoding.dumps(delta_cursor)}}}')
+            headers = writer.headers()
+        else:
+            writer.write_array(items)
+            headers = writer.headers()
+        return http_cache.conditional_response(req, writer.finish(), headers=headers, etag=etag or writer.etag())
@@ -0,0 +1,79 @@
+import asyncio
+import azure.functions as func
+import logging
+import os
+import dotenv
+from ..shared_code import aio_clients, blob_index, http_cache, json_encoding, sas_cache, vote_ledger
+from ..shared_code.blob_index import DOC_TYPES
+from .. import HttpTableFunction
+
+dotenv.load_dotenv(dotenv.find_dotenv())
+
+
+async def get_blob_names(email, blob_container):
+    """Async counterpart of HttpTableFunction's document lookup: index first, one prefix listing for unresolved types"""
+    names = {doc_type: None for doc_type in DOC_TYPES}
+    if not email or not blob_container:
+        return names
+    connection_string = os.environ.get('AZURE_TABLE_CONNECTION_STRING')
+    index_client = None
+    rows = {}
+    try:
+        if connection_string:
+            index_client = await aio_clients.ensure_table(connection_string, blob_index.INDEX_TABLE_NAME)
+            rows = await blob_index.lookup_async(index_client, email)
+            indexed = blob_index.resolved(rows)
+            if len(indexed) == len(DOC_TYPES):
+                return indexed
+    except Exception as e:
+        logging.warning(f"Document index lookup failed for {email}: {str(e)}")
+
+    blobs = [blob async for blob in blob_container.list_blobs(name_starts_with=f"{email}_")]
+    names, writes = blob_index.repairs(email, rows, blobs)
+    if index_client:
+        await blob_index.apply_repairs_async(index_client, writes)
+    return names
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of HttpTableFunction. Detail requests read the applicant and
+    its documents through the aio table and blob clients, so the worker keeps
+    serving other requests while they are in flight. List and counts requests
+    are one paged query serialized by json_stream's synchronous writer, so they
+    run the existing implementation on a worker thread.
+    """
+    partition_key = req.params.get('partitionKey')
+    row_key = req.params.get('rowKey')
+    if not (partition_key and row_key):
+        return await asyncio.to_thread(HttpTableFunction.main, req)
+
+    connection_string = os.environ.get('AZURE_TABLE_CONNECTION_STRING')
+    table_name = os.environ.get('TABLE_NAME', 'DynamoInfo')
+    blob_connection_string = os.environ.get('AZURE_BLOB_CONNECTION_STRING')
+    blob_container_name = os.environ.get('BLOB_CONTAINER_NAME')
+    blob_account_name = os.environ.get('BLOB_ACCOUNT_NAME', 'redpfiles')
+    blob_account_key = os.environ.get('BLOB_ACCOUNT_KEY')
+    blob_container = None
+    if blob_connection_string and blob_container_name:
+        blob_container = aio_clients.get_blob_container_client(blob_connection_string, blob_container_name)
+
+    try:
+        table_client = aio_clients.get_table_client(connection_string, table_name)
+        entity = await table_client.get_entity(partition_key=partition_key, row_key=row_key)
+        # Clients still read votes as approvalN/denialN fields, so expand the ledger
+        if entity.get(vote_ledger.LEDGER_FIELD):
+            approvals, denials = vote_ledger.to_legacy_fields(vote_ledger.load(entity))
+            entity.update(approvals)
+            entity.update(denials)
+        email = entity.get('email') or entity.get('Email')
+        blob_names = await get_blob_names(email, blob_container)
+        for doc_type in DOC_TYPES:
+            blob_name = blob_names[doc_type]
+            entity[doc_type + '_sas_url'] = (
+                sas_cache.get_sas_url(blob_account_name, blob_container_name, blob_name, blob_account_key)
+                if blob_name else None
+            )
+        return http_cache.conditional_response(req, json_encoding.dumps(entity))
+    except Exception as e:
+        return func.HttpResponse(f"Error: {str(e)}", status_code=404)
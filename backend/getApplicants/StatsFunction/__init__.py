@@ -0,0 +1,18 @@
+import azure.functions as func
+import os
+import dotenv
+from ..shared_code import applicant_stats, http_cache, json_encoding
+
+dotenv.load_dotenv(dotenv.find_dotenv())
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    connection_string = os.environ.get('AZURE_TABLE_CONNECTION_STRING')
+    try:
+        stats = applicant_stats.read_stats(applicant_stats.get_stats_client(connection_string))
+        return http_cache.conditional_response(req, json_encoding.dumps(stats))
+    except Exception as e:
+        return func.HttpResponse(
+            json_encoding.dumps({"error": f"Error reading statistics: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json"
+        )
@@ -0,0 +1,113 @@
+"""
+Process-lifetime registry of async (aio) Azure Storage clients for the async handlers.
+
+The async counterpart of storage_clients: clients are built once and reused by
+every warm invocation, and all of them share one aiohttp session through an
+AioHttpTransport, which async handlers also use for their own outbound HTTP calls.
+Async functions all run on the worker's single event loop, so the session is
+created lazily on first use inside that loop and needs no locking.
+
+aiohttp and the aio SDK modules are imported lazily so apps that only run the
+synchronous handlers do not need them.
+"""
+import logging
+import os
+
+from azure.core.exceptions import ResourceExistsError
+
+POOL_SIZE = int(os.environ.get('STORAGE_HTTP_POOL_SIZE', '20'))
+CONNECTION_TIMEOUT = int(os.environ.get('STORAGE_CONNECTION_TIMEOUT', '10'))
+READ_TIMEOUT = int(os.environ.get('STORAGE_READ_TIMEOUT', '30'))
+
+_session = None
+_transport = None
+_table_services = {}
+_table_clients = {}
+_blob_containers = {}
+_verified_tables = set()
+
+
+def get_http_session():
+    """Return the shared aiohttp session, creating it on the running event loop"""
+    global _session
+    if _session is None:
+        import aiohttp
+
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(sock_connect=CONNECTION_TIMEOUT, sock_read=READ_TIMEOUT)
+        )
+    return _session
+
+
+def get_transport():
+    """Return the shared transport used by every aio storage client"""
+    global _transport
+    if _transport is None:
+        from azure.core.pipeline.transport import AioHttpTransport
+
+        _transport = AioHttpTransport(
+            session=get_http_session(),
+            session_owner=False,
+            connection_timeout=CONNECTION_TIMEOUT,
+            read_timeout=READ_TIMEOUT
+        )
+    return _transport
+
+
+def get_table_service_client(connection_string):
+    """Get the cached aio TableServiceClient for a connection string"""
+    from azure.data.tables.aio import TableServiceClient
+
+    client = _table_services.get(connection_string)
+    if client is None:
+        logging.info("Creating shared aio TableServiceClient")
+        client = TableServiceClient.from_connection_string(
+            conn_str=connection_string, transport=get_transport()
+        )
+        _table_services[connection_string] = client
+    return client
+
+
+def get_table_client(connection_string, table_name):
+    """Get the cached aio TableClient for a (connection string, table) pair"""
+    key = (connection_string, table_name)
+    client = _table_clients.get(key)
+    if client is None:
+        client = get_table_service_client(connection_string).get_table_client(table_name=table_name)
+        _table_clients[key] = client
+    return client
+
+
+async def ensure_table(connection_string, table_name):
+    """Get the cached aio TableClient, creating the table the first time it is seen"""
+    key = (connection_string, table_name)
+    client = get_table_client(connection_string, table_name)
+    if key in _verified_tables:
+        return client
+    try:
+        await client.create_table()
+        logging.info(f"Created table {table_name}")
+    except ResourceExistsError:
+        logging.info(f"Table {table_name} already exists")
+    _verified_tables.add(key)
+    return client
+
+
+def invalidate_table(connection_string, table_name):
+    """Forget that a table was verified so the next ensure_table re-provisions it"""
+    _verified_tables.discard((connection_string, table_name))
+
+
+def get_blob_container_client(connection_string, container_name):
+    """Get the cached aio ContainerClient for a (connection string, container) pair"""
+    from azure.storage.blob.aio import BlobServiceClient
+
+    key = (connection_string, container_name)
+    client = _blob_containers.get(key)
+    if client is None:
+        logging.info(f"Creating shared aio ContainerClient for {container_name}")
+        service = BlobServiceClient.from_connection_string(connection_string, transport=get_transport())
+        client = service.get_container_client(container_name)
+        _blob_containers[key] = client
+    return client
@@ -0,0 +1,250 @@
+"""
+Index of applicant documents in blob storage.
+
+Documents are uploaded as {email}_{docType}_{original name}. Rather than
+prefix-scanning the container on every detail view, the latest blob name for
+each (email, docType) pair is kept in a small table keyed by
+PartitionKey=email, RowKey=docType. The index is written by BlobIndexFunction
+on Microsoft.Storage.BlobCreated events, entries are dropped by
+BlobDeletedFunction on Microsoft.Storage.BlobDeleted, and it can be rebuilt
+from the container with:
+
+    python -m shared_code.blob_index
+
+Detail views that find a document type missing from the index do one prefix
+listing and repair the index with the result. Types the listing did not find
+either are recorded as known-missing (an empty BlobName) for
+MISSING_TTL_SECONDS, so applicants who never uploaded a document do not list
+the container on every view. An upload replaces the marker straight away.
+
+Rows carry the LastModified time of the blob they point at and are only
+replaced by a blob at least as new, so Event Grid redeliveries and
+out-of-order events never roll a document back to an older upload.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import UpdateMode
+
+from .storage_clients import ensure_table, get_blob_container_client
+
+DOC_TYPES = ['essay', 'studentID', 'schoolDoc']
+
+INDEX_TABLE_NAME = os.environ.get('BLOB_INDEX_TABLE_NAME', 'ApplicantDocuments')
+MISSING_TTL_SECONDS = int(os.environ.get('BLOB_INDEX_MISSING_TTL_SECONDS', '3600'))
+
+
+def get_index_client():
+    """Get the index table client, or None if storage is not configured"""
+    connection_string = os.environ.get('AZURE_TABLE_CONNECTION_STRING')
+    if not connection_string:
+        return None
+    return ensure_table(connection_string, INDEX_TABLE_NAME)
+
+
+def parse_blob_name(blob_name):
+    """Split an uploaded blob name into (email, doc_type), or None if it does not match the layout"""
+    # Emails may contain underscores, so only look for the doc type marker after the '@'
+    at = blob_name.find('@')
+    if at < 0:
+        return None
+    for doc_type in DOC_TYPES:
+        idx = blob_name.find(f"_{doc_type}_", at)
+        if idx > 0:
+            return blob_name[:idx], doc_type
+    return None
+
+
+def lookup(index_client, email):
+    """Return {doc_type: index entity} for every index row of an applicant"""
+    entities = index_client.query_entities(
+        "PartitionKey eq @email", parameters={'email': email}, select=['RowKey', 'BlobName', 'CheckedAt']
+    )
+    return {e['RowKey']: e for e in entities}
+
+
+async def lookup_async(index_client, email):
+    """lookup for an aio table client"""
+    entities = index_client.query_entities(
+        "PartitionKey eq @email", parameters={'email': email}, select=['RowKey', 'BlobName', 'CheckedAt']
+    )
+    return {e['RowKey']: e async for e in entities}
+
+
+def resolved(rows, now=None):
+    """
+    {doc_type: blob name, or None if known to be missing} for the index rows
+    that can be trusted; expired missing markers are left out
+    """
+    now = now or datetime.now(timezone.utc)
+    names = {}
+    for doc_type, row in rows.items():
+        if row.get('BlobName'):
+            names[doc_type] = row['BlobName']
+        elif row.get('CheckedAt') and now - row['CheckedAt'] < timedelta(seconds=MISSING_TTL_SECONDS):
+            names[doc_type] = None
+    return names
+
+
+def latest_blobs(blobs):
+    """Newest blob per (email, doc_type) from a listing of blob properties"""
+    latest = {}
+    for blob in blobs:
+        parsed = parse_blob_name(blob.name)
+        if not parsed:
+            continue
+        current = latest.get(parsed)
+        if current is None or blob.last_modified > current.last_modified:
+            latest[parsed] = blob
+    return latest
+
+
+def repairs(email, rows, blobs, now=None):
+    """
+    Index writes for the document types a prefix listing had to resolve.
+    Returns (names, writes): names maps every doc type to its newest blob name
+    (or None), and each write is (entity, etag of the row it replaces or None).
+    """
+    now = now or datetime.now(timezone.utc)
+    names = resolved(rows, now)
+    latest = latest_blobs(blobs)
+    writes = []
+    for doc_type in DOC_TYPES:
+        if doc_type in names:
+            continue
+        blob = latest.get((email, doc_type))
+        names[doc_type] = blob.name if blob else None
+        entity = {'PartitionKey': email, 'RowKey': doc_type, 'BlobName': blob.name if blob else '', 'CheckedAt': now}
+        if blob:
+            entity['LastModified'] = blob.last_modified
+        row = rows.get(doc_type)
+        writes.append((entity, row.metadata['etag'] if row is not None else None))
+    return names, writes
+
+
+def _skip_repair(entity, error):
+    # BlobIndexFunction (or another request) wrote the row first; its value wins
+    logging.info(f"Index row {entity['PartitionKey']}/{entity['RowKey']} changed meanwhile, not repaired: {str(error)}")
+
+
+def apply_repairs(index_client, writes):
+    """Apply repairs() writes without overwriting rows written since they were read"""
+    for entity, etag in writes:
+        try:
+            if etag is None:
+                index_client.create_entity(entity=entity)
+            else:
+                index_client.update_entity(
+                    entity=entity, mode=UpdateMode.REPLACE, etag=etag, match_condition=MatchConditions.IfNotModified
+                )
+        except (ResourceExistsError, ResourceModifiedError, ResourceNotFoundError) as e:
+            _skip_repair(entity, e)
+        except Exception as e:
+            logging.warning(f"Failed to index document {entity['PartitionKey']}/{entity['RowKey']}: {str(e)}")
+
+
+async def apply_repairs_async(index_client, writes):
+    """apply_repairs for an aio table client; the writes are independent, so they run concurrently"""
+    async def write(entity, etag):
+        try:
+            if etag is None:
+                await index_client.create_entity(entity=entity)
+            else:
+                await index_client.update_entity(
+                    entity=entity, mode=UpdateMode.REPLACE, etag=etag, match_condition=MatchConditions.IfNotModified
+                )
+        except (ResourceExistsError, ResourceModifiedError, ResourceNotFoundError) as e:
+            _skip_repair(entity, e)
+        except Exception as e:
+            logging.warning(f"Failed to index document {entity['PartitionKey']}/{entity['RowKey']}: {str(e)}")
+
+    await asyncio.gather(*(write(entity, etag) for entity, etag in writes))
+
+
+def record(index_client, blob_name, last_modified=None):
+    """
+    Point the index at blob_name for its (email, doc_type); returns False if the name is not a document.
+    Rows already pointing at a blob modified after last_modified are kept, so
+    late or redelivered events cannot roll the index back to an older upload.
+    """
+    parsed = parse_blob_name(blob_name)
+    if not parsed:
+        return False
+    email, doc_type = parsed
+    last_modified = last_modified or datetime.now(timezone.utc)
+    entity = {
+        'PartitionKey': email,
+        'RowKey': doc_type,
+        'BlobName': blob_name,
+        'LastModified': last_modified,
+        'CheckedAt': datetime.now(timezone.utc)
+    }
+    for _ in range(3):
+        try:
+            row = index_client.get_entity(partition_key=email, row_key=doc_type)
+        except ResourceNotFoundError:
+            row = None
+        newer = row is not None and row.get('BlobName') and row.get('LastModified')
+        if newer and row['LastModified'] > last_modified:
+            logging.info(f"Index row {email}/{doc_type} already points at newer {row['BlobName']}, keeping it")
+            return True
+        try:
+            if row is None:
+                index_client.create_entity(entity=entity)
+            else:
+                index_client.update_entity(
+                    entity=entity, mode=UpdateMode.REPLACE,
+                    etag=row.metadata['etag'], match_condition=MatchConditions.IfNotModified
+                )
+            return True
+        except (ResourceExistsError, ResourceModifiedError, ResourceNotFoundError):
+            # Written concurrently; re-read and compare again
+            continue
+    logging.warning(f"Index row {email}/{doc_type} kept changing, {blob_name} not recorded")
+    return True
+
+
+def forget(index_client, blob_name):
+    """
+    Drop the index row for a deleted blob if it still points at it, so the next
+    detail view re-resolves the document; returns True if a row was removed
+    """
+    parsed = parse_blob_name(blob_name)
+    if not parsed:
+        return False
+    email, doc_type = parsed
+    try:
+        row = index_client.get_entity(partition_key=email, row_key=doc_type)
+        if row.get('BlobName') != blob_name:
+            return False
+        index_client.delete_entity(
+            partition_key=email, row_key=doc_type,
+            etag=row.metadata['etag'], match_condition=MatchConditions.IfNotModified
+        )
+        return True
+    except (ResourceNotFoundError, ResourceModifiedError):
+        # Already gone, or a newer upload replaced it
+        return False
+
+
+def reindex(index_client, blob_container):
+    """Rebuild the index from a full container listing, keeping the newest upload per document"""
+    latest = latest_blobs(blob_container.list_blobs())
+    for blob in latest.values():
+        record(index_client, blob.name, blob.last_modified)
+    logging.info(f"Indexed {len(latest)} applicant documents into {INDEX_TABLE_NAME}")
+    return len(latest)
+
+
+if __name__ == '__main__':
+    import dotenv
+    dotenv.load_dotenv(dotenv.find_dotenv())
+    logging.basicConfig(level=logging.INFO)
+    container = get_blob_container_client(
+        os.environ['AZURE_BLOB_CONNECTION_STRING'], os.environ['BLOB_CONTAINER_NAME']
+    )
+    reindex(get_index_client(), container)
@@ -0,0 +1,58 @@
+"""
+Conditional GET support for read endpoints.
+
+Responses carry an ETag computed over the uncompressed serialized body and a
+Cache-Control header. When the client's If-None-Match matches, a bodyless 304
+is returned so polling clients only pay for a round trip.
+"""
+import hashlib
+import os
+
+import azure.functions as func
+
+RESPONSE_MAX_AGE_SECONDS = int(os.environ.get('RESPONSE_MAX_AGE_SECONDS', '0'))
+
+
+def compute_etag(body):
+    """Strong ETag for a response body"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header value (list, weak validators or *) against an ETag, using weak comparison"""
+    if not if_none_match:
+        return False
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+def conditional_response(req, body, status_code=200, headers=None, max_age=None, etag=None):
+    """
+    Build a 200 response with ETag/Cache-Control, or a 304 if the client already has this body.
+    Pass etag when body is compressed, so the validator is computed over the uncompressed JSON.
+    """
+    max_age = RESPONSE_MAX_AGE_SECONDS if max_age is None else max_age
+    etag = etag or compute_etag(body)
+    cache_headers = {
+        'ETag': etag,
+        # Responses are per-admin data (and may contain SAS URLs), so only the browser may cache them
+        'Cache-Control': f'private, max-age={max_age}, must-revalidate'
+    }
+    if headers and 'Vary' in headers:
+        # A 304 must carry the same Vary as the 200 so caches match it to the right variant
+        cache_headers['Vary'] = headers['Vary']
+    if status_code == 200 and etag_matches(req.headers.get('If-None-Match'), etag):
+        return func.HttpResponse(status_code=304, headers=cache_headers)
+    all_headers = {'Content-Type': 'application/json'}
+    all_headers.update(headers or {})
+    all_headers.update(cache_headers)
+    return func.HttpResponse(body, status_code=status_code, headers=all_headers)
@@ -0,0 +1,99 @@
+"""
+In-process cache of read-only SAS URLs for applicant documents.
+
+Signing a SAS is an HMAC over the blob path, and a fresh token on every detail
+request also defeats browser/CDN caching of the document. URLs are cached per
+blob and reused for as long as they have at least SAS_MIN_REMAINING_MINUTES of
+validity left, so repeat views of an applicant hand out the same URL.
+
+When no account key is configured and SAS_USE_USER_DELEGATION is enabled, the
+URLs are signed with a user delegation key obtained through
+DefaultAzureCredential instead. azure-identity is listed in requirements.txt;
+if it is missing anyway, the error is logged and no URL is returned, the same
+as when no signing method is configured.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+SAS_EXPIRY_MINUTES = int(os.environ.get('SAS_EXPIRY_MINUTES', '60'))
+SAS_MIN_REMAINING_MINUTES = int(os.environ.get('SAS_MIN_REMAINING_MINUTES', '15'))
+SAS_CACHE_SIZE = int(os.environ.get('SAS_CACHE_SIZE', '2048'))
+SAS_USE_USER_DELEGATION = os.environ.get('SAS_USE_USER_DELEGATION', 'false').lower() == 'true'
+DELEGATION_KEY_HOURS = 24
+
+_lock = threading.Lock()
+_urls = OrderedDict()
+_delegation = {}
+
+
+def _get_user_delegation_key(account_name, now):
+    """Return a cached user delegation key, requesting a new one when it is close to expiring"""
+    cached = _delegation.get(account_name)
+    if cached and cached[1] - now > timedelta(minutes=SAS_EXPIRY_MINUTES):
+        return cached
+    from azure.identity import DefaultAzureCredential
+    from azure.storage.blob import BlobServiceClient
+
+    service = BlobServiceClient(
+        account_url=f"https://{account_name}.blob.core.windows.net",
+        credential=DefaultAzureCredential()
+    )
+    expiry = now + timedelta(hours=DELEGATION_KEY_HOURS)
+    key = service.get_user_delegation_key(key_start_time=now - timedelta(minutes=5), key_expiry_time=expiry)
+    logging.info(f"Obtained user delegation key for {account_name} valid until {expiry.isoformat()}")
+    _delegation[account_name] = (key, expiry)
+    return _delegation[account_name]
+
+
+def get_sas_url(account_name, container_name, blob_name, account_key=None):
+    """Return a read-only SAS URL for a blob, reusing a cached one while it is still fresh enough"""
+    cache_key = (account_name, container_name, blob_name)
+    now = datetime.now(timezone.utc)
+    with _lock:
+        cached = _urls.get(cache_key)
+        if cached and cached[1] - now >= timedelta(minutes=SAS_MIN_REMAINING_MINUTES):
+            _urls.move_to_end(cache_key)
+            return cached[0]
+
+    expiry = now + timedelta(minutes=SAS_EXPIRY_MINUTES)
+    if account_key:
+        sas_token = generate_blob_sas(
+            account_name=account_name,
+            container_name=container_name,
+            blob_name=blob_name,
+            account_key=account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=expiry
+        )
+    elif SAS_USE_USER_DELEGATION:
+        try:
+            delegation_key, key_expiry = _get_user_delegation_key(account_name, now)
+        except ImportError as e:
+            # Without azure-identity there is no credential to sign with; hand out no URL
+            # rather than failing the whole detail view
+            logging.error(f"SAS_USE_USER_DELEGATION is set but azure-identity is unavailable: {str(e)}")
+            return None
+        expiry = min(expiry, key_expiry)
+        sas_token = generate_blob_sas(
+            account_name=account_name,
+            container_name=container_name,
+            blob_name=blob_name,
+            user_delegation_key=delegation_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=expiry
+        )
+    else:
+        return None
+
+    url = f"https://{account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
+    with _lock:
+        _urls[cache_key] = (url, expiry)
+        _urls.move_to_end(cache_key)
+        while len(_urls) > SAS_CACHE_SIZE:
+            _urls.popitem(last=False)
+    return url
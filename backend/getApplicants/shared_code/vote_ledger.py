@@ -0,0 +1,105 @@
+"""
+Compact vote ledger for applicant entities.
+
+Votes used to be spread over approval1..N / timeOfApproval1..N and
+denial1..N / timeOfDenial1..N columns, which made every vote an O(N) walk and
+rewrite of the slots. They are now stored as one JSON column:
+
+    votes = {"approvals": {email: timestamp, ...}, "denials": {email: timestamp, ...}}
+
+with approvalCount / denialCount alongside it for cheap reads. Entities still in
+the wide layout are converted the first time they are loaded, and the whole table
+can be converted up front with:
+
+    python -m shared_code.vote_ledger
+"""
+import json
+import logging
+import re
+
+LEDGER_FIELD = 'votes'
+
+_WIDE_FIELD = re.compile(r'^(approval|denial|timeOfApproval|timeOfDenial)\d+$')
+
+
+def _load_wide(entity, vote_field, time_field):
+    votes = {}
+    i = 1
+    while entity.get(f'{vote_field}{i}'):
+        votes[entity[f'{vote_field}{i}']] = entity.get(f'{time_field}{i}') or ''
+        i += 1
+    return votes
+
+
+def load(entity):
+    """Read the ledger from an entity, converting the wide approvalN/denialN layout if needed"""
+    raw = entity.get(LEDGER_FIELD)
+    if raw:
+        data = json.loads(raw)
+        return {'approvals': data.get('approvals', {}), 'denials': data.get('denials', {})}
+    return {
+        'approvals': _load_wide(entity, 'approval', 'timeOfApproval'),
+        'denials': _load_wide(entity, 'denial', 'timeOfDenial')
+    }
+
+
+def store(entity, ledger):
+    """Write the ledger back to the entity and drop any wide vote columns"""
+    for key in [k for k in entity.keys() if _WIDE_FIELD.match(k)]:
+        del entity[key]
+    entity[LEDGER_FIELD] = json.dumps(ledger, separators=(',', ':'))
+    entity['approvalCount'] = len(ledger['approvals'])
+    entity['denialCount'] = len(ledger['denials'])
+
+
+def is_wide(entity):
+    """True if the entity still carries wide vote columns"""
+    return any(_WIDE_FIELD.match(k) for k in entity.keys())
+
+
+def to_legacy_fields(ledger):
+    """Expand the ledger into approvalN/timeOfApprovalN and denialN/timeOfDenialN fields for API responses"""
+    approvals = {}
+    denials = {}
+    for i, (email, timestamp) in enumerate(ledger['approvals'].items(), 1):
+        approvals[f'approval{i}'] = email
+        approvals[f'timeOfApproval{i}'] = timestamp
+    for i, (email, timestamp) in enumerate(ledger['denials'].items(), 1):
+        denials[f'denial{i}'] = email
+        denials[f'timeOfDenial{i}'] = timestamp
+    return approvals, denials
+
+
+def migrate_table(table_client):
+    """Convert every entity still in the wide layout to the ledger layout"""
+    from azure.core import MatchConditions
+    from azure.core.exceptions import ResourceModifiedError
+
+    migrated = 0
+    for entity in table_client.list_entities():
+        if not is_wide(entity):
+            continue
+        store(entity, load(entity))
+        try:
+            table_client.update_entity(
+                entity=entity,
+                mode='replace',
+                etag=entity.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            migrated += 1
+        except ResourceModifiedError:
+            # Modified mid-migration; the next run (or the next vote) converts it
+            logging.info(f"Skipping {entity['PartitionKey']}/{entity['RowKey']}: modified concurrently")
+    logging.info(f"Migrated {migrated} entities to the vote ledger layout")
+    return migrated
+
+
+if __name__ == '__main__':
+    import os
+    from dotenv import load_dotenv
+    from .storage_clients import get_table_client
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    migrate_table(get_table_client(os.environ['AZURE_STORAGE_CONNECTION_STRING'], 'DynamoInfo'))
@@ -1,13 +1,14 @@
-import json
+import asyncio
 import logging
 import os
 from datetime import datetime, timezone
 from typing import Optional
 import azure.functions as func
-from azure.data.tables import TableServiceClient, TableEntity
-from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.data.tables import TableEntity
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import DefaultAzureCredential
 from dotenv import load_dotenv
+from shared_code import aio_clients, http_cache, json_encoding, storage_clients
 
 # Load environment variables from .env file for local development
 load_dotenv()
@@ -23,27 +24,28 @@ AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AzureWebJobsStorage')
 def get_table_client():
     """Get Azure Table Storage client using connection string"""
     try:
-        # Use connection string for authentication
-        logging.info(f"Using connection string for Azure Table Storage")
-        
         if not AZURE_STORAGE_CONNECTION_STRING:
             raise ValueError("AzureWebJobsStorage connection string not found in environment variables")
         
-        table_service_client = TableServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        table_client = table_service_client.get_table_client(table_name=ADMIN_TABLE_NAME)
-        
-        # Create table if it doesn't exist
-        try:
-            table_client.create_table()
-            logging.info(f"Created table {ADMIN_TABLE_NAME}")
-        except ResourceExistsError:
-            logging.info(f"Table {ADMIN_TABLE_NAME} already exists")
-        
-        return table_client
+        # The table is provisioned once per worker; later calls reuse the cached client
+        return storage_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, ADMIN_TABLE_NAME)
     except Exception as e:
         logging.error(f"Failed to connect to Azure Table Storage: {str(e)}")
         raise
 
+def reset_table_if_missing(error):
+    """Re-provision the admin table on the next request if it has disappeared"""
+    if storage_clients.is_table_not_found(error):
+        logging.warning(f"Table {ADMIN_TABLE_NAME} not found, it will be re-created on next use")
+        storage_clients.invalidate_table(AZURE_STORAGE_CONNECTION_STRING, ADMIN_TABLE_NAME)
+        aio_clients.invalidate_table(AZURE_STORAGE_CONNECTION_STRING, ADMIN_TABLE_NAME)
+
+# Provision the admin table once at startup rather than on every request
+try:
+    get_table_client()
+except Exception as startup_error:
+    logging.warning(f"Admin table provisioning deferred: {str(startup_error)}")
+
 def validate_email(email: str) -> bool:
     """Basic email validation"""
     return "@" in email and "." in email.split("@")[1]
@@ -57,11 +59,13 @@ def check_super_admin_permission(requester_email: str) -> bool:
         try:
             admin_entity = table_client.get_entity(partition_key="admins", row_key=requester_email)
             return admin_entity.get('Role') == 'super_admin'
-        except ResourceNotFoundError:
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
             logging.warning(f"Admin record not found for {requester_email}")
             return False
             
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error checking super admin permission: {str(e)}")
         return False
 
@@ -83,14 +87,14 @@ def create_admin(req: func.HttpRequest) -> func.HttpResponse:
             req_body = req.get_json()
         except ValueError:
             return func.HttpResponse(
-                json.dumps({"error": "Invalid JSON in request body"}),
+                json_encoding.dumps({"error": "Invalid JSON in request body"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
         
         if not req_body:
             return func.HttpResponse(
-                json.dumps({"error": "Request body is required"}),
+                json_encoding.dumps({"error": "Request body is required"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -101,7 +105,7 @@ def create_admin(req: func.HttpRequest) -> func.HttpResponse:
         
         if not requester_email or not new_admin_email:
             return func.HttpResponse(
-                json.dumps({"error": "Both 'requester_email' and 'new_admin_email' are required"}),
+                json_encoding.dumps({"error": "Both 'requester_email' and 'new_admin_email' are required"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -109,7 +113,7 @@ def create_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Validate email formats
         if not validate_email(requester_email) or not validate_email(new_admin_email):
             return func.HttpResponse(
-                json.dumps({"error": "Invalid email format"}),
+                json_encoding.dumps({"error": "Invalid email format"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -117,7 +121,7 @@ def create_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Check if requester has super_admin permissions
         if not check_super_admin_permission(requester_email):
             return func.HttpResponse(
-                json.dumps({"error": "Access denied. Only super_admin users can create new admins"}),
+                json_encoding.dumps({"error": "Access denied. Only super_admin users can create new admins"}),
                 status_code=403,
                 headers={"Content-Type": "application/json"}
             )
@@ -129,11 +133,12 @@ def create_admin(req: func.HttpRequest) -> func.HttpResponse:
         try:
             existing_admin = table_client.get_entity(partition_key="admins", row_key=new_admin_email)
             return func.HttpResponse(
-                json.dumps({"error": f"Admin with email {new_admin_email} already exists"}),
+                json_encoding.dumps({"error": f"Admin with email {new_admin_email} already exists"}),
                 status_code=409,
                 headers={"Content-Type": "application/json"}
             )
-        except ResourceNotFoundError:
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
             # Admin doesn't exist, which is what we want
             pass
         
@@ -165,15 +170,16 @@ def create_admin(req: func.HttpRequest) -> func.HttpResponse:
         }
         
         return func.HttpResponse(
-            json.dumps(response_data),
+            json_encoding.dumps(response_data),
             status_code=201,
             headers={"Content-Type": "application/json"}
         )
         
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error creating admin user: {str(e)}")
         return func.HttpResponse(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            json_encoding.dumps({"error": f"Internal server error: {str(e)}"}),
             status_code=500,
             headers={"Content-Type": "application/json"}
         )
@@ -198,7 +204,7 @@ def read_admin(req: func.HttpRequest) -> func.HttpResponse:
             # Return specific admin information
             if not validate_email(email):
                 return func.HttpResponse(
-                    json.dumps({"error": "Invalid email format"}),
+                    json_encoding.dumps({"error": "Invalid email format"}),
                     status_code=400,
                     headers={"Content-Type": "application/json"}
                 )
@@ -219,15 +225,12 @@ def read_admin(req: func.HttpRequest) -> func.HttpResponse:
                     "admin": admin_info
                 }
                 
-                return func.HttpResponse(
-                    json.dumps(response_data),
-                    status_code=200,
-                    headers={"Content-Type": "application/json"}
-                )
+                return http_cache.conditional_response(req, json_encoding.dumps(response_data))
                 
-            except ResourceNotFoundError:
+            except ResourceNotFoundError as e:
+                reset_table_if_missing(e)
                 return func.HttpResponse(
-                    json.dumps({"error": f"Admin with email {email} not found"}),
+                    json_encoding.dumps({"error": f"Admin with email {email} not found"}),
                     status_code=404,
                     headers={"Content-Type": "application/json"}
                 )
@@ -252,24 +255,22 @@ def read_admin(req: func.HttpRequest) -> func.HttpResponse:
                     "count": len(admins_list)
                 }
                 
-                return func.HttpResponse(
-                    json.dumps(response_data),
-                    status_code=200,
-                    headers={"Content-Type": "application/json"}
-                )
+                return http_cache.conditional_response(req, json_encoding.dumps(response_data))
                 
             except Exception as e:
+                reset_table_if_missing(e)
                 logging.error(f"Error querying all admins: {str(e)}")
                 return func.HttpResponse(
-                    json.dumps({"error": f"Error retrieving admin list: {str(e)}"}),
+                    json_encoding.dumps({"error": f"Error retrieving admin list: {str(e)}"}),
                     status_code=500,
                     headers={"Content-Type": "application/json"}
                 )
         
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error reading admin user(s): {str(e)}")
         return func.HttpResponse(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            json_encoding.dumps({"error": f"Internal server error: {str(e)}"}),
             status_code=500,
             headers={"Content-Type": "application/json"}
         )
@@ -292,14 +293,14 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
             req_body = req.get_json()
         except ValueError:
             return func.HttpResponse(
-                json.dumps({"error": "Invalid JSON in request body"}),
+                json_encoding.dumps({"error": "Invalid JSON in request body"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
         
         if not req_body:
             return func.HttpResponse(
-                json.dumps({"error": "Request body is required"}),
+                json_encoding.dumps({"error": "Request body is required"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -310,7 +311,7 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
         
         if not current_super_admin_email or not new_super_admin_email:
             return func.HttpResponse(
-                json.dumps({"error": "Both 'current_super_admin_email' and 'new_super_admin_email' are required"}),
+                json_encoding.dumps({"error": "Both 'current_super_admin_email' and 'new_super_admin_email' are required"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -318,7 +319,7 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Validate email formats
         if not validate_email(current_super_admin_email) or not validate_email(new_super_admin_email):
             return func.HttpResponse(
-                json.dumps({"error": "Invalid email format"}),
+                json_encoding.dumps({"error": "Invalid email format"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -326,7 +327,7 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Prevent transferring to the same email
         if current_super_admin_email.lower() == new_super_admin_email.lower():
             return func.HttpResponse(
-                json.dumps({"error": "Cannot transfer super_admin privileges to the same email address"}),
+                json_encoding.dumps({"error": "Cannot transfer super_admin privileges to the same email address"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -339,13 +340,14 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
             current_admin_entity = table_client.get_entity(partition_key="admins", row_key=current_super_admin_email)
             if current_admin_entity.get('Role') != 'super_admin':
                 return func.HttpResponse(
-                    json.dumps({"error": "Access denied. Only super_admin users can transfer privileges"}),
+                    json_encoding.dumps({"error": "Access denied. Only super_admin users can transfer privileges"}),
                     status_code=403,
                     headers={"Content-Type": "application/json"}
                 )
-        except ResourceNotFoundError:
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
             return func.HttpResponse(
-                json.dumps({"error": f"Current admin {current_super_admin_email} not found"}),
+                json_encoding.dumps({"error": f"Current admin {current_super_admin_email} not found"}),
                 status_code=404,
                 headers={"Content-Type": "application/json"}
             )
@@ -353,9 +355,10 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Verify new admin exists
         try:
             new_admin_entity = table_client.get_entity(partition_key="admins", row_key=new_super_admin_email)
-        except ResourceNotFoundError:
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
             return func.HttpResponse(
-                json.dumps({"error": f"Target admin {new_super_admin_email} not found"}),
+                json_encoding.dumps({"error": f"Target admin {new_super_admin_email} not found"}),
                 status_code=404,
                 headers={"Content-Type": "application/json"}
             )
@@ -391,15 +394,16 @@ def update_admin(req: func.HttpRequest) -> func.HttpResponse:
         }
         
         return func.HttpResponse(
-            json.dumps(response_data),
+            json_encoding.dumps(response_data),
             status_code=200,
             headers={"Content-Type": "application/json"}
         )
         
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error transferring super admin privileges: {str(e)}")
         return func.HttpResponse(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            json_encoding.dumps({"error": f"Internal server error: {str(e)}"}),
             status_code=500,
             headers={"Content-Type": "application/json"}
         )
@@ -422,14 +426,14 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
             req_body = req.get_json()
         except ValueError:
             return func.HttpResponse(
-                json.dumps({"error": "Invalid JSON in request body"}),
+                json_encoding.dumps({"error": "Invalid JSON in request body"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
         
         if not req_body:
             return func.HttpResponse(
-                json.dumps({"error": "Request body is required"}),
+                json_encoding.dumps({"error": "Request body is required"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -440,7 +444,7 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
         
         if not requester_email or not admin_to_delete_email:
             return func.HttpResponse(
-                json.dumps({"error": "Both 'requester_email' and 'admin_to_delete_email' are required"}),
+                json_encoding.dumps({"error": "Both 'requester_email' and 'admin_to_delete_email' are required"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -448,7 +452,7 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Validate email formats
         if not validate_email(requester_email) or not validate_email(admin_to_delete_email):
             return func.HttpResponse(
-                json.dumps({"error": "Invalid email format"}),
+                json_encoding.dumps({"error": "Invalid email format"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -456,7 +460,7 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
         # Prevent deleting own account
         if requester_email.lower() == admin_to_delete_email.lower():
             return func.HttpResponse(
-                json.dumps({"error": "Cannot delete your own admin account"}),
+                json_encoding.dumps({"error": "Cannot delete your own admin account"}),
                 status_code=400,
                 headers={"Content-Type": "application/json"}
             )
@@ -469,13 +473,14 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
             requester_entity = table_client.get_entity(partition_key="admins", row_key=requester_email)
             if requester_entity.get('Role') != 'super_admin':
                 return func.HttpResponse(
-                    json.dumps({"error": "Access denied. Only super_admin users can delete admins"}),
+                    json_encoding.dumps({"error": "Access denied. Only super_admin users can delete admins"}),
                     status_code=403,
                     headers={"Content-Type": "application/json"}
                 )
-        except ResourceNotFoundError:
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
             return func.HttpResponse(
-                json.dumps({"error": f"Requester admin {requester_email} not found"}),
+                json_encoding.dumps({"error": f"Requester admin {requester_email} not found"}),
                 status_code=404,
                 headers={"Content-Type": "application/json"}
             )
@@ -493,14 +498,15 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
                 
                 if super_admin_count <= 1:
                     return func.HttpResponse(
-                        json.dumps({"error": "Cannot delete the last super_admin. Transfer privileges to another admin first"}),
+                        json_encoding.dumps({"error": "Cannot delete the last super_admin. Transfer privileges to another admin first"}),
                         status_code=409,
                         headers={"Content-Type": "application/json"}
                     )
             
-        except ResourceNotFoundError:
+        except ResourceNotFoundError as e:
+            reset_table_if_missing(e)
             return func.HttpResponse(
-                json.dumps({"error": f"Admin to delete {admin_to_delete_email} not found"}),
+                json_encoding.dumps({"error": f"Admin to delete {admin_to_delete_email} not found"}),
                 status_code=404,
                 headers={"Content-Type": "application/json"}
             )
@@ -525,15 +531,275 @@ def delete_admin(req: func.HttpRequest) -> func.HttpResponse:
         }
         
         return func.HttpResponse(
-            json.dumps(response_data),
+            json_encoding.dumps(response_data),
             status_code=200,
             headers={"Content-Type": "application/json"}
         )
         
     except Exception as e:
+        reset_table_if_missing(e)
         logging.error(f"Error deleting admin user: {str(e)}")
         return func.HttpResponse(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            json_encoding.dumps({"error": f"Internal server error: {str(e)}"}),
             status_code=500,
             headers={"Content-Type": "application/json"}
         )
+
+# Async variants of the routes above, served under /api/aio/... They use the aio
+# table client so one worker can keep many requests in flight, and issue
+# independent reads concurrently instead of one after another.
+
+async def get_async_table_client():
+    """Get the aio admin table client, provisioning the table once per worker"""
+    if not AZURE_STORAGE_CONNECTION_STRING:
+        raise ValueError("AzureWebJobsStorage connection string not found in environment variables")
+    return await aio_clients.ensure_table(AZURE_STORAGE_CONNECTION_STRING, ADMIN_TABLE_NAME)
+
+async def get_admin_async(table_client, email: str):
+    """Admin entity for an email, or None if there is no such admin"""
+    try:
+        return await table_client.get_entity(partition_key="admins", row_key=email)
+    except ResourceNotFoundError as e:
+        reset_table_if_missing(e)
+        return None
+
+def json_response(data, status_code: int) -> func.HttpResponse:
+    return func.HttpResponse(
+        json_encoding.dumps(data),
+        status_code=status_code,
+        headers={"Content-Type": "application/json"}
+    )
+
+def read_json_body(req: func.HttpRequest):
+    """Returns (body, None), or (None, error response) for a missing or malformed body"""
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return None, json_response({"error": "Invalid JSON in request body"}, 400)
+    if not req_body:
+        return None, json_response({"error": "Request body is required"}, 400)
+    return req_body, None
+
+@app.route(route="aio/create-admin", methods=["POST"])
+async def create_admin_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of create-admin; the requester's role and the existing-admin
+    check are read concurrently
+    """
+    logging.info('Create admin (async) function triggered')
+    
+    try:
+        req_body, error_response = read_json_body(req)
+        if error_response:
+            return error_response
+        
+        requester_email = req_body.get('requester_email')
+        new_admin_email = req_body.get('new_admin_email')
+        if not requester_email or not new_admin_email:
+            return json_response({"error": "Both 'requester_email' and 'new_admin_email' are required"}, 400)
+        if not validate_email(requester_email) or not validate_email(new_admin_email):
+            return json_response({"error": "Invalid email format"}, 400)
+        
+        table_client = await get_async_table_client()
+        requester, existing_admin = await asyncio.gather(
+            get_admin_async(table_client, requester_email),
+            get_admin_async(table_client, new_admin_email)
+        )
+        if not requester or requester.get('Role') != 'super_admin':
+            return json_response({"error": "Access denied. Only super_admin users can create new admins"}, 403)
+        if existing_admin:
+            return json_response({"error": f"Admin with email {new_admin_email} already exists"}, 409)
+        
+        current_timestamp = datetime.now(timezone.utc).isoformat()
+        await table_client.create_entity(entity={
+            "PartitionKey": "admins",
+            "RowKey": new_admin_email,
+            "Role": "admin",
+            "CreatedAt": current_timestamp,
+            "LastLogin": current_timestamp  # Set to created time initially
+        })
+        
+        logging.info(f"Successfully created admin user: {new_admin_email} by {requester_email}")
+        return json_response({
+            "success": True,
+            "message": f"Admin user {new_admin_email} created successfully",
+            "admin": {
+                "email": new_admin_email,
+                "role": "admin",
+                "created_at": current_timestamp
+            }
+        }, 201)
+        
+    except Exception as e:
+        reset_table_if_missing(e)
+        logging.error(f"Error creating admin user: {str(e)}")
+        return json_response({"error": f"Internal server error: {str(e)}"}, 500)
+
+@app.route(route="aio/read-admin", methods=["GET"])
+async def read_admin_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of read-admin
+    """
+    logging.info('Read admin (async) function triggered')
+    
+    try:
+        email = req.params.get('email')
+        table_client = await get_async_table_client()
+        
+        if email:
+            if not validate_email(email):
+                return json_response({"error": "Invalid email format"}, 400)
+            admin_entity = await get_admin_async(table_client, email)
+            if not admin_entity:
+                return json_response({"error": f"Admin with email {email} not found"}, 404)
+            response_data = {
+                "success": True,
+                "admin": {
+                    "email": admin_entity.get('RowKey'),
+                    "role": admin_entity.get('Role'),
+                    "created_at": admin_entity.get('CreatedAt'),
+                    "last_login": admin_entity.get('LastLogin')
+                }
+            }
+            return http_cache.conditional_response(req, json_encoding.dumps(response_data))
+        
+        admins_list = [
+            {"email": entity.get('RowKey'), "role": entity.get('Role')}
+            async for entity in table_client.query_entities("PartitionKey eq 'admins'", select=['RowKey', 'Role'])
+        ]
+        response_data = {
+            "success": True,
+            "admins": admins_list,
+            "count": len(admins_list)
+        }
+        return http_cache.conditional_response(req, json_encoding.dumps(response_data))
+        
+    except Exception as e:
+        reset_table_if_missing(e)
+        logging.error(f"Error reading admin user(s): {str(e)}")
+        return json_response({"error": f"Internal server error: {str(e)}"}, 500)
+
+@app.route(route="aio/update-admin", methods=["PUT"])
+async def update_admin_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of update-admin; both admins are read concurrently and the
+    role swap is written as one transaction so it cannot be half applied
+    """
+    logging.info('Update admin (async) function triggered')
+    
+    try:
+        req_body, error_response = read_json_body(req)
+        if error_response:
+            return error_response
+        
+        current_super_admin_email = req_body.get('current_super_admin_email')
+        new_super_admin_email = req_body.get('new_super_admin_email')
+        if not current_super_admin_email or not new_super_admin_email:
+            return json_response({"error": "Both 'current_super_admin_email' and 'new_super_admin_email' are required"}, 400)
+        if not validate_email(current_super_admin_email) or not validate_email(new_super_admin_email):
+            return json_response({"error": "Invalid email format"}, 400)
+        if current_super_admin_email.lower() == new_super_admin_email.lower():
+            return json_response({"error": "Cannot transfer super_admin privileges to the same email address"}, 400)
+        
+        table_client = await get_async_table_client()
+        current_admin_entity, new_admin_entity = await asyncio.gather(
+            get_admin_async(table_client, current_super_admin_email),
+            get_admin_async(table_client, new_super_admin_email)
+        )
+        if not current_admin_entity:
+            return json_response({"error": f"Current admin {current_super_admin_email} not found"}, 404)
+        if current_admin_entity.get('Role') != 'super_admin':
+            return json_response({"error": "Access denied. Only super_admin users can transfer privileges"}, 403)
+        if not new_admin_entity:
+            return json_response({"error": f"Target admin {new_super_admin_email} not found"}, 404)
+        
+        current_timestamp = datetime.now(timezone.utc).isoformat()
+        current_admin_entity['Role'] = 'admin'
+        new_admin_entity['Role'] = 'super_admin'
+        await table_client.submit_transaction([
+            ('update', current_admin_entity, {'mode': 'replace'}),
+            ('update', new_admin_entity, {'mode': 'replace'})
+        ])
+        
+        logging.info(f"Successfully transferred super_admin privileges from {current_super_admin_email} to {new_super_admin_email}")
+        return json_response({
+            "success": True,
+            "message": f"Super admin privileges transferred from {current_super_admin_email} to {new_super_admin_email}",
+            "transfer": {
+                "previous_super_admin": {
+                    "email": current_super_admin_email,
+                    "new_role": "admin"
+                },
+                "new_super_admin": {
+                    "email": new_super_admin_email,
+                    "new_role": "super_admin"
+                },
+                "transferred_at": current_timestamp
+            }
+        }, 200)
+        
+    except Exception as e:
+        reset_table_if_missing(e)
+        logging.error(f"Error transferring super admin privileges: {str(e)}")
+        return json_response({"error": f"Internal server error: {str(e)}"}, 500)
+
+@app.route(route="aio/delete-admin", methods=["DELETE"])
+async def delete_admin_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Async variant of delete-admin; the requester and the admin to delete are read concurrently
+    """
+    logging.info('Delete admin (async) function triggered')
+    
+    try:
+        req_body, error_response = read_json_body(req)
+        if error_response:
+            return error_response
+        
+        requester_email = req_body.get('requester_email')
+        admin_to_delete_email = req_body.get('admin_to_delete_email')
+        if not requester_email or not admin_to_delete_email:
+            return json_response({"error": "Both 'requester_email' and 'admin_to_delete_email' are required"}, 400)
+        if not validate_email(requester_email) or not validate_email(admin_to_delete_email):
+            return json_response({"error": "Invalid email format"}, 400)
+        if requester_email.lower() == admin_to_delete_email.lower():
+            return json_response({"error": "Cannot delete your own admin account"}, 400)
+        
+        table_client = await get_async_table_client()
+        requester_entity, admin_to_delete_entity = await asyncio.gather(
+            get_admin_async(table_client, requester_email),
+            get_admin_async(table_client, admin_to_delete_email)
+        )
+        if not requester_entity:
+            return json_response({"error": f"Requester admin {requester_email} not found"}, 404)
+        if requester_entity.get('Role') != 'super_admin':
+            return json_response({"error": "Access denied. Only super_admin users can delete admins"}, 403)
+        if not admin_to_delete_entity:
+            return json_response({"error": f"Admin to delete {admin_to_delete_email} not found"}, 404)
+        
+        admin_role = admin_to_delete_entity.get('Role')
+        if admin_role == 'super_admin':
+            # Prevent deleting the last super_admin
+            super_admin_count = 0
+            async for _ in table_client.query_entities("PartitionKey eq 'admins' and Role eq 'super_admin'", select=['RowKey']):
+                super_admin_count += 1
+            if super_admin_count <= 1:
+                return json_response({"error": "Cannot delete the last super_admin. Transfer privileges to another admin first"}, 409)
+        
+        await table_client.delete_entity(partition_key="admins", row_key=admin_to_delete_email)
+        
+        logging.info(f"Successfully deleted admin user: {admin_to_delete_email} by {requester_email}")
+        return json_response({
+            "success": True,
+            "message": f"Admin user {admin_to_delete_email} deleted successfully",
+            "deleted_admin": {
+                "email": admin_to_delete_email,
+                "role": admin_role,
+                "deleted_by": requester_email,
+                "deleted_at": datetime.now(timezone.utc).isoformat()
+            }
+        }, 200)
+        
+    except Exception as e:
+        reset_table_if_missing(e)
+        logging.error(f"Error deleting admin user: {str(e)}")
+        return json_response({"error": f"Internal server error: {str(e)}"}, 500)
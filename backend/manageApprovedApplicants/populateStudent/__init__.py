@@ -1,11 +1,295 @@
-import json
 import logging
 import os
 import re
 from datetime import datetime
 from azure.functions import HttpRequest, HttpResponse
-from azure.data.tables import TableServiceClient, TableClient
-from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
+from azure.data.tables import TableClient, TableTransactionError, UpdateMode
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceModifiedError, HttpResponseError
+from ..shared_code.storage_clients import get_table_client
+from ..shared_code import applicant_stats, applicant_summary, json_encoding
+
+EMAIL_REGEX = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+# Every student row lives in this partition
+PARTITION_KEY = 'signup'
+
+MAX_BULK_STUDENTS = 1000
+# Table Storage transactions are limited to 100 operations in one partition
+TRANSACTION_SIZE = 100
+# Filters are limited to 15 comparisons: one for PartitionKey plus 14 RowKeys
+ROW_KEYS_PER_QUERY = 14
+
+def bulk_students(req):
+    """The 'students' list of a bulk-mode request, or None for a single-student request"""
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return None
+    return req_body.get('students') if isinstance(req_body, dict) and 'students' in req_body else None
+
+def parse_request(req):
+    """
+    Validate the request body.
+    Returns ((rowKey, email), None), or (None, error response).
+    """
+    # Parse request body
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Invalid JSON in request body"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    if not req_body:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Request body is required"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    # Extract required fields
+    row_key = req_body.get('rowKey')
+    email = req_body.get('email')
+
+    # Validate input
+    if not row_key or not email:
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Missing required fields: rowKey, email"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+
+    # Validate email format
+    if not re.match(EMAIL_REGEX, email):
+        return None, HttpResponse(
+            json_encoding.dumps({
+                "error": "Invalid email format"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    return (row_key, email), None
+
+def transition_error(entity):
+    """Error body if the student cannot move from its current RedpStatus to 'email sent', else None"""
+    row_key = entity['RowKey']
+    current_status = entity.get('RedpStatus', '')
+    current_email = entity.get('RedpEmail', '')
+    
+    if current_status == 'email sent':
+        return {
+            "error": f"Student with rowKey '{row_key}' already has email sent status",
+            "rowKey": row_key,
+            "currentStatus": current_status,
+            "currentEmail": current_email,
+            "message": "No action needed - email is already sent and populated"
+        }
+    elif current_status != 'pending':
+        return {
+            "error": f"Student with rowKey '{row_key}' must have 'pending' status to populate email",
+            "rowKey": row_key,
+            "currentStatus": current_status if current_status else "empty",
+            "message": "Student must be initialized (pending status) before email can be populated"
+        }
+    return None
+
+def populate(entity, email):
+    """Set the student's RedpEmail and move it to 'email sent'"""
+    entity['RedpEmail'] = email
+    entity['RedpStatus'] = 'email sent'
+    entity['RedpEmailTimestamp'] = datetime.utcnow().isoformat() + 'Z'
+
+def success_body(entity):
+    """Response body for a populated student"""
+    return {
+        "message": f"Student with rowKey '{entity['RowKey']}' successfully populated with email",
+        "rowKey": entity['RowKey'],
+        "partitionKey": entity['PartitionKey'],
+        "redpEmail": entity['RedpEmail'],
+        "redpStatus": "email sent",
+        "timestamp": entity['RedpEmailTimestamp']
+    }
+
+def fetch_students(table_client, row_keys):
+    """Fetch many students from the signup partition with a few filtered queries instead of point reads"""
+    entities = {}
+    for start in range(0, len(row_keys), ROW_KEYS_PER_QUERY):
+        chunk = row_keys[start:start + ROW_KEYS_PER_QUERY]
+        parameters = {'pk': PARTITION_KEY}
+        clauses = []
+        for i, row_key in enumerate(chunk):
+            parameters[f'rk{i}'] = row_key
+            clauses.append(f"RowKey eq @rk{i}")
+        query_filter = f"PartitionKey eq @pk and ({' or '.join(clauses)})"
+        for entity in table_client.query_entities(query_filter, parameters=parameters):
+            entities[entity['RowKey']] = entity
+    return entities
+
+def student_result(row_key, status_code, body):
+    """Per-student entry of a bulk response"""
+    return {"rowKey": row_key, "statusCode": status_code, "success": status_code == 200, **body}
+
+def populate_one(table_client, row_key, email):
+    """
+    Re-read, validate and conditionally write a single student.
+    Returns (entity, before, status_code, body); entity is None unless it was written.
+    """
+    try:
+        entity = table_client.get_entity(partition_key=PARTITION_KEY, row_key=row_key)
+    except ResourceNotFoundError:
+        return None, None, 404, {"error": f"Entity with rowKey '{row_key}' not found in DynamoInfo table"}
+    error = transition_error(entity)
+    if error:
+        return None, None, 400, error
+    before = applicant_stats.snapshot(entity)
+    populate(entity, email)
+    try:
+        table_client.update_entity(
+            entity=entity,
+            mode=UpdateMode.REPLACE,
+            etag=entity.metadata['etag'],
+            match_condition=MatchConditions.IfNotModified
+        )
+    except ResourceModifiedError:
+        return None, None, 409, {"error": f"Student with rowKey '{row_key}' was modified concurrently, please retry"}
+    return entity, before, 200, success_body(entity)
+
+def populate_many(connection_string, students):
+    """
+    Bulk mode: populate many students with a handful of filtered reads and
+    100-entity transactions instead of a get + replace per student
+    """
+    if not isinstance(students, list) or not students:
+        return HttpResponse(
+            json_encoding.dumps({
+                "error": "'students' must be a non-empty list of {rowKey, email} objects"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+    if len(students) > MAX_BULK_STUDENTS:
+        return HttpResponse(
+            json_encoding.dumps({
+                "error": f"Too many students, at most {MAX_BULK_STUDENTS} per request"
+            }),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    # Validate the request locally before touching storage
+    results = [None] * len(students)
+    indexes = []
+    seen = set()
+    for index, student in enumerate(students):
+        row_key = student.get('rowKey') if isinstance(student, dict) else None
+        email = student.get('email') if isinstance(student, dict) else None
+        if not row_key or not email:
+            results[index] = student_result(None, 400, {"error": "Missing required fields: rowKey, email"})
+        elif not isinstance(row_key, str) or not isinstance(email, str):
+            results[index] = student_result(None, 400, {"error": "rowKey and email must be strings"})
+        elif not re.match(EMAIL_REGEX, email):
+            results[index] = student_result(row_key, 400, {"error": "Invalid email format"})
+        elif row_key in seen:
+            results[index] = student_result(row_key, 400, {"error": "Duplicate rowKey in request"})
+        else:
+            seen.add(row_key)
+            indexes.append(index)
+    
+    table_client = get_table_client(connection_string, 'DynamoInfo')
+    try:
+        entities = fetch_students(table_client, [students[i]['rowKey'] for i in indexes])
+    except Exception as e:
+        logging.error(f"Failed to read students for bulk populate: {str(e)}")
+        for index in indexes:
+            results[index] = student_result(students[index]['rowKey'], 500, {"error": f"Failed to read student: {str(e)}"})
+        indexes = []
+    
+    # Check every pending -> email sent transition in memory
+    pending = []
+    for index in indexes:
+        row_key = students[index]['rowKey']
+        entity = entities.get(row_key)
+        if entity is None:
+            results[index] = student_result(row_key, 404, {"error": f"Entity with rowKey '{row_key}' not found in DynamoInfo table"})
+            continue
+        error = transition_error(entity)
+        if error:
+            results[index] = student_result(row_key, 400, error)
+            continue
+        before = applicant_stats.snapshot(entity)
+        populate(entity, students[index]['email'])
+        pending.append((index, entity, before))
+    
+    # Commit in transactional batches; ETags guard against concurrent updates
+    updated = []
+    deltas = {}
+    for start in range(0, len(pending), TRANSACTION_SIZE):
+        chunk = pending[start:start + TRANSACTION_SIZE]
+        operations = [
+            ('update', entity, {
+                'mode': UpdateMode.REPLACE,
+                'etag': entity.metadata['etag'],
+                'match_condition': MatchConditions.IfNotModified
+            })
+            for _, entity, _ in chunk
+        ]
+        try:
+            table_client.submit_transaction(operations)
+            committed = chunk
+        except TableTransactionError as e:
+            # Some student changed underneath us; fall back to per-student conditional writes
+            logging.warning(f"Bulk transaction failed, retrying students individually: {str(e)}")
+            committed = []
+            for index, _, _ in chunk:
+                student = students[index]
+                try:
+                    entity, before, status_code, body = populate_one(table_client, student['rowKey'], student['email'])
+                except Exception as e:
+                    logging.error(f"Failed to populate student {student['rowKey']}: {str(e)}")
+                    entity, status_code, body = None, 500, {"error": f"Failed to populate student: {str(e)}"}
+                if entity is None:
+                    results[index] = student_result(student['rowKey'], status_code, body)
+                else:
+                    committed.append((index, entity, before))
+        except Exception as e:
+            # e.g. throttling or a timeout: the transaction is atomic, so none of this chunk is known to be written
+            logging.error(f"Bulk transaction failed: {str(e)}")
+            committed = []
+            for index, _, _ in chunk:
+                results[index] = student_result(students[index]['rowKey'], 500, {"error": f"Failed to populate student: {str(e)}"})
+        
+        for index, entity, before in committed:
+            results[index] = student_result(entity['RowKey'], 200, success_body(entity))
+            updated.append(entity)
+            applicant_stats.diff(before, applicant_stats.snapshot(entity), deltas)
+    
+    # Keep the dashboard summary rows and counters in step with the new RedpStatus values,
+    # for every student that was written
+    if updated:
+        applicant_summary.try_upsert(connection_string, updated)
+        applicant_stats.try_apply(connection_string, deltas)
+    
+    logging.info(f"Bulk populate: {len(updated)} of {len(students)} students populated")
+    succeeded = sum(1 for r in results if r["success"])
+    return HttpResponse(
+        json_encoding.dumps({
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        }),
+        status_code=200,
+        mimetype="application/json"
+    )
 
 def main(req: HttpRequest) -> HttpResponse:
     """
@@ -16,6 +300,11 @@ def main(req: HttpRequest) -> HttpResponse:
         "rowKey": "student_row_key",
         "email": "student@email.com"
     }
+    
+    Bulk mode, for onboarding a whole cohort in one request:
+    {
+        "students": [{"rowKey": "...", "email": "..."}, ...]
+    }
     """
     logging.info('PopulateStudent function processed a request.')
     
@@ -25,67 +314,29 @@ def main(req: HttpRequest) -> HttpResponse:
         if not connection_string:
             logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
             return HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "error": "Azure Storage connection string not configured"
                 }),
                 status_code=500,
                 mimetype="application/json"
             )
         
-        # Parse request body
-        try:
-            req_body = req.get_json()
-        except ValueError:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Invalid JSON in request body"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
+        students = bulk_students(req)
+        if students is not None:
+            return populate_many(connection_string, students)
         
-        if not req_body:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Request body is required"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        # Extract required fields
-        row_key = req_body.get('rowKey')
-        email = req_body.get('email')
-        
-        # Validate input
-        if not row_key or not email:
-            return HttpResponse(
-                json.dumps({
-                    "error": "Missing required fields: rowKey, email"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        # Validate email format
-        email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-        if not re.match(email_regex, email):
-            return HttpResponse(
-                json.dumps({
-                    "error": "Invalid email format"
-                }),
-                status_code=400,
-                mimetype="application/json"
-            )
+        fields, error_response = parse_request(req)
+        if error_response:
+            return error_response
+        row_key, email = fields
         
         # Initialize Table Service Client
         table_name = 'DynamoInfo'
-        table_service_client = TableServiceClient.from_connection_string(connection_string)
-        table_client = table_service_client.get_table_client(table_name=table_name)
+        table_client = get_table_client(connection_string, table_name)
         
         # Since we don't have partitionKey, we need to query for the entity
         # Using the correct partitionKey pattern for this system
-        partition_key = "signup"
+        partition_key = PARTITION_KEY
         
         try:
             # Try to get existing entity
@@ -93,36 +344,17 @@ def main(req: HttpRequest) -> HttpResponse:
             logging.info(f"Found entity with rowKey: {row_key}")
             
             # Check status - only proceed if status is "pending"
-            current_status = entity.get('RedpStatus', '')
-            current_email = entity.get('RedpEmail', '')
-            
-            if current_status == 'email sent':
-                return HttpResponse(
-                    json.dumps({
-                        "error": f"Student with rowKey '{row_key}' already has email sent status",
-                        "rowKey": row_key,
-                        "currentStatus": current_status,
-                        "currentEmail": current_email,
-                        "message": "No action needed - email is already sent and populated"
-                    }),
-                    status_code=400,
-                    mimetype="application/json"
-                )
-            elif current_status != 'pending':
+            error = transition_error(entity)
+            if error:
                 return HttpResponse(
-                    json.dumps({
-                        "error": f"Student with rowKey '{row_key}' must have 'pending' status to populate email",
-                        "rowKey": row_key,
-                        "currentStatus": current_status if current_status else "empty",
-                        "message": "Student must be initialized (pending status) before email can be populated"
-                    }),
+                    json_encoding.dumps(error),
                     status_code=400,
                     mimetype="application/json"
                 )
                 
         except ResourceNotFoundError:
             return HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "error": f"Entity with rowKey '{row_key}' not found in DynamoInfo table",
                     "rowKey": row_key
                 }),
@@ -130,10 +362,10 @@ def main(req: HttpRequest) -> HttpResponse:
                 mimetype="application/json"
             )
         
+        before = applicant_stats.snapshot(entity)
+
         # Update the RedpEmail and RedpStatus fields
-        entity['RedpEmail'] = email
-        entity['RedpStatus'] = 'email sent'
-        entity['RedpEmailTimestamp'] = datetime.utcnow().isoformat() + 'Z'
+        populate(entity, email)
         
         # Update entity in table
         try:
@@ -142,7 +374,7 @@ def main(req: HttpRequest) -> HttpResponse:
         except HttpResponseError as e:
             logging.error(f'Failed to update entity: {str(e)}')
             return HttpResponse(
-                json.dumps({
+                json_encoding.dumps({
                     "error": "Failed to update entity in database",
                     "details": str(e)
                 }),
@@ -150,18 +382,13 @@ def main(req: HttpRequest) -> HttpResponse:
                 mimetype="application/json"
             )
 
+        # Keep the dashboard summary row in step with the new RedpStatus
+        applicant_summary.try_upsert(connection_string, [entity])
+        applicant_stats.try_apply(connection_string, applicant_stats.diff(before, applicant_stats.snapshot(entity)))
+
         # Return success response
-        response = {
-            "message": f"Student with rowKey '{row_key}' successfully populated with email",
-            "rowKey": row_key,
-            "partitionKey": partition_key,
-            "redpEmail": email,
-            "redpStatus": "email sent",
-            "timestamp": entity['RedpEmailTimestamp']
-        }
-        
         return HttpResponse(
-            json.dumps(response),
+            json_encoding.dumps(success_body(entity)),
             status_code=200,
             mimetype="application/json"
         )
@@ -169,7 +396,7 @@ def main(req: HttpRequest) -> HttpResponse:
     except Exception as e:
         logging.error(f"Error processing request: {str(e)}")
         return HttpResponse(
-            json.dumps({
+            json_encoding.dumps({
                 "error": "Internal server error",
                 "details": str(e)
             }),
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+from azure.functions import HttpRequest, HttpResponse
+from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
+from ..shared_code import aio_clients, applicant_stats, applicant_summary, json_encoding
+from ..populateStudent import PARTITION_KEY, bulk_students, parse_request, populate, populate_many, success_body, transition_error
+
+async def main(req: HttpRequest) -> HttpResponse:
+    """
+    Async variant of populateStudent: the student is read and updated through
+    the aio table client, and the summary row and dashboard counters are
+    refreshed side by side on worker threads through the shared helpers.
+    """
+    logging.info('PopulateStudentAsync function processed a request.')
+    
+    try:
+        connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+        if not connection_string:
+            logging.error('AZURE_STORAGE_CONNECTION_STRING environment variable is not set')
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Azure Storage connection string not configured"
+                }),
+                status_code=500,
+                mimetype="application/json"
+            )
+        
+        students = bulk_students(req)
+        if students is not None:
+            # Bulk mode is dominated by transactional batches, so reuse the sync path on a worker thread
+            return await asyncio.to_thread(populate_many, connection_string, students)
+        
+        fields, error_response = parse_request(req)
+        if error_response:
+            return error_response
+        row_key, email = fields
+        
+        table_client = aio_clients.get_table_client(connection_string, 'DynamoInfo')
+        try:
+            entity = await table_client.get_entity(partition_key=PARTITION_KEY, row_key=row_key)
+        except ResourceNotFoundError:
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": f"Entity with rowKey '{row_key}' not found in DynamoInfo table",
+                    "rowKey": row_key
+                }),
+                status_code=404,
+                mimetype="application/json"
+            )
+        
+        error = transition_error(entity)
+        if error:
+            return HttpResponse(
+                json_encoding.dumps(error),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        before = applicant_stats.snapshot(entity)
+        populate(entity, email)
+        try:
+            await table_client.update_entity(entity=entity, mode='replace')
+            logging.info(f'Successfully updated RedpEmail to "{email}" and RedpStatus to "email sent" for rowKey: {row_key}')
+        except HttpResponseError as e:
+            logging.error(f'Failed to update entity: {str(e)}')
+            return HttpResponse(
+                json_encoding.dumps({
+                    "error": "Failed to update entity in database",
+                    "details": str(e)
+                }),
+                status_code=500,
+                mimetype="application/json"
+            )
+        
+        # Keep the dashboard summary row and counters in step with the new RedpStatus
+        await asyncio.gather(
+            asyncio.to_thread(applicant_summary.try_upsert, connection_string, [entity]),
+            asyncio.to_thread(
+                applicant_stats.try_apply, connection_string,
+                applicant_stats.diff(before, applicant_stats.snapshot(entity))
+            )
+        )
+        
+        return HttpResponse(
+            json_encoding.dumps(success_body(entity)),
+            status_code=200,
+            mimetype="application/json"
+        )
+        
+    except Exception as e:
+        logging.error(f"Error processing request: {str(e)}")
+        return HttpResponse(
+            json_encoding.dumps({
+                "error": "Internal server error",
+                "details": str(e)
+            }),
+            status_code=500,
+            mimetype="application/json"
+        )
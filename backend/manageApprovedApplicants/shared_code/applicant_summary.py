@@ -0,0 +1,207 @@
+"""
+Materialized ApplicantSummary projection of the DynamoInfo table.
+
+Each applicant has one narrow row (same PartitionKey/RowKey as in DynamoInfo)
+holding only what the dashboard list needs: name, status, RedpStatus, vote
+counts and isComplete. addApproval and populateStudent upsert the row whenever
+they write an applicant, so the list endpoint can read this table instead of
+scanning full applicant entities. Applicants written elsewhere, such as new
+signups, are picked up by addApproval's reconcileApplicants timer, which
+refreshes the rows of every applicant written since its previous pass. Rows are
+written with ETag conditions and the timer is told which ones it created or
+changed, so it can count new applicants in ApplicantStats exactly once. Its cursor is kept
+in a row of the ApplicantStats table (outside the counters partition), so every
+worker resumes from the same point and only the very first pass rebuilds the
+whole table. The table can be rebuilt from DynamoInfo with:
+
+    python -m shared_code.applicant_summary [admin_count]
+
+When admin_count is given, isComplete is recomputed with the same thresholds as
+addApproval; otherwise existing isComplete values are left untouched. A rebuild
+reads only the summary columns and deletes summary rows whose applicant no
+longer exists. Run the vote ledger migration first so approvalCount/denialCount
+are populated.
+"""
+import logging
+import math
+import os
+import re
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import UpdateMode
+
+from .storage_clients import ensure_table
+
+SUMMARY_TABLE_NAME = os.environ.get('APPLICANT_SUMMARY_TABLE_NAME', 'ApplicantSummary')
+
+SUMMARY_FIELDS = ['firstName', 'lastName', 'status', 'RedpStatus']
+# Applicant columns build_summary reads
+SOURCE_SELECT = ['PartitionKey', 'RowKey', *SUMMARY_FIELDS, 'approvalCount', 'denialCount']
+
+CURSOR_PARTITION = 'sync'
+CURSOR_ROW_KEY = 'applicantSummary'
+
+_WIDE_APPROVAL = re.compile(r'^approval\d+$')
+_WIDE_DENIAL = re.compile(r'^denial\d+$')
+
+
+def get_summary_client(connection_string):
+    return ensure_table(connection_string, SUMMARY_TABLE_NAME)
+
+
+def vote_counts(entity):
+    """Approval and denial counts from the vote ledger columns, or from wide approvalN/denialN columns"""
+    if entity.get('approvalCount') is not None:
+        return int(entity.get('approvalCount') or 0), int(entity.get('denialCount') or 0)
+    approvals = sum(1 for k, v in entity.items() if v and _WIDE_APPROVAL.match(k))
+    denials = sum(1 for k, v in entity.items() if v and _WIDE_DENIAL.match(k))
+    return approvals, denials
+
+
+def build_summary(entity, approval_threshold=None, denial_threshold=None):
+    """Project an applicant entity to its summary row; isComplete is only set when thresholds are known"""
+    approval_count, denial_count = vote_counts(entity)
+    summary = {
+        'PartitionKey': entity['PartitionKey'],
+        'RowKey': entity['RowKey'],
+        'approvalCount': approval_count,
+        'denialCount': denial_count
+    }
+    for field in SUMMARY_FIELDS:
+        if entity.get(field) is not None:
+            summary[field] = entity.get(field)
+    if approval_threshold is not None and denial_threshold is not None:
+        summary['isComplete'] = approval_count >= approval_threshold or denial_count >= denial_threshold
+    return summary
+
+
+def upsert(summary_client, entity, approval_threshold=None, denial_threshold=None):
+    """Refresh the summary row for one applicant"""
+    summary_client.upsert_entity(
+        build_summary(entity, approval_threshold, denial_threshold), mode=UpdateMode.MERGE
+    )
+
+
+def upsert_many(summary_client, entities, approval_threshold=None, denial_threshold=None):
+    """Refresh summary rows for many applicants using per-partition transactions of up to 100 rows"""
+    count = 0
+    by_partition = {}
+    for entity in entities:
+        operations = by_partition.setdefault(entity['PartitionKey'], [])
+        operations.append(
+            ('upsert', build_summary(entity, approval_threshold, denial_threshold), {'mode': UpdateMode.MERGE})
+        )
+        count += 1
+        if len(operations) == 100:
+            summary_client.submit_transaction(operations)
+            operations.clear()
+    for operations in by_partition.values():
+        if operations:
+            summary_client.submit_transaction(operations)
+    return count
+
+
+def try_upsert(connection_string, entities, approval_threshold=None, denial_threshold=None):
+    """Best-effort summary maintenance for write paths; failures are logged, not raised"""
+    try:
+        upsert_many(get_summary_client(connection_string), entities, approval_threshold, denial_threshold)
+    except Exception as e:
+        logging.error(f"Failed to update {SUMMARY_TABLE_NAME}: {str(e)}")
+
+
+def read_cursor(state_client):
+    """The stored sync cursor (a UTC datetime), or None before the first successful pass"""
+    try:
+        row = state_client.get_entity(partition_key=CURSOR_PARTITION, row_key=CURSOR_ROW_KEY)
+    except ResourceNotFoundError:
+        return None
+    return row.get('Since')
+
+
+def save_cursor(state_client, since):
+    state_client.upsert_entity(
+        {'PartitionKey': CURSOR_PARTITION, 'RowKey': CURSOR_ROW_KEY, 'Since': since}, mode=UpdateMode.REPLACE
+    )
+
+
+def prune(summary_client, keep):
+    """Delete summary rows whose (PartitionKey, RowKey) is not in keep; returns the number deleted"""
+    by_partition = {}
+    for row in summary_client.list_entities(select=['PartitionKey', 'RowKey']):
+        if (row['PartitionKey'], row['RowKey']) not in keep:
+            by_partition.setdefault(row['PartitionKey'], []).append(('delete', row))
+    count = 0
+    for operations in by_partition.values():
+        for start in range(0, len(operations), 100):
+            summary_client.submit_transaction(operations[start:start + 100])
+        count += len(operations)
+    return count
+
+
+def rebuild(table_client, summary_client, approval_threshold=None, denial_threshold=None):
+    """Rebuild every summary row from the applicant table and drop rows for deleted applicants"""
+    keys = set()
+
+    def source():
+        for entity in table_client.list_entities(select=SOURCE_SELECT):
+            keys.add((entity['PartitionKey'], entity['RowKey']))
+            yield entity
+
+    count = upsert_many(summary_client, source(), approval_threshold, denial_threshold)
+    # Rows created while this ran and removed here are restored by the next sync_changed pass
+    removed = prune(summary_client, keys)
+    logging.info(f"Rebuilt {count} rows in {SUMMARY_TABLE_NAME}, removed {removed}")
+    return count
+
+
+def sync_changed(table_client, summary_client, since, approval_threshold=None, denial_threshold=None):
+    """
+    Refresh summary rows for applicants written at or after since (a UTC datetime).
+    Rows already up to date are left alone. Returns (previous row or None, new row)
+    for every row this call created or changed.
+    """
+    changed = table_client.query_entities("Timestamp ge @since", parameters={'since': since}, select=SOURCE_SELECT)
+    changes = []
+    for entity in changed:
+        summary = build_summary(entity, approval_threshold, denial_threshold)
+        try:
+            current = summary_client.get_entity(partition_key=summary['PartitionKey'], row_key=summary['RowKey'])
+        except ResourceNotFoundError:
+            current = None
+        if current is not None and all(current.get(k) == v for k, v in summary.items()):
+            continue
+        try:
+            if current is None:
+                summary_client.create_entity(entity=summary)
+            else:
+                summary_client.update_entity(
+                    entity=summary, mode=UpdateMode.MERGE,
+                    etag=current.metadata['etag'], match_condition=MatchConditions.IfNotModified
+                )
+        except (ResourceExistsError, ResourceModifiedError):
+            # A write path refreshed the row, and applied its own counter changes, meanwhile
+            continue
+        changes.append((current, summary))
+    logging.info(f"Synced {len(changes)} changed rows into {SUMMARY_TABLE_NAME}")
+    return changes
+
+
+if __name__ == '__main__':
+    import sys
+    from dotenv import load_dotenv
+    from .storage_clients import get_table_client
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING') or os.environ['AZURE_TABLE_CONNECTION_STRING']
+    thresholds = (None, None)
+    if len(sys.argv) > 1:
+        # Same formula as addApproval.calculate_thresholds
+        admin_count = int(sys.argv[1])
+        thresholds = (max(math.ceil(admin_count * 2 / 3), 1), max(math.ceil(admin_count / 3), 1))
+    rebuild(
+        get_table_client(connection_string, os.environ.get('TABLE_NAME', 'DynamoInfo')),
+        get_summary_client(connection_string),
+        *thresholds
+    )